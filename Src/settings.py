@@ -1,3 +1,7 @@
+import atexit
+import shutil
+import sys
+import tempfile
 from pathlib import Path
 
 import dj_database_url
@@ -41,12 +45,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetriquesMiddleware',             # métriques Prometheus (si METRIQUES=True)
+    'core.middleware.InstrumentationMiddleware',       # mesures par requête (si INSTRUMENTATION=True)
+    'core.middleware.RequetesLentesMiddleware',        # requêtes SQL lentes + EXPLAIN (admin)
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',      # sert les static en production
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilMiddleware',                # rôle + permissions, une fois par session
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'axes.middleware.AxesMiddleware',                  # protection bruteforce
@@ -83,6 +91,31 @@ DATABASES = {
     )
 }
 
+# ------------------------------------------------------------------------------
+# Cache (versions du référentiel et des profils, indicateurs des dashboards)
+# ------------------------------------------------------------------------------
+# Le cache porte les versions qui invalident les copies en mémoire de chaque
+# worker gunicorn : il doit être partagé par tous les processus. Fichiers par
+# défaut (workers d'une même machine) ; Redis possible pour plusieurs machines :
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   CACHE_LOCATION=redis://127.0.0.1:6379/1
+# LocMemCache (propre à chaque processus) n'est sûr qu'avec un seul worker.
+if sys.argv[1:2] == ['test']:
+    # Répertoire neuf à chaque lancement des tests : pas de versions ni
+    # d'indicateurs hérités d'une exécution précédente
+    _CACHE_PAR_DEFAUT = tempfile.mkdtemp(prefix='philia_cache_test_')
+    atexit.register(shutil.rmtree, _CACHE_PAR_DEFAUT, True)
+else:
+    _CACHE_PAR_DEFAUT = str(Path(tempfile.gettempdir()) / 'philia_cache')
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=_CACHE_PAR_DEFAUT),
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+        'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    }
+}
+
 # ------------------------------------------------------------------------------
 # Validation de mot de passe
 # ------------------------------------------------------------------------------
@@ -190,6 +223,44 @@ AUTHENTICATION_BACKENDS = [
 # ------------------------------------------------------------------------------
 
 
+# ------------------------------------------------------------------------------
+# Instrumentation des requêtes (core.middleware.InstrumentationMiddleware)
+# ------------------------------------------------------------------------------
+# Durée, nombre et durée des requêtes SQL par vue, en log JSON et en-tête
+# Server-Timing. En production, échantillonner (ex. 0.1 = une requête sur dix).
+INSTRUMENTATION_ACTIVE = config('INSTRUMENTATION', default=False, cast=bool)
+INSTRUMENTATION_ECHANTILLON = config('INSTRUMENTATION_ECHANTILLON', default=1.0, cast=float)
+INSTRUMENTATION_SERVER_TIMING = config('INSTRUMENTATION_SERVER_TIMING', default=True, cast=bool)
+
+# Requêtes SQL au-delà de ce seuil : log + admin « Requêtes lentes » (0 : désactivé)
+REQUETES_LENTES_SEUIL_MS = config('REQUETES_LENTES_SEUIL_MS', default=500, cast=float)
+
+# ------------------------------------------------------------------------------
+# Métriques Prometheus (core.metriques, endpoint /metriques/)
+# ------------------------------------------------------------------------------
+# Avec plusieurs workers gunicorn, définir aussi PROMETHEUS_MULTIPROC_DIR
+# (variable d'environnement lue par prometheus_client, voir core/metriques.py).
+METRIQUES_ACTIVES = config('METRIQUES', default=False, cast=bool)
+METRIQUES_JETON = config('METRIQUES_JETON', default='')
+
+# ------------------------------------------------------------------------------
+# Logs (console : récupérés par Render)
+# ------------------------------------------------------------------------------
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': config('LOG_LEVEL', default='INFO'), 'propagate': False},
+    },
+}
+
+
 # ------------------------------------------------------------------------------
 # Sécurité HTTPS / HSTS
 # ------------------------------------------------------------------------------
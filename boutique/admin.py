@@ -1,10 +1,51 @@
 from django.contrib import admin
 
-from boutique.models import Produit,Categorie,Vente,MouvementStock,LigneDeVente
+from boutique.models import Produit,Categorie,Vente,MouvementStock,LigneDeVente,ResumeVentesJour,ResumeVentesCategorieJour,Inventaire,InstantaneStock
 
 # Register your models here.
 admin.site.register(Produit)
 admin.site.register(Categorie)
 admin.site.register(Vente)
-admin.site.register(LigneDeVente)
-admin.site.register(MouvementStock)
\ No newline at end of file
+
+
+@admin.register(ResumeVentesJour)
+class ResumeVentesJourAdmin(admin.ModelAdmin):
+    list_display = ('jour', 'vendeur', 'nb_ventes', 'chiffre_affaires', 'cout_achat', 'montant_encaisse', 'reste_a_payer')
+    list_filter = ('jour', 'vendeur')
+    ordering = ('-jour',)
+
+
+@admin.register(ResumeVentesCategorieJour)
+class ResumeVentesCategorieJourAdmin(admin.ModelAdmin):
+    list_display = ('jour', 'categorie', 'quantite', 'chiffre_affaires', 'cout_achat')
+    list_filter = ('jour', 'categorie')
+    ordering = ('-jour',)
+
+
+# __str__ de ces modèles lit le produit : jointure pour la liste de l'admin
+@admin.register(LigneDeVente)
+class LigneDeVenteAdmin(admin.ModelAdmin):
+    list_select_related = ('produit',)
+    raw_id_fields = ('vente', 'produit')
+
+
+@admin.register(MouvementStock)
+class MouvementStockAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'date_mouvement', 'utilisateur', 'vente')
+    list_select_related = ('produit', 'utilisateur', 'vente')
+    raw_id_fields = ('produit', 'vente', 'inventaire')
+
+
+@admin.register(Inventaire)
+class InventaireAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'categorie', 'statut', 'date_ouverture', 'ouvert_par', 'date_application', 'applique_par')
+    list_filter = ('statut',)
+    list_select_related = ('categorie', 'ouvert_par', 'applique_par')
+
+
+@admin.register(InstantaneStock)
+class InstantaneStockAdmin(admin.ModelAdmin):
+    list_display = ('jour', 'produit', 'quantite', 'prix_achat', 'date_calcul')
+    list_filter = ('jour',)
+    list_select_related = ('produit',)
+    raw_id_fields = ('produit',)
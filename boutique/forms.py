@@ -2,34 +2,139 @@
 
 from decimal import Decimal
 from django import forms
-from django.forms.models import inlineformset_factory
+from django.db.models import Q
+from django.forms.models import BaseInlineFormSet, inlineformset_factory
+from django.urls import reverse_lazy
 from django.utils import timezone
 
+from core.forms import ReferentielChoiceField, ReferentielFormMixin
 from .models import (
     Produit,
     MouvementStock,
+    Inventaire,
     Vente,
     LigneDeVente,
     Paiement,
 )
+from .receptions import lire_reception
+
+# ----------------------------
+# Choix d'un produit sans charger le catalogue
+# ----------------------------
+
+class ProduitAutocompleteWidget(forms.Widget):
+    """
+    Id du produit dans un champ caché + saisie branchée sur l'autocomplétion.
+    Contrairement à un <select>, rien du catalogue n'est rendu dans la page.
+    """
+    template_name = 'boutique/widgets/produit_autocomplete.html'
+    url = reverse_lazy('produit_autocomplete')
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs)
+        self.libelle = ''
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget'].update({'libelle': self.libelle, 'url': str(self.url)})
+        return context
+
+
+class ProduitChoiceField(forms.ModelChoiceField):
+    """
+    Produit désigné par son id. Les produits déjà chargés (`connus`, rempli
+    par le formset) évitent une requête par ligne.
+    """
+    widget = ProduitAutocompleteWidget
+
+    def __init__(self, queryset, **kwargs):
+        super().__init__(queryset, **kwargs)
+        self.connus = {}
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            pk = int(value)
+        except (TypeError, ValueError):
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value}
+            )
+        produit = self.connus.get(pk) or super().to_python(pk)
+        # Libellé réaffiché si le formulaire revient avec des erreurs
+        self.widget.libelle = produit.nom
+        return produit
+
 
 # ----------------------------
 # Produits & Mouvements stock
 # ----------------------------
 
-class ProduitForm(forms.ModelForm):
+class ProduitForm(ReferentielFormMixin, forms.ModelForm):
     class Meta:
         model = Produit
         fields = '__all__'
+        field_classes = {'categorie': ReferentielChoiceField}
 
 
 class MouvementStockForm(forms.ModelForm):
     class Meta:
         model = MouvementStock
         fields = ['produit', 'type_mouvement', 'quantite', 'raison', 'date_mouvement']
+        field_classes = {'produit': ProduitChoiceField}
         widgets = {'date_mouvement': forms.DateInput(attrs={'type': 'date'})}
 
 
+class InventaireForm(ReferentielFormMixin, forms.ModelForm):
+    class Meta:
+        model = Inventaire
+        fields = ['nom', 'categorie']
+        field_classes = {'categorie': ReferentielChoiceField}
+        labels = {'categorie': "Catégorie (vide : tout le catalogue)"}
+
+
+class ReceptionStockForm(forms.Form):
+    """Livraison fournisseur : fichier CSV ou lignes collées depuis la facture (voir boutique.receptions)."""
+    fichier = forms.FileField(required=False, label="Fichier CSV")
+    texte = forms.CharField(
+        required=False,
+        label="Ou lignes collées",
+        widget=forms.Textarea(attrs={
+            "rows": 10,
+            "placeholder": "reference;nom;quantite;prix_achat;prix_vente;categorie\nSAV-01;Savon karité;24;1.50;3.00;Hygiène",
+        }),
+    )
+    raison = forms.CharField(
+        required=False,
+        max_length=200,
+        label="Livraison",
+        widget=forms.TextInput(attrs={"placeholder": "Ex: Facture FRN-2025-014"}),
+    )
+    date_mouvement = forms.DateField(
+        label="Date de réception",
+        initial=timezone.localdate,
+        widget=forms.DateInput(attrs={'type': 'date'}),
+    )
+    creer_produits = forms.BooleanField(required=False, initial=True, label="Créer les produits inconnus")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        texte = cleaned_data.get('texte')
+        fichier = cleaned_data.get('fichier')
+        if fichier:
+            contenu = fichier.read()
+            try:
+                texte = contenu.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                texte = contenu.decode('cp1252', errors='replace')  # CSV enregistré par Excel
+        if not (texte or '').strip():
+            raise forms.ValidationError("Joignez un fichier ou collez les lignes de la facture.")
+        cleaned_data['lignes'] = lire_reception(texte)
+        if not cleaned_data['lignes']:
+            raise forms.ValidationError("Aucune ligne d'article à réceptionner.")
+        return cleaned_data
+
+
 # ----------------------------
 # Ventes
 # ----------------------------
@@ -110,16 +215,98 @@ class VenteForm(forms.ModelForm):
 
 
 class LigneDeVenteForm(forms.ModelForm):
+    """
+    Ligne du panier. Le produit peut être choisi directement ou désigné par
+    son code (SKU / code-barres scanné) ; le prix par défaut est celui du produit.
+    """
+    reference = forms.CharField(
+        required=False,
+        max_length=64,
+        label="Code / SKU",
+        widget=forms.TextInput(attrs={"placeholder": "Scanner ou saisir un code", "autocomplete": "off"})
+    )
+
     class Meta:
         model = LigneDeVente
         fields = ['produit', 'quantite', 'prix_unitaire_vente']
+        field_classes = {'produit': ProduitChoiceField}
+
+    def __init__(self, *args, produits_par_code=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['produit'].required = False
+        self.fields['prix_unitaire_vente'].required = False
+        self.produits_par_code = produits_par_code
+
+    def clean(self):
+        cleaned_data = super().clean()
+        produit = cleaned_data.get('produit')
+        code = (cleaned_data.get('reference') or '').strip()
+
+        if produit is None and code:
+            if self.produits_par_code is not None:
+                produit = self.produits_par_code.get(code)
+            else:
+                produit = Produit.objects.filter(reference=code).first()
+            if produit is None:
+                self.add_error('reference', f"Aucun produit avec le code « {code} ».")
+                return cleaned_data
+            cleaned_data['produit'] = produit
+            self.fields['produit'].widget.libelle = produit.nom
+
+        if produit is None:
+            if 'produit' not in self.errors:
+                self.add_error('produit', "Choisissez un produit ou scannez son code.")
+        elif not cleaned_data.get('prix_unitaire_vente'):
+            cleaned_data['prix_unitaire_vente'] = produit.prix_vente
+        return cleaned_data
+
+    def _get_validation_exclusions(self):
+        # Le produit vient déjà de la base : pas de contrôle d'existence par ligne
+        exclusions = super()._get_validation_exclusions()
+        exclusions.add('produit')
+        return exclusions
+
+
+class BaseLigneDeVenteFormSet(BaseInlineFormSet):
+    """
+    Charge en une seule requête tous les produits soumis (ids et codes) au
+    lieu d'une requête par ligne ; les lignes s'ajoutent côté navigateur.
+    """
+
+    def _produits_soumis(self):
+        if not hasattr(self, '_produits'):
+            ids, codes = set(), set()
+            for i in range(self.total_form_count()):
+                prefixe = self.add_prefix(i)
+                valeur = self.data.get(f'{prefixe}-produit', '')
+                if str(valeur).isdigit():
+                    ids.add(int(valeur))
+                code = (self.data.get(f'{prefixe}-reference') or '').strip()
+                if code:
+                    codes.add(code)
+            produits = list(Produit.objects.filter(Q(pk__in=ids) | Q(reference__in=codes))) if ids or codes else []
+            self._produits = (
+                {p.pk: p for p in produits},
+                {p.reference: p for p in produits if p.reference},
+            )
+        return self._produits
+
+    def _construct_form(self, i, **kwargs):
+        if self.is_bound:
+            par_id, par_code = self._produits_soumis()
+            kwargs['produits_par_code'] = par_code
+            form = super()._construct_form(i, **kwargs)
+            form.fields['produit'].connus = par_id
+            return form
+        return super()._construct_form(i, **kwargs)
 
 
 LigneDeVenteFormSet = inlineformset_factory(
     Vente,
     LigneDeVente,
     form=LigneDeVenteForm,
-    extra=3,          # nombre de lignes visibles par défaut
+    formset=BaseLigneDeVenteFormSet,
+    extra=1,          # les lignes suivantes sont ajoutées dynamiquement
     can_delete=False
 )
 
@@ -0,0 +1,62 @@
+# boutique/management/commands/instantanes_stock.py
+
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from boutique.models import InstantaneStock, MouvementStock
+
+
+def _fin_de_mois(annee, mois):
+    """Dernier jour du mois."""
+    if mois == 12:
+        return date(annee, 12, 31)
+    return date(annee, mois + 1, 1) - timedelta(days=1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fige le stock de chaque produit en fin de journée (fin du mois précédent par défaut) "
+        "pour les rapports de stock à date. À planifier en début de mois (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jour', help="Jour à figer (AAAA-MM-JJ)")
+        parser.add_argument('--depuis', help="Fige chaque fin de mois depuis ce mois (AAAA-MM) jusqu'au mois précédent")
+        parser.add_argument(
+            '--recalculer-soldes', action='store_true',
+            help="Recalcule d'abord le stock après chaque mouvement (après une correction hors mouvement)",
+        )
+
+    def handle(self, *args, **options):
+        aujourdhui = timezone.localdate()
+        fin_mois_precedent = aujourdhui.replace(day=1) - timedelta(days=1)
+        if options['jour'] and options['depuis']:
+            raise CommandError("--jour et --depuis sont incompatibles.")
+        if options['jour']:
+            try:
+                jours = [date.fromisoformat(options['jour'])]
+            except ValueError:
+                raise CommandError(f"Date invalide : {options['jour']} (format attendu AAAA-MM-JJ)")
+        elif options['depuis']:
+            try:
+                annee, mois = (int(partie) for partie in options['depuis'].split('-'))
+                jour = _fin_de_mois(annee, mois)
+            except ValueError:
+                raise CommandError(f"Mois invalide : {options['depuis']} (format attendu AAAA-MM)")
+            jours = []
+            while jour <= fin_mois_precedent:
+                jours.append(jour)
+                jour = _fin_de_mois(jour.year + jour.month // 12, jour.month % 12 + 1)
+        else:
+            jours = [fin_mois_precedent]
+        if any(jour >= aujourdhui for jour in jours):
+            raise CommandError("Seule une journée terminée peut être figée.")
+
+        if options['recalculer_soldes']:
+            nb = MouvementStock.recalculer_soldes()
+            self.stdout.write(f"Stock après mouvement recalculé sur {nb} mouvements.")
+        for jour in jours:
+            nb = InstantaneStock.prendre(jour)
+            self.stdout.write(self.style.SUCCESS(f"Instantané du {jour:%d/%m/%Y} : {nb} produits."))
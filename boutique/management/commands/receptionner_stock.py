@@ -0,0 +1,76 @@
+# boutique/management/commands/receptionner_stock.py
+
+import sys
+from datetime import date
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from boutique.receptions import lire_reception, receptionner
+
+
+class Command(BaseCommand):
+    help = (
+        "Enregistre une livraison fournisseur depuis un fichier CSV (référence, nom, quantité, "
+        "prix d'achat, prix de vente, catégorie) : entrées de stock en une transaction, "
+        "produits inconnus créés, lignes invalides signalées sans bloquer les autres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Fichier CSV ou texte tabulé (« - » pour l'entrée standard)")
+        parser.add_argument('--utilisateur', help="Nom d'utilisateur enregistré sur les mouvements")
+        parser.add_argument('--raison', help="Référence de la livraison (ex. numéro de facture)")
+        parser.add_argument('--date', help="Date de réception (AAAA-MM-JJ), aujourd'hui par défaut")
+        parser.add_argument('--sans-creation', action='store_true', help="Refuse les lignes de produits inconnus")
+        parser.add_argument('--simulation', action='store_true', help="Affiche le bilan sans rien enregistrer")
+
+    def handle(self, *args, **options):
+        utilisateur = None
+        if options['utilisateur']:
+            utilisateur = User.objects.filter(username=options['utilisateur']).first()
+            if utilisateur is None:
+                raise CommandError(f"Utilisateur inconnu : {options['utilisateur']}")
+        date_mouvement = None
+        if options['date']:
+            try:
+                date_mouvement = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Date invalide : {options['date']} (format attendu AAAA-MM-JJ)")
+
+        try:
+            lignes = lire_reception(self._lire(options['fichier']))
+        except ValidationError as erreur:
+            raise CommandError(' '.join(erreur.messages))
+
+        with transaction.atomic():
+            rapport = receptionner(
+                lignes,
+                utilisateur=utilisateur,
+                raison=options['raison'],
+                date_mouvement=date_mouvement,
+                creer_produits=not options['sans_creation'],
+            )
+            if options['simulation']:
+                transaction.set_rollback(True)
+
+        for numero, erreur in rapport.erreurs:
+            self.stdout.write(self.style.WARNING(f"  ligne {numero} : {erreur}"))
+        if rapport.produits_crees:
+            self.stdout.write(f"Produits créés : {', '.join(rapport.produits_crees)}")
+        bilan = f"{'Simulation' if options['simulation'] else 'Réception'} : {rapport}."
+        self.stdout.write(self.style.WARNING(bilan) if rapport.erreurs else self.style.SUCCESS(bilan))
+
+    def _lire(self, fichier):
+        if fichier == '-':
+            return sys.stdin.read()
+        try:
+            contenu = Path(fichier).read_bytes()
+        except OSError as erreur:
+            raise CommandError(f"Lecture impossible de {fichier} : {erreur}")
+        try:
+            return contenu.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return contenu.decode('cp1252', errors='replace')
@@ -0,0 +1,99 @@
+# boutique/management/commands/reconstruire_resumes_ventes.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Greatest
+
+from core.cache_kpi import BOUTIQUE, invalider_kpis
+from boutique.models import LigneDeVente, ResumeVentesCategorieJour, ResumeVentesJour, Vente
+
+
+def _montant(expression):
+    return Sum(ExpressionWrapper(expression, output_field=DecimalField(max_digits=14, decimal_places=2)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les résumés journaliers des ventes (par vendeur et par catégorie) "
+        "à partir des ventes finalisées. Utile pour un premier remplissage ou une correction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help="Premier jour à reconstruire (AAAA-MM-JJ)")
+        parser.add_argument('--fin', help="Dernier jour à reconstruire (AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        debut = self._lire_date(options['debut'])
+        fin = self._lire_date(options['fin'])
+
+        ventes = Vente.objects.filter(est_complete=True).annotate(jour=F('jour_vente'))
+        lignes = LigneDeVente.objects.filter(vente__est_complete=True).annotate(jour=F('vente__jour_vente'))
+        resumes_vendeur = ResumeVentesJour.objects.all()
+        resumes_categorie = ResumeVentesCategorieJour.objects.all()
+        if debut:
+            ventes, lignes = ventes.filter(jour__gte=debut), lignes.filter(jour__gte=debut)
+            resumes_vendeur = resumes_vendeur.filter(jour__gte=debut)
+            resumes_categorie = resumes_categorie.filter(jour__gte=debut)
+        if fin:
+            ventes, lignes = ventes.filter(jour__lte=fin), lignes.filter(jour__lte=fin)
+            resumes_vendeur = resumes_vendeur.filter(jour__lte=fin)
+            resumes_categorie = resumes_categorie.filter(jour__lte=fin)
+
+        ca = _montant(F('prix_unitaire_vente') * F('quantite'))
+        # Coût figé à la finalisation (comme les résumés tenus au fil de l'eau), pas le prix d'achat actuel
+        cout = _montant(F('prix_achat_unitaire') * F('quantite'))
+
+        par_vendeur = {
+            (r['jour'], r['vendeur']): ResumeVentesJour(
+                jour=r['jour'],
+                vendeur_id=r['vendeur'],
+                nb_ventes=r['nb_ventes'],
+                montant_encaisse=r['encaisse'] or Decimal('0'),
+                reste_a_payer=r['reste'] or Decimal('0'),
+            )
+            for r in ventes.values('jour', 'vendeur').annotate(
+                nb_ventes=Count('id'),
+                encaisse=Sum('montant_encaisse'),
+                reste=_montant(Greatest(F('total') - F('montant_encaisse'), Value(Decimal('0')))),
+            )
+        }
+        for r in lignes.values('jour', 'vente__vendeur').annotate(ca=ca, cout=cout):
+            resume = par_vendeur[(r['jour'], r['vente__vendeur'])]
+            resume.chiffre_affaires = r['ca'] or Decimal('0')
+            resume.cout_achat = r['cout'] or Decimal('0')
+
+        par_categorie = [
+            ResumeVentesCategorieJour(
+                jour=r['jour'],
+                categorie_id=r['produit__categorie'],
+                quantite=r['quantite_totale'],
+                chiffre_affaires=r['ca'] or Decimal('0'),
+                cout_achat=r['cout'] or Decimal('0'),
+            )
+            for r in lignes.values('jour', 'produit__categorie').annotate(
+                quantite_totale=Sum('quantite'), ca=ca, cout=cout,
+            )
+        ]
+
+        with transaction.atomic():
+            resumes_vendeur.delete()
+            resumes_categorie.delete()
+            ResumeVentesJour.objects.bulk_create(par_vendeur.values(), batch_size=1000)
+            ResumeVentesCategorieJour.objects.bulk_create(par_categorie, batch_size=1000)
+            invalider_kpis(BOUTIQUE)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(par_vendeur)} résumés vendeur et {len(par_categorie)} résumés catégorie reconstruits."
+        ))
+
+    def _lire_date(self, valeur):
+        if not valeur:
+            return None
+        try:
+            return date.fromisoformat(valeur)
+        except ValueError:
+            raise CommandError(f"Date invalide : {valeur} (format attendu AAAA-MM-JJ)")
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0013_alter_mouvementstock_date_mouvement_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeVentesCategorieJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('quantite', models.PositiveIntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cout_achat', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('categorie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='boutique.categorie')),
+            ],
+            options={
+                'verbose_name': 'Résumé journalier par catégorie',
+                'verbose_name_plural': 'Résumés journaliers par catégorie',
+                'constraints': [models.UniqueConstraint(fields=('jour', 'categorie'), name='resume_ventes_jour_categorie_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumeVentesJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('nb_ventes', models.PositiveIntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cout_achat', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('montant_encaisse', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('reste_a_payer', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vendeur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Résumé journalier des ventes',
+                'verbose_name_plural': 'Résumés journaliers des ventes',
+                'constraints': [models.UniqueConstraint(fields=('jour', 'vendeur'), name='resume_ventes_jour_vendeur_unique')],
+            },
+        ),
+    ]
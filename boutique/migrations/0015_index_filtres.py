@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+from core.operations import RunSQLPostgres
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0014_resumes_journaliers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['date_mouvement', 'id'], name='mouvement_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['produit', 'date_mouvement', 'id'], name='mouvement_produit_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['date_vente', 'id'], name='vente_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['est_complete', 'date_vente'], name='vente_complete_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(condition=models.Q(('total__gt', models.F('montant_encaisse'))), fields=['date_vente', 'id'], name='vente_dette_date_idx'),
+        ),
+        # Table en ajout seul : un BRIN suffit pour les filtres par période, pour une fraction de la taille d'un B-tree
+        RunSQLPostgres(
+            sql='CREATE INDEX IF NOT EXISTS mouvement_created_brin ON boutique_mouvementstock USING brin (created_at);',
+            reverse_sql='DROP INDEX IF EXISTS mouvement_created_brin;',
+        ),
+    ]
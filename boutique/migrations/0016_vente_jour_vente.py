@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def remplir_jour_vente(apps, schema_editor):
+    Vente = apps.get_model('boutique', 'Vente')
+    lot = []
+    for vente in Vente.objects.only('pk', 'date_vente').iterator(chunk_size=2000):
+        vente.jour_vente = timezone.localdate(vente.date_vente)
+        lot.append(vente)
+        if len(lot) == 2000:
+            Vente.objects.bulk_update(lot, ['jour_vente'])
+            lot = []
+    Vente.objects.bulk_update(lot, ['jour_vente'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0015_index_filtres'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vente',
+            name='jour_vente',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(remplir_jour_vente, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='vente',
+            name='jour_vente',
+            field=models.DateField(db_index=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:26
+
+import unicodedata
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from core.operations import RunSQLPostgres
+
+
+def _normaliser(texte):
+    decompose = unicodedata.normalize('NFKD', texte or '')
+    return ' '.join(''.join(c for c in decompose if not unicodedata.combining(c)).lower().split())
+
+
+def remplir_recherche(apps, schema_editor):
+    Produit = apps.get_model('boutique', 'Produit')
+    LigneDeVente = apps.get_model('boutique', 'LigneDeVente')
+    frequences = dict(
+        LigneDeVente.objects.filter(vente__est_complete=True)
+        .values_list('produit')
+        .annotate(n=Count('vente', distinct=True))
+    )
+    produits = list(Produit.objects.only('pk', 'nom'))
+    for produit in produits:
+        produit.nom_recherche = _normaliser(produit.nom)
+        produit.frequence_ventes = frequences.get(produit.pk, 0)
+    Produit.objects.bulk_update(produits, ['nom_recherche', 'frequence_ventes'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0016_vente_jour_vente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='frequence_ventes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='nom_recherche',
+            field=models.CharField(default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='reference',
+            field=models.CharField(blank=True, help_text="Code imprimé ou scanné sur l'article (EAN, SKU interne…)", max_length=64, null=True, unique=True, verbose_name='Référence (SKU / code-barres)'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['nom_recherche'], name='produit_nom_recherche_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(remplir_recherche, migrations.RunPython.noop),
+        # Recherche à l'intérieur du nom (LIKE '%q%') : index trigramme GIN, si pg_trgm est
+        # installé sur le serveur (sinon seule la recherche par préfixe est indexée)
+        RunSQLPostgres(
+            sql="""
+                DO $$
+                BEGIN
+                    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                        CREATE INDEX IF NOT EXISTS produit_nom_trgm
+                            ON boutique_produit USING gin (nom_recherche gin_trgm_ops);
+                    END IF;
+                END $$;
+            """,
+            reverse_sql='DROP INDEX IF EXISTS produit_nom_trgm;',
+        ),
+    ]
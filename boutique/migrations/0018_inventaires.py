@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0017_recherche_produits'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Inventaire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(help_text='Ex: Inventaire annuel 2025', max_length=200)),
+                ('statut', models.CharField(choices=[('EN_COURS', 'En cours'), ('APPLIQUE', 'Appliqué'), ('ANNULE', 'Annulé')], default='EN_COURS', max_length=10)),
+                ('date_ouverture', models.DateTimeField(auto_now_add=True)),
+                ('date_application', models.DateTimeField(blank=True, null=True)),
+                ('applique_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('categorie', models.ForeignKey(blank=True, help_text='Vide : tout le catalogue', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='boutique.categorie')),
+                ('ouvert_par', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Inventaire',
+                'verbose_name_plural': 'Inventaires',
+                'ordering': ['-date_ouverture'],
+            },
+        ),
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='inventaire',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mouvements', to='boutique.inventaire'),
+        ),
+        migrations.CreateModel(
+            name='LigneInventaire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantite_attendue', models.PositiveIntegerField()),
+                ('quantite_comptee', models.PositiveIntegerField(blank=True, null=True)),
+                ('date_comptage', models.DateTimeField(blank=True, null=True)),
+                ('categorie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='boutique.categorie')),
+                ('compte_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('inventaire', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lignes', to='boutique.inventaire')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='boutique.produit')),
+            ],
+            options={
+                'verbose_name': "Ligne d'inventaire",
+                'verbose_name_plural': "Lignes d'inventaire",
+                'indexes': [models.Index(fields=['inventaire', 'categorie'], name='ligne_inventaire_rayon_idx')],
+                'constraints': [models.UniqueConstraint(fields=('inventaire', 'produit'), name='ligne_inventaire_produit_unique')],
+            },
+        ),
+    ]
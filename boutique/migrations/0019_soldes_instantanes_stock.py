@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+SORTIES = ('SORTIE_VENTE', 'AJUSTEMENT_MOINS')
+
+
+def remplir_stock_apres(apps, schema_editor):
+    """Solde après chaque mouvement, en remontant l'historique depuis le stock actuel."""
+    MouvementStock = apps.get_model('boutique', 'MouvementStock')
+    lot, produit_courant, solde = [], None, 0
+    for pk, produit_id, type_mouvement, quantite, stock_actuel in (
+        MouvementStock.objects.order_by('produit_id', '-pk')
+        .values_list('pk', 'produit_id', 'type_mouvement', 'quantite', 'produit__quantite_stock')
+        .iterator(chunk_size=2000)
+    ):
+        if produit_id != produit_courant:
+            produit_courant, solde = produit_id, stock_actuel
+        lot.append(MouvementStock(pk=pk, stock_apres=solde))
+        solde += quantite if type_mouvement in SORTIES else -quantite
+        if len(lot) == 2000:
+            MouvementStock.objects.bulk_update(lot, ['stock_apres'])
+            lot = []
+    MouvementStock.objects.bulk_update(lot, ['stock_apres'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0018_inventaires'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('quantite', models.IntegerField()),
+                ('prix_achat', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date_calcul', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Instantané de stock',
+                'verbose_name_plural': 'Instantanés de stock',
+            },
+        ),
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='stock_apres',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['produit', 'created_at'], name='mouvement_produit_cree_idx'),
+        ),
+        migrations.AddField(
+            model_name='instantanestock',
+            name='produit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='boutique.produit'),
+        ),
+        migrations.AddConstraint(
+            model_name='instantanestock',
+            constraint=models.UniqueConstraint(fields=('jour', 'produit'), name='instantane_stock_jour_produit_unique'),
+        ),
+        migrations.RunPython(remplir_stock_apres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+def fusionner_lignes_sans_categorie(apps, schema_editor):
+    """Regroupe les lignes « sans catégorie » créées en double pour un même jour."""
+    Resume = apps.get_model('boutique', 'ResumeVentesCategorieJour')
+    gardees = {}
+    doublons = []
+    for resume in Resume.objects.filter(categorie__isnull=True).order_by('jour', 'pk'):
+        gardee = gardees.setdefault(resume.jour, resume)
+        if gardee is not resume:
+            gardee.quantite += resume.quantite
+            gardee.chiffre_affaires += resume.chiffre_affaires
+            gardee.cout_achat += resume.cout_achat
+            doublons.append(resume.pk)
+    if doublons:
+        Resume.objects.bulk_update(gardees.values(), ['quantite', 'chiffre_affaires', 'cout_achat'], batch_size=1000)
+        Resume.objects.filter(pk__in=doublons).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0019_soldes_instantanes_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionner_lignes_sans_categorie, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='resumeventescategoriejour',
+            constraint=models.UniqueConstraint(condition=models.Q(('categorie__isnull', True)), fields=('jour',), name='resume_ventes_jour_sans_categorie_unique'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:22
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def figer_prix_achat(apps, schema_editor):
+    """
+    Lignes déjà finalisées : le prix d'achat de l'époque n'est pas connu, on
+    fige le prix actuel (ce qu'aurait utilisé une reconstruction jusqu'ici).
+    """
+    LigneDeVente = apps.get_model('boutique', 'LigneDeVente')
+    Produit = apps.get_model('boutique', 'Produit')
+    LigneDeVente.objects.filter(vente__est_complete=True).update(prix_achat_unitaire=Subquery(
+        Produit.objects.filter(pk=OuterRef('produit_id')).values('prix_achat')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0020_resume_sans_categorie_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lignedevente',
+            name='prix_achat_unitaire',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.RunPython(figer_prix_achat, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,36 @@
 # boutique/models.py
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, Exists, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal
+import unicodedata
+
+from core import metriques
+from core.cache_kpi import BOUTIQUE, invalider_kpis
+from core.dates import bornes_jour, jour_local
+from core.models import ResumeJournalier
+
+def alerter_si_stock_bas(produit):
+    """Signale un produit dont le stock est passé sous son seuil d'alerte."""
+    if produit.est_stock_bas():
+        message = f"ALERTE: Le stock de '{produit.nom}' est bas ({produit.quantite_stock}/{produit.seuil_stock_bas})!"
+        print(message)  # Pour le développement/debug
+        metriques.ALERTES_STOCK.inc()
+        return True
+    return False
+
+
+def normaliser_recherche(texte):
+    """Forme de recherche d'un texte : minuscules, sans accents, espaces réduits (« Crème  Éclat » → « creme eclat »)."""
+    decompose = unicodedata.normalize('NFKD', texte or '')
+    sans_accents = ''.join(c for c in decompose if not unicodedata.combining(c))
+    return ' '.join(sans_accents.lower().split())
+
 
 class Categorie(models.Model):
     nom = models.CharField(max_length=100, unique=True)
@@ -19,6 +45,14 @@ class Categorie(models.Model):
 
 class Produit(models.Model):
     nom = models.CharField(max_length=200)
+    reference = models.CharField(
+        "Référence (SKU / code-barres)", max_length=64, unique=True, blank=True, null=True,
+        help_text="Code imprimé ou scanné sur l'article (EAN, SKU interne…)",
+    )
+    # Copie normalisée du nom, indexée pour la recherche (voir normaliser_recherche)
+    nom_recherche = models.CharField(max_length=200, editable=False, default='')
+    # Nombre de ventes finalisées contenant le produit : sert au classement de la recherche
+    frequence_ventes = models.PositiveIntegerField(default=0, editable=False)
     description = models.TextField(blank=True)
     categorie = models.ForeignKey(Categorie, on_delete=models.SET_NULL, null=True, related_name='produits')
     prix_achat = models.DecimalField(max_digits=10, decimal_places=2)
@@ -32,16 +66,56 @@ class Produit(models.Model):
         verbose_name = "Produit"
         verbose_name_plural = "Produits"
         ordering = ['nom']
+        indexes = [
+            # Recherche par préfixe (LIKE 'q%') ; l'index trigramme PostgreSQL couvre le reste du nom
+            models.Index(fields=['nom_recherche'], opclasses=['varchar_pattern_ops'], name='produit_nom_recherche_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nom} ({self.quantite_stock} en stock)"
 
+    def normaliser(self):
+        """Champs dérivés de la saisie ; à appeler avant un bulk_create/bulk_update, qui contournent save()."""
+        self.nom_recherche = normaliser_recherche(self.nom)
+        self.reference = (self.reference or '').strip() or None
+
+    def save(self, *args, **kwargs):
+        self.normaliser()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nom' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nom_recherche'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def rechercher(cls, texte, limite=10):
+        """
+        Produits correspondant à une saisie de caisse, les plus pertinents d'abord.
+
+        Référence exacte ou début de nom en tête, puis les plus vendus. Le nom est
+        comparé sans accents ni casse. Les débuts de nom passent par l'index
+        préfixe ; l'intérieur du nom (à partir de 3 caractères) n'est cherché que
+        pour compléter la liste, via l'index trigramme sur PostgreSQL.
+        """
+        texte = (texte or '').strip()
+        cle = normaliser_recherche(texte)
+        if not cle:
+            return []
+
+        produits = cls.objects.select_related('categorie').order_by('-frequence_ventes', 'nom')
+        en_tete = Q(nom_recherche__startswith=cle) | Q(reference=texte)
+        resultats = list(produits.filter(en_tete)[:limite])
+        if len(resultats) < limite and len(cle) >= 3:
+            resultats += produits.filter(nom_recherche__contains=cle).exclude(en_tete)[:limite - len(resultats)]
+        return resultats
+
     def est_en_stock(self):
         """Vérifie si le produit est disponible en stock"""
         return self.quantite_stock > 0
     
     def est_stock_bas(self):
         """Vérifie si le stock est bas selon le seuil défini"""
+        if self.seuil_stock_bas is None:
+            return False
         return self.quantite_stock <= self.seuil_stock_bas
     
     def marge_brute(self):
@@ -63,32 +137,48 @@ class Produit(models.Model):
             type_mouvement: Type de mouvement (ENTREE, SORTIE_VENTE, etc.)
             utilisateur: Utilisateur effectuant l'opération
             raison: Raison du mouvement (optionnel)
+
+        Le stock est modifié par une mise à jour conditionnelle atomique en base :
+        une sortie échoue (ValidationError) si le stock est insuffisant au moment
+        de l'écriture, même si un autre worker vient de vendre les dernières unités.
         """
-        # Vérifier si on peut retirer du stock
-        if type_mouvement in ['SORTIE_VENTE', 'AJUSTEMENT_MOINS']:
-            if self.quantite_stock < quantite:
-                raise ValidationError(f"Stock insuffisant pour {self.nom}. Disponible: {self.quantite_stock}")
-            
-            # Diminuer le stock
-            self.quantite_stock -= quantite
-        else:
-            # Augmenter le stock
-            self.quantite_stock += quantite
-        
-        # Sauvegarder le produit
-        self.save()
-        
-        # Créer le mouvement de stock
-        MouvementStock.objects.create(
-            produit=self,
-            type_mouvement=type_mouvement,
-            quantite=quantite,
-            utilisateur=utilisateur,
-            raison=raison,
-            date_mouvement=date_mouvement or timezone.localdate(),
-            vente=vente
-        )
-        
+        produits = Produit.objects.filter(pk=self.pk)
+        maintenant = timezone.now()
+
+        with transaction.atomic():
+            if type_mouvement in MouvementStock.SORTIES:
+                # Décrément gardé : la condition est évaluée par la base au moment de
+                # l'écriture, deux workers ne peuvent donc pas vendre la même unité
+                modifies = produits.filter(quantite_stock__gte=quantite).update(
+                    quantite_stock=F('quantite_stock') - quantite,
+                    date_modification=maintenant,
+                )
+                if not modifies:
+                    self.refresh_from_db(fields=['quantite_stock'])
+                    raise ValidationError(f"Stock insuffisant pour {self.nom}. Disponible: {self.quantite_stock}")
+            else:
+                # Augmenter le stock
+                produits.update(
+                    quantite_stock=F('quantite_stock') + quantite,
+                    date_modification=maintenant,
+                )
+
+            # Relire la valeur écrite par la base (et non une valeur calculée en Python)
+            self.refresh_from_db(fields=['quantite_stock', 'date_modification'])
+
+            # Créer le mouvement de stock
+            MouvementStock.objects.create(
+                produit=self,
+                type_mouvement=type_mouvement,
+                quantite=quantite,
+                utilisateur=utilisateur,
+                raison=raison,
+                date_mouvement=date_mouvement or timezone.localdate(),
+                vente=vente,
+                stock_apres=self.quantite_stock,
+            )
+            invalider_kpis(BOUTIQUE)
+
         return True
 
 class Vente(models.Model):
@@ -104,6 +194,9 @@ class Vente(models.Model):
     client_nom = models.CharField(max_length=200, blank=True, null=True)
     vendeur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     date_vente = models.DateTimeField(default=timezone.now())
+    # Jour local de la vente, stocké et indexé : filtrer dessus évite de convertir
+    # chaque date_vente dans le fuseau du projet (date_vente__date=...)
+    jour_vente = models.DateField(editable=False, db_index=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # = valeur brute de la vente
     est_complete = models.BooleanField(default=False, help_text="Indique si la vente est finalisée")
     montant_encaisse = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
@@ -115,9 +208,28 @@ class Vente(models.Model):
         verbose_name = "Vente"
         verbose_name_plural = "Ventes"
         ordering = ['-date_vente']
+        indexes = [
+            # Historique paginé (date, id)
+            models.Index(fields=['date_vente', 'id'], name='vente_date_id_idx'),
+            # Ventes finalisées d'une période (journalier, rapports)
+            models.Index(fields=['est_complete', 'date_vente'], name='vente_complete_date_idx'),
+            # Dettes : index partiel limité aux ventes non soldées
+            models.Index(
+                fields=['date_vente', 'id'],
+                condition=Q(total__gt=F('montant_encaisse')),
+                name='vente_dette_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Vente #{self.id} du {self.date_vente.strftime('%d/%m/%Y')}"
+
+    def save(self, *args, **kwargs):
+        self.jour_vente = jour_local(self.date_vente)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'date_vente' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'jour_vente'}
+        super().save(*args, **kwargs)
     
 
     @property
@@ -127,53 +239,182 @@ class Vente(models.Model):
         return nom if nom else "Client comptant"
 
     def calculer_total(self):
-        total = sum(ligne.prix_unitaire_vente * ligne.quantite for ligne in self.lignes.all())
+        total = self.lignes.aggregate(total=LigneDeVente.expression_sous_total())['total'] or Decimal('0')
         self.total = total
         self.save(update_fields=["total"])
         return total
 
+    @classmethod
+    def recalculer_totaux(cls, vente_ids):
+        """Recalcule le total de plusieurs ventes en un seul UPDATE (sans les charger)."""
+        sous_totaux = (
+            LigneDeVente.objects
+            .filter(vente=OuterRef('pk'))
+            .values('vente')
+            .annotate(total=LigneDeVente.expression_sous_total())
+            .values('total')
+        )
+        return cls.objects.filter(pk__in=vente_ids).update(
+            total=Coalesce(Subquery(sous_totaux), Value(Decimal('0.00')), output_field=models.DecimalField())
+        )
+
+    @classmethod
+    def ajouter_au_total(cls, vente_id, delta):
+        """Maintenance incrémentale du total : ajoute (ou retire) le delta d'une ligne."""
+        if delta:
+            cls.objects.filter(pk=vente_id).update(total=F('total') + delta)
+
     def finaliser(self):
+        """
+        Finalise la vente : sort du stock toutes les lignes en un nombre constant de requêtes.
+
+        Les produits concernés sont verrouillés en une seule requête (select_for_update),
+        le stock est vérifié pour tout le panier, puis les décréments sont appliqués
+        par bulk_update et les mouvements créés par bulk_create.
+        La vente est d'abord réservée par un UPDATE conditionnel : deux workers qui
+        finalisent la même vente ne sortent le stock qu'une fois.
+        """
         if self.est_complete:
             return False
-        for ligne in self.lignes.all():
-            ligne.produit.ajuster_stock(
-                quantite=ligne.quantite,
-                type_mouvement='SORTIE_VENTE',
-                utilisateur=self.vendeur,
-                raison=f"Vente #{self.id}",
-                date_mouvement = self.date_vente.date(),
+
+        with transaction.atomic():
+            # Réserver la vente : une seule finalisation peut aboutir, même en parallèle
+            reservee = Vente.objects.filter(pk=self.pk, est_complete=False).update(
+                est_complete=True,
+                statut=self._expression_statut(F('montant_encaisse')),
             )
-        self.est_complete = True
-        self._maj_statut()   # met à jour en fonction de montant_encaisse
-        self.save(update_fields=["est_complete", "statut"])
+            if not reservee:
+                return False
+
+            lignes = list(self.lignes.values_list('produit_id', 'quantite', 'prix_unitaire_vente'))
+
+            # Un même produit peut apparaître sur plusieurs lignes du panier
+            quantites = {}
+            for produit_id, quantite, _ in lignes:
+                quantites[produit_id] = quantites.get(produit_id, 0) + quantite
+
+            produits = Produit.objects.select_for_update().in_bulk(list(quantites))
+
+            # Vérifier le stock de tout le panier avant de toucher quoi que ce soit
+            erreurs = [
+                f"Stock insuffisant pour {produits[pid].nom}. Disponible: {produits[pid].quantite_stock}"
+                for pid, quantite in quantites.items()
+                if produits[pid].quantite_stock < quantite
+            ]
+            if erreurs:
+                raise ValidationError(erreurs)
+
+            # Stock avant la vente, décompté ligne à ligne pour le solde de chaque mouvement
+            soldes = {pid: produit.quantite_stock for pid, produit in produits.items()}
+            maintenant = timezone.now()
+            for pid, quantite in quantites.items():
+                produits[pid].quantite_stock -= quantite
+                produits[pid].frequence_ventes += 1
+                produits[pid].date_modification = maintenant
+            Produit.objects.bulk_update(produits.values(), ['quantite_stock', 'frequence_ventes', 'date_modification'])
+            # Coût figé sur les lignes, lu sur les produits verrouillés : le même que dans les résumés
+            self.lignes.update(prix_achat_unitaire=Subquery(
+                Produit.objects.filter(pk=OuterRef('produit_id')).values('prix_achat')[:1]
+            ))
+
+            raison = f"Vente #{self.id}"
+            date_mouvement = self.jour_vente
+            mouvements = []
+            for produit_id, quantite, _ in lignes:
+                soldes[produit_id] -= quantite
+                mouvements.append(MouvementStock(
+                    produit_id=produit_id,
+                    type_mouvement='SORTIE_VENTE',
+                    quantite=quantite,
+                    utilisateur_id=self.vendeur_id,
+                    raison=raison,
+                    date_mouvement=date_mouvement,
+                    vente=self,
+                    stock_apres=soldes[produit_id],
+                ))
+            MouvementStock.objects.bulk_create(mouvements)
+
+            self.refresh_from_db(fields=["est_complete", "statut", "total", "montant_encaisse"])
+            self._cumuler_resumes(lignes, produits)
+            invalider_kpis(BOUTIQUE)
+            metriques.compter_apres_commit(metriques.VENTES_FINALISEES)
+
+        # bulk_create n'émet pas post_save : on vérifie les seuils nous-mêmes
+        for produit in produits.values():
+            alerter_si_stock_bas(produit)
         return True
 
+    def _cumuler_resumes(self, lignes, produits):
+        """Ajoute la vente qui vient d'être finalisée aux résumés journaliers."""
+        par_categorie = {}
+        for produit_id, quantite, prix in lignes:
+            produit = produits[produit_id]
+            cumul = par_categorie.setdefault(produit.categorie_id, [0, Decimal('0'), Decimal('0')])
+            cumul[0] += quantite
+            cumul[1] += prix * quantite
+            cumul[2] += produit.prix_achat * quantite
+
+        for categorie_id, (quantite, ca, cout) in par_categorie.items():
+            ResumeVentesCategorieJour.cumuler(
+                {'jour': self.jour_vente, 'categorie_id': categorie_id},
+                quantite=quantite, chiffre_affaires=ca, cout_achat=cout,
+            )
+        ResumeVentesJour.cumuler(
+            {'jour': self.jour_vente, 'vendeur_id': self.vendeur_id},
+            nb_ventes=1,
+            chiffre_affaires=sum(c[1] for c in par_categorie.values()),
+            cout_achat=sum(c[2] for c in par_categorie.values()),
+            montant_encaisse=self.montant_encaisse,
+            reste_a_payer=max(self.reste_a_payer, Decimal('0')),
+        )
+
     @property
     def reste_a_payer(self):
         return (self.total or Decimal('0')) - (self.montant_encaisse or Decimal('0'))
 
-    def _maj_statut(self):
-        if self.montant_encaisse >= self.total:
-            self.statut = self.STATUT_PAYEE
-        elif self.montant_encaisse > 0:
-            self.statut = self.STATUT_PARTIELLE
-        else:
-            self.statut = self.STATUT_IMPAYEE
+    @classmethod
+    def _expression_statut(cls, encaisse):
+        """Statut (payée / partielle / impayée) calculé par la base dans un UPDATE."""
+        return Case(
+            When(GreaterThanOrEqual(encaisse, F('total')), then=Value(cls.STATUT_PAYEE)),
+            When(GreaterThan(encaisse, Decimal('0')), then=Value(cls.STATUT_PARTIELLE)),
+            default=Value(cls.STATUT_IMPAYEE),
+        )
 
     def enregistrer_paiement(self, montant, utilisateur=None, mode="ESPECES", note=""):
-        """Ajoute un paiement et met à jour l’encaissement + statut."""
+        """
+        Ajoute un paiement et met à jour l’encaissement + statut.
+
+        L'encaissement est incrémenté par un UPDATE atomique (montant_encaisse + montant) :
+        deux paiements simultanés sur la même vente sont tous deux comptés.
+        """
         if montant <= 0:
             raise ValidationError("Le montant du paiement doit être positif.")
-        Paiement.objects.create(
-            vente=self,
-            montant=montant,
-            mode=mode,
-            enregistre_par=utilisateur,
-            note=note
-        )
-        self.montant_encaisse = (self.montant_encaisse or Decimal('0')) + Decimal(montant)
-        self._maj_statut()
-        self.save(update_fields=["montant_encaisse", "statut"])
+        montant = Decimal(montant)
+        with transaction.atomic():
+            Paiement.objects.create(
+                vente=self,
+                montant=montant,
+                mode=mode,
+                enregistre_par=utilisateur,
+                note=note
+            )
+            metriques.compter_apres_commit(metriques.PAIEMENTS)
+            nouvel_encaissement = F('montant_encaisse') + montant
+            Vente.objects.filter(pk=self.pk).update(
+                montant_encaisse=nouvel_encaissement,
+                statut=self._expression_statut(nouvel_encaissement),
+            )
+            self.refresh_from_db(fields=["montant_encaisse", "statut", "total", "est_complete"])
+
+            if self.est_complete:
+                reste_avant = max(self.reste_a_payer + montant, Decimal('0'))
+                ResumeVentesJour.cumuler(
+                    {'jour': self.jour_vente, 'vendeur_id': self.vendeur_id},
+                    montant_encaisse=montant,
+                    reste_a_payer=max(self.reste_a_payer, Decimal('0')) - reste_avant,
+                )
+                invalider_kpis(BOUTIQUE)
 
 
 class LigneDeVente(models.Model):
@@ -181,6 +422,9 @@ class LigneDeVente(models.Model):
     produit = models.ForeignKey(Produit, on_delete=models.PROTECT)
     quantite = models.PositiveIntegerField()
     prix_unitaire_vente = models.DecimalField(max_digits=10, decimal_places=2)
+    # Prix d'achat du produit figé à la finalisation : coût des résumés de ventes,
+    # y compris quand ils sont reconstruits après un changement de prix
+    prix_achat_unitaire = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
     
     class Meta:
         verbose_name = "Ligne de vente"
@@ -191,12 +435,36 @@ class LigneDeVente(models.Model):
     
     def clean(self):
         """Valide que le stock est suffisant"""
-        if self.quantite > self.produit.quantite_stock:
+        if self.produit_id is not None and self.quantite > self.produit.quantite_stock:
             raise ValidationError(f"Stock insuffisant pour {self.produit.nom}. Disponible: {self.produit.quantite_stock}")
     
     def sous_total(self):
         """Calcule le sous-total de la ligne"""
         return self.prix_unitaire_vente * self.quantite
+
+    @staticmethod
+    def expression_sous_total():
+        """Somme SQL des sous-totaux (prix_unitaire_vente * quantite)."""
+        return Sum(
+            F('prix_unitaire_vente') * F('quantite'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ligne = super().from_db(db, field_names, values)
+        ligne.memoriser_contribution()
+        return ligne
+
+    def memoriser_contribution(self):
+        """
+        Retient la part de cette ligne dans le total de sa vente, telle qu'en base,
+        pour que les signaux puissent appliquer un delta au lieu de tout recalculer.
+        """
+        if {'vente_id', 'quantite', 'prix_unitaire_vente'} & self.get_deferred_fields():
+            self._contribution = None
+        else:
+            self._contribution = (self.vente_id, self.sous_total())
     
 class Paiement(models.Model):
     MODE_CHOIX = [
@@ -226,6 +494,9 @@ class MouvementStock(models.Model):
         ('AJUSTEMENT_PLUS', 'Ajustement manuel (+)'),
         ('AJUSTEMENT_MOINS', 'Ajustement manuel (-)'),
     )
+    # Types qui retirent du stock (les autres en ajoutent)
+    SORTIES = ('SORTIE_VENTE', 'AJUSTEMENT_MOINS')
+
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='mouvements')
     type_mouvement = models.CharField(max_length=20, choices=TYPE_MOUVEMENT)
     quantite = models.PositiveIntegerField()
@@ -235,11 +506,429 @@ class MouvementStock(models.Model):
     date_mouvement=models.DateField(default=timezone.localdate())
     created_at= models.DateTimeField(auto_now_add=True)
     vente = models.ForeignKey("Vente", null=True,blank=True, on_delete=models.SET_NULL, related_name="mouvements_stock")
+    inventaire = models.ForeignKey(
+        "Inventaire", null=True, blank=True, on_delete=models.SET_NULL, related_name="mouvements",
+    )
+    # Stock du produit juste après ce mouvement, dans l'ordre d'enregistrement
+    stock_apres = models.IntegerField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Mouvement de stock"
         verbose_name_plural = "Mouvements de stock"
         ordering = ['-date_mouvement']
+        indexes = [
+            models.Index(fields=['date_mouvement', 'id'], name='mouvement_date_id_idx'),
+            models.Index(fields=['produit', 'date_mouvement', 'id'], name='mouvement_produit_date_idx'),
+            # Mouvements antidatés enregistrés après un instantané (voir InstantaneStock.stocks_au)
+            models.Index(fields=['produit', 'created_at'], name='mouvement_produit_cree_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produit.nom} : {self.quantite} ({self.get_type_mouvement_display()})"
+
+    @property
+    def variation(self):
+        """Quantité signée : négative pour une sortie."""
+        return -self.quantite if self.type_mouvement in self.SORTIES else self.quantite
+
+    @classmethod
+    def expression_variation(cls):
+        """Quantité signée calculée par la base (négative pour une sortie)."""
+        return Case(
+            When(type_mouvement__in=cls.SORTIES, then=-F('quantite')),
+            default=F('quantite'),
+            output_field=models.IntegerField(),
+        )
+
+    @classmethod
+    def recalculer_soldes(cls, produit_ids=None):
+        """
+        Recalcule stock_apres en remontant l'historique de chaque produit depuis
+        son stock actuel (mouvements du plus récent au plus ancien). Sert au
+        premier remplissage et après une correction de stock hors mouvement.
+        Renvoie le nombre de mouvements mis à jour.
+        """
+        mouvements = cls.objects.order_by('produit_id', '-pk')
+        if produit_ids is not None:
+            mouvements = mouvements.filter(produit_id__in=produit_ids)
+        lot, nombre, produit_courant, solde = [], 0, None, 0
+        with transaction.atomic():
+            for pk, produit_id, type_mouvement, quantite, stock_actuel in mouvements.values_list(
+                'pk', 'produit_id', 'type_mouvement', 'quantite', 'produit__quantite_stock',
+            ).iterator(chunk_size=2000):
+                if produit_id != produit_courant:
+                    produit_courant, solde = produit_id, stock_actuel
+                lot.append(cls(pk=pk, stock_apres=solde))
+                solde += quantite if type_mouvement in cls.SORTIES else -quantite
+                if len(lot) == 1000:
+                    nombre += cls.objects.bulk_update(lot, ['stock_apres'])
+                    lot = []
+            nombre += cls.objects.bulk_update(lot, ['stock_apres'])
+        return nombre
+
+
+class Inventaire(models.Model):
+    """
+    Session d'inventaire (comptage physique du stock).
+
+    L'ouverture fige la quantité attendue de chaque produit du périmètre. Les
+    quantités comptées sont ensuite saisies en parallèle, rayon par rayon
+    (catégorie). L'application transforme tous les écarts en mouvements
+    AJUSTEMENT_PLUS / AJUSTEMENT_MOINS liés à la session, en un nombre de
+    requêtes qui ne dépend pas du nombre de produits.
+    """
+    STATUT_EN_COURS = 'EN_COURS'
+    STATUT_APPLIQUE = 'APPLIQUE'
+    STATUT_ANNULE = 'ANNULE'
+    STATUT_CHOIX = [
+        (STATUT_EN_COURS, 'En cours'),
+        (STATUT_APPLIQUE, 'Appliqué'),
+        (STATUT_ANNULE, 'Annulé'),
+    ]
+
+    # Lignes écrites par requête (UPDATE … CASE, bulk_create / bulk_update)
+    TAILLE_LOT = 500
+
+    nom = models.CharField(max_length=200, help_text="Ex: Inventaire annuel 2025")
+    categorie = models.ForeignKey(
+        Categorie, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+        help_text="Vide : tout le catalogue",
+    )
+    statut = models.CharField(max_length=10, choices=STATUT_CHOIX, default=STATUT_EN_COURS)
+    ouvert_par = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+')
+    date_ouverture = models.DateTimeField(auto_now_add=True)
+    applique_par = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+    )
+    date_application = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Inventaire"
+        verbose_name_plural = "Inventaires"
+        ordering = ['-date_ouverture']
+
+    def __str__(self):
+        return f"{self.nom} ({self.get_statut_display()})"
+
+    @property
+    def est_en_cours(self):
+        return self.statut == self.STATUT_EN_COURS
+
+    @classmethod
+    def ouvrir(cls, nom, utilisateur, categorie=None):
+        """Crée la session et fige le stock attendu de chaque produit (une lecture, des INSERT par lots)."""
+        produits = Produit.objects.all() if categorie is None else Produit.objects.filter(categorie=categorie)
+        with transaction.atomic():
+            inventaire = cls.objects.create(nom=nom, categorie=categorie, ouvert_par=utilisateur)
+            LigneInventaire.objects.bulk_create([
+                LigneInventaire(
+                    inventaire=inventaire, produit_id=produit_id, categorie_id=categorie_id, quantite_attendue=quantite,
+                )
+                for produit_id, categorie_id, quantite in produits.values_list('pk', 'categorie_id', 'quantite_stock')
+            ], batch_size=cls.TAILLE_LOT)
+        return inventaire
+
+    def enregistrer_comptages(self, comptages, utilisateur):
+        """
+        Enregistre des quantités comptées {produit_id: quantité} (None efface le
+        comptage) et renvoie le nombre de lignes écrites.
+
+        Un UPDATE par lot (CASE produit_id WHEN …) au lieu d'un par produit ;
+        seules les lignes données sont écrites, les saisies faites en même
+        temps dans d'autres rayons ne sont pas touchées.
+        """
+        comptages = list(comptages.items())
+        lignes = self.lignes.filter(inventaire__statut=self.STATUT_EN_COURS)
+        maintenant = timezone.now()
+        ecrites = 0
+        for debut in range(0, len(comptages), self.TAILLE_LOT):
+            lot = comptages[debut:debut + self.TAILLE_LOT]
+            ecrites += lignes.filter(produit_id__in=[produit_id for produit_id, _ in lot]).update(
+                quantite_comptee=Case(
+                    *[When(produit_id=produit_id, then=Value(quantite)) for produit_id, quantite in lot],
+                    output_field=models.PositiveIntegerField(),
+                ),
+                compte_par=utilisateur,
+                date_comptage=maintenant,
+            )
+        return ecrites
+
+    def ecarts(self):
+        """Lignes comptées dont la quantité diffère de l'attendu, annotées de `ecart` (compté − attendu)."""
+        return (
+            self.lignes.exclude(quantite_comptee=None)
+            .annotate(ecart=ExpressionWrapper(
+                F('quantite_comptee') - F('quantite_attendue'), output_field=models.IntegerField(),
+            ))
+            .exclude(ecart=0)
+        )
+
+    def resume(self):
+        """Avancement et écarts de la session, calculés par la base en une requête."""
+        comptee = Q(quantite_comptee__isnull=False)
+        ecart = F('quantite_comptee') - F('quantite_attendue')
+        return self.lignes.aggregate(
+            nb_produits=Count('pk'),
+            nb_comptes=Count('quantite_comptee'),
+            nb_ecarts=Count('pk', filter=comptee & ~Q(quantite_comptee=F('quantite_attendue'))),
+            valeur_ecarts=Coalesce(
+                Sum(ecart * F('produit__prix_achat'), filter=comptee,
+                    output_field=models.DecimalField(max_digits=14, decimal_places=2)),
+                Value(Decimal('0.00')),
+            ),
+        )
+
+    def rayons(self):
+        """Avancement du comptage par catégorie figée à l'ouverture."""
+        return (
+            self.lignes.values('categorie', 'categorie__nom')
+            .annotate(nb_produits=Count('pk'), nb_comptes=Count('quantite_comptee'))
+            .order_by('categorie__nom')
+        )
+
+    def appliquer(self, utilisateur, date_mouvement=None):
+        """
+        Applique tous les écarts comptés et renvoie le nombre de mouvements
+        créés, ou None si la session n'est plus en cours.
+
+        L'écart (compté − attendu à l'ouverture) est ajouté au stock actuel :
+        les ventes et entrées enregistrées depuis l'ouverture restent prises en
+        compte. Produits verrouillés en une requête, stocks écrits par
+        bulk_update, mouvements créés par bulk_create. Comme pour
+        Vente.finaliser, la session est d'abord réservée par un UPDATE
+        conditionnel : deux clics simultanés n'appliquent les écarts qu'une fois.
+        """
+        maintenant = timezone.now()
+        with transaction.atomic():
+            reservee = Inventaire.objects.filter(pk=self.pk, statut=self.STATUT_EN_COURS).update(
+                statut=self.STATUT_APPLIQUE, applique_par=utilisateur, date_application=maintenant,
+            )
+            if not reservee:
+                return None
+
+            ecarts = dict(self.ecarts().values_list('produit_id', 'ecart'))
+            produits = Produit.objects.select_for_update().in_bulk(list(ecarts))
+            raison = f"Inventaire #{self.pk} : {self.nom}"
+            date_mouvement = date_mouvement or timezone.localdate()
+            mouvements = []
+            for produit_id, ecart in ecarts.items():
+                produit = produits[produit_id]
+                avant = produit.quantite_stock
+                produit.quantite_stock = max(avant + ecart, 0)
+                produit.date_modification = maintenant
+                applique = produit.quantite_stock - avant
+                if applique:
+                    mouvements.append(MouvementStock(
+                        produit=produit,
+                        type_mouvement='AJUSTEMENT_PLUS' if applique > 0 else 'AJUSTEMENT_MOINS',
+                        quantite=abs(applique),
+                        utilisateur=utilisateur,
+                        raison=raison,
+                        date_mouvement=date_mouvement,
+                        inventaire=self,
+                        stock_apres=produit.quantite_stock,
+                    ))
+            Produit.objects.bulk_update(
+                [mouvement.produit for mouvement in mouvements], ['quantite_stock', 'date_modification'],
+                batch_size=self.TAILLE_LOT,
+            )
+            MouvementStock.objects.bulk_create(mouvements, batch_size=self.TAILLE_LOT)
+            self.refresh_from_db(fields=['statut', 'applique_par', 'date_application'])
+            invalider_kpis(BOUTIQUE)
+
+        # bulk_create n'émet pas post_save : on vérifie les seuils nous-mêmes
+        for mouvement in mouvements:
+            if mouvement.type_mouvement == 'AJUSTEMENT_MOINS':
+                alerter_si_stock_bas(mouvement.produit)
+        return len(mouvements)
+
+    def annuler(self):
+        """Abandonne une session en cours sans toucher au stock."""
+        annulee = Inventaire.objects.filter(pk=self.pk, statut=self.STATUT_EN_COURS).update(statut=self.STATUT_ANNULE)
+        self.refresh_from_db(fields=['statut'])
+        return bool(annulee)
+
+
+class LigneInventaire(models.Model):
+    """Un produit d'une session d'inventaire : quantité attendue (figée) et quantité comptée."""
+    inventaire = models.ForeignKey(Inventaire, on_delete=models.CASCADE, related_name='lignes')
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='+')
+    # Rayon du comptage : catégorie du produit à l'ouverture
+    categorie = models.ForeignKey(Categorie, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    quantite_attendue = models.PositiveIntegerField()
+    quantite_comptee = models.PositiveIntegerField(null=True, blank=True)
+    compte_par = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+    )
+    date_comptage = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Ligne d'inventaire"
+        verbose_name_plural = "Lignes d'inventaire"
+        constraints = [
+            models.UniqueConstraint(fields=['inventaire', 'produit'], name='ligne_inventaire_produit_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['inventaire', 'categorie'], name='ligne_inventaire_rayon_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.produit.nom} : {self.quantite} ({self.get_type_mouvement_display()})"
\ No newline at end of file
+        return f"Produit {self.produit_id} : {self.quantite_comptee}/{self.quantite_attendue}"
+
+
+class InstantaneStock(models.Model):
+    """
+    Stock d'un produit en fin de journée, figé périodiquement (commande
+    instantanes_stock, en fin de mois par défaut). Le stock et sa valeur à une
+    date quelconque se lisent alors dans l'instantané précédent, complété des
+    quelques mouvements datés depuis (voir stocks_au), au lieu de rejouer tout
+    l'historique des mouvements.
+    """
+    jour = models.DateField()
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='+')
+    quantite = models.IntegerField()
+    prix_achat = models.DecimalField(max_digits=10, decimal_places=2)
+    # Les mouvements antidatés enregistrés après ce calcul corrigent l'instantané
+    date_calcul = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Instantané de stock"
+        verbose_name_plural = "Instantanés de stock"
+        constraints = [
+            models.UniqueConstraint(fields=['jour', 'produit'], name='instantane_stock_jour_produit_unique'),
+        ]
+
+    def __str__(self):
+        return f"Produit {self.produit_id} le {self.jour:%d/%m/%Y} : {self.quantite}"
+
+    @staticmethod
+    def _somme_variations(filtre):
+        """Sous-requête : variation totale des mouvements `filtre` du produit de la ligne (0 si aucun)."""
+        return Coalesce(
+            Subquery(
+                MouvementStock.objects.filter(filtre, produit=OuterRef('pk'))
+                .order_by()
+                .values('produit')
+                .annotate(total=Sum(MouvementStock.expression_variation()))
+                .values('total')
+            ),
+            Value(0),
+        )
+
+    @classmethod
+    def stocks_au(cls, jour, depuis_instantane=True):
+        """
+        Produits existant en fin de `jour` (créés avant, ou ayant déjà un
+        mouvement daté à ce jour pour les fiches importées après coup),
+        annotés de `quantite_au`, `prix_achat_au` et `valeur_au` (stock
+        valorisé au prix d'achat).
+
+        Quantité = instantané le plus récent à cette date + mouvements datés
+        entre les deux + mouvements antidatés enregistrés après l'instantané,
+        le tout en sous-requêtes indexées d'une seule requête. Le prix d'achat
+        est celui de l'instantané (le prix actuel sans instantané). Sans
+        instantané antérieur, on remonte depuis le stock actuel en retirant
+        les mouvements datés après `jour`.
+        """
+        produits = Produit.objects.filter(
+            Q(date_creation__lt=bornes_jour(jour)[1])
+            | Exists(MouvementStock.objects.filter(produit=OuterRef('pk'), date_mouvement__lte=jour))
+        )
+        base = None
+        if depuis_instantane:
+            base = cls.objects.filter(jour__lte=jour).order_by('-jour').values('jour', 'date_calcul').first()
+        quantite = F('quantite_stock') - cls._somme_variations(Q(date_mouvement__gt=jour))
+        prix = F('prix_achat')
+        if base is not None:
+            instantane = cls.objects.filter(jour=base['jour'], produit=OuterRef('pk'))
+            # Produit absent de l'instantané (fiche créée depuis) : NULL, donc calcul sans instantané
+            quantite = Coalesce(
+                Subquery(instantane.values('quantite'))
+                + cls._somme_variations(Q(date_mouvement__gt=base['jour'], date_mouvement__lte=jour))
+                + cls._somme_variations(Q(date_mouvement__lte=base['jour'], created_at__gt=base['date_calcul'])),
+                quantite,
+            )
+            prix = Coalesce(Subquery(instantane.values('prix_achat')), prix)
+        return produits.annotate(quantite_au=quantite, prix_achat_au=prix).annotate(
+            valeur_au=ExpressionWrapper(
+                F('quantite_au') * F('prix_achat_au'), output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+
+    @classmethod
+    def prendre(cls, jour):
+        """
+        Fige le stock de chaque produit en fin de `jour` (remplace l'instantané
+        de ce jour s'il existe) : stock actuel moins les mouvements datés après
+        `jour`, lus en une requête. Renvoie le nombre de lignes créées.
+        """
+        with transaction.atomic():
+            # Chaque écriture de mouvement verrouille son produit (mise à jour du
+            # stock) avant de l'insérer. Une fois tous les produits verrouillés, un
+            # mouvement créé avant `maintenant` est donc validé et compté par la
+            # lecture ; un mouvement créé après attend notre commit, n'est pas lu et
+            # sera compté en correction (created_at > date_calcul) : une seule fois.
+            list(Produit.objects.select_for_update().order_by('pk').values_list('pk', flat=True))
+            maintenant = timezone.now()
+            lignes = list(
+                cls.stocks_au(jour, depuis_instantane=False).values_list('pk', 'quantite_au', 'prix_achat_au')
+            )
+            cls.objects.filter(jour=jour).delete()
+            cls.objects.bulk_create([
+                cls(jour=jour, produit_id=produit_id, quantite=quantite, prix_achat=prix_achat, date_calcul=maintenant)
+                for produit_id, quantite, prix_achat in lignes
+            ], batch_size=1000)
+        return len(lignes)
+
+
+class ResumeVentesJour(ResumeJournalier):
+    """Ventes finalisées d'un jour pour un vendeur (maintenu par finaliser() et les paiements)."""
+    vendeur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    nb_ventes = models.PositiveIntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cout_achat = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    montant_encaisse = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    reste_a_payer = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Résumé journalier des ventes"
+        verbose_name_plural = "Résumés journaliers des ventes"
+        constraints = [
+            models.UniqueConstraint(fields=['jour', 'vendeur'], name='resume_ventes_jour_vendeur_unique'),
+        ]
+
+    def __str__(self):
+        return f"Ventes du {self.jour:%d/%m/%Y} ({self.vendeur_id})"
+
+
+class ResumeVentesCategorieJour(ResumeJournalier):
+    """Ventes finalisées d'un jour pour une catégorie de produits."""
+    categorie = models.ForeignKey(Categorie, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    quantite = models.PositiveIntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cout_achat = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Résumé journalier par catégorie"
+        verbose_name_plural = "Résumés journaliers par catégorie"
+        constraints = [
+            models.UniqueConstraint(fields=['jour', 'categorie'], name='resume_ventes_jour_categorie_unique'),
+            # Les NULL sont distincts pour une contrainte unique : une seule ligne « sans catégorie » par jour
+            models.UniqueConstraint(
+                fields=['jour'], condition=Q(categorie__isnull=True), name='resume_ventes_jour_sans_categorie_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Catégorie {self.categorie_id} le {self.jour:%d/%m/%Y}"
+
+    @classmethod
+    def reporter_sans_categorie(cls, categorie_id):
+        """Cumule les lignes d'une catégorie supprimée sur les lignes « sans catégorie » des mêmes jours."""
+        with transaction.atomic():
+            for resume in cls.objects.select_for_update().filter(categorie_id=categorie_id):
+                cls.cumuler(
+                    {'jour': resume.jour, 'categorie': None},
+                    quantite=resume.quantite, chiffre_affaires=resume.chiffre_affaires, cout_achat=resume.cout_achat,
+                )
+                resume.delete()
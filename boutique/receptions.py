@@ -0,0 +1,298 @@
+# boutique/receptions.py
+
+"""
+Réception en lot d'une livraison fournisseur : fichier CSV ou lignes collées
+depuis la facture (tableur, e-mail), via la vue reception_stock ou la
+commande receptionner_stock.
+
+Chaque ligne désigne un produit par sa référence (SKU / code-barres) ou, à
+défaut, par son nom comparé sans accents ni casse. Les produits inconnus sont
+créés et le prix d'achat est mis à jour. Toute la livraison est appliquée
+dans une seule transaction, en un nombre de requêtes indépendant du nombre de
+lignes : produits lus et verrouillés en une requête, stocks et prix écrits
+par bulk_update, nouveaux produits et mouvements ENTREE créés par
+bulk_create. Une ligne invalide est signalée avec son numéro sans empêcher
+l'application des autres.
+
+Les écritures en lot contournent Produit.save() et les signaux : les champs
+dérivés passent par Produit.normaliser(), les indicateurs sont invalidés
+explicitement, et frequence_ventes / date_creation prennent leurs valeurs
+par défaut à la création.
+"""
+
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import referentiel
+from core.cache_kpi import BOUTIQUE, invalider_kpis
+from .models import Categorie, MouvementStock, Produit, normaliser_recherche
+
+# Colonne -> en-têtes acceptés (normalisés : minuscules, sans accents, « _ »)
+COLONNES = {
+    'reference': ('reference', 'ref', 'sku', 'code', 'code_barres', 'ean'),
+    'nom': ('nom', 'produit', 'designation', 'article', 'libelle'),
+    'quantite': ('quantite', 'qte', 'qty', 'quantity'),
+    'prix_achat': ('prix_achat', 'prix_d_achat', 'pa', 'prix', 'prix_unitaire', 'pu', 'cout'),
+    'prix_vente': ('prix_vente', 'prix_de_vente', 'pv'),
+    'categorie': ('categorie', 'famille'),
+}
+
+# Ordre des colonnes quand le texte collé n'a pas de ligne d'en-tête
+ORDRE_PAR_DEFAUT = ('reference', 'nom', 'quantite', 'prix_achat', 'prix_vente', 'categorie')
+
+_PRIX_MAX = Decimal('99999999.99')  # DecimalField(max_digits=10, decimal_places=2)
+
+
+class RapportReception:
+    """Bilan d'une réception : compteurs et erreurs (numéro de ligne, message)."""
+
+    def __init__(self):
+        self.lignes_appliquees = 0
+        self.unites = 0
+        self.produits_crees = []
+        self.produits_mis_a_jour = 0
+        self.erreurs = []
+
+    def __str__(self):
+        return (
+            f"{self.lignes_appliquees} lignes appliquées ({self.unites} unités), "
+            f"{len(self.produits_crees)} produits créés, {self.produits_mis_a_jour} mis à jour, "
+            f"{len(self.erreurs)} lignes en erreur"
+        )
+
+
+def _nom_colonne(entete):
+    return '_'.join(normaliser_recherche(entete).replace("'", ' ').replace('-', ' ').replace('.', ' ').split())
+
+
+def lire_reception(texte):
+    """
+    Lignes d'une livraison : liste de (numéro de ligne, {colonne: texte}).
+
+    Séparateur détecté sur la première ligne (tabulation du tableur, « ; » du
+    CSV Excel français, sinon « , »). La ligne d'en-tête est facultative ;
+    sans elle les colonnes suivent ORDRE_PAR_DEFAUT.
+    """
+    lignes = (texte or '').lstrip('\ufeff').splitlines()
+    premiere = next((ligne for ligne in lignes if ligne.strip()), '')
+    separateur = '\t' if '\t' in premiere else ';' if ';' in premiere else ','
+
+    alias = {nom: colonne for colonne, noms in COLONNES.items() for nom in noms}
+    colonnes = None
+    resultat = []
+    for numero, cellules in enumerate(csv.reader(lignes, delimiter=separateur), 1):
+        cellules = [cellule.strip() for cellule in cellules]
+        if not any(cellules):
+            continue
+        if colonnes is None:
+            reconnues = [alias.get(_nom_colonne(cellule)) for cellule in cellules]
+            if any(reconnues):
+                if 'quantite' not in reconnues:
+                    raise ValidationError("Ligne d'en-tête sans colonne de quantité.")
+                colonnes = reconnues
+                continue
+            colonnes = ORDRE_PAR_DEFAUT
+        resultat.append((numero, {
+            colonne: cellule for colonne, cellule in zip(colonnes, cellules) if colonne and cellule
+        }))
+    return resultat
+
+
+def _nombre(texte, libelle):
+    try:
+        nombre = Decimal(texte.replace(' ', '').replace('\xa0', '').replace(',', '.'))
+    except InvalidOperation:
+        nombre = None
+    if nombre is None or not nombre.is_finite():
+        raise ValidationError(f"{libelle} illisible : « {texte} ».")
+    return nombre
+
+
+def _prix(champs, colonne, libelle):
+    if not champs.get(colonne):
+        return None
+    prix = _nombre(champs[colonne], libelle).quantize(Decimal('0.01'))
+    if not 0 <= prix <= _PRIX_MAX:
+        raise ValidationError(f"{libelle} hors limites : {champs[colonne]}.")
+    return prix
+
+
+def _valider(champs):
+    """Valeurs d'une ligne lue par lire_reception(), ou ValidationError."""
+    reference = champs.get('reference') or None
+    nom = ' '.join(champs.get('nom', '').split())
+    if not reference and not nom:
+        raise ValidationError("Ni référence ni nom de produit.")
+    if reference and len(reference) > Produit._meta.get_field('reference').max_length:
+        raise ValidationError(f"Référence trop longue : {reference}.")
+    if len(nom) > Produit._meta.get_field('nom').max_length:
+        raise ValidationError("Nom de produit trop long.")
+    if not champs.get('quantite'):
+        raise ValidationError("Quantité manquante.")
+    quantite = _nombre(champs['quantite'], "Quantité")
+    if quantite <= 0 or quantite != quantite.to_integral_value():
+        raise ValidationError(f"Quantité invalide : {champs['quantite']} (entier positif attendu).")
+    return {
+        'reference': reference,
+        'nom': nom,
+        'cle': normaliser_recherche(nom),
+        'quantite': int(quantite),
+        'prix_achat': _prix(champs, 'prix_achat', "Prix d'achat"),
+        'prix_vente': _prix(champs, 'prix_vente', "Prix de vente"),
+        'categorie': champs.get('categorie', '').strip(),
+    }
+
+
+def receptionner(lignes, utilisateur=None, raison=None, date_mouvement=None, creer_produits=True):
+    """
+    Applique une livraison (lignes de lire_reception) et renvoie son RapportReception.
+
+    Le prix d'achat (et le prix de vente s'il est fourni) des produits reçus
+    prend la valeur de la facture. Un produit inconnu est créé si
+    `creer_produits`, à condition d'avoir un nom, un prix d'achat et un prix
+    de vente ; sinon la ligne est en erreur.
+    """
+    rapport = RapportReception()
+    valides = []
+    for numero, champs in lignes:
+        try:
+            valides.append((numero, _valider(champs)))
+        except ValidationError as erreur:
+            rapport.erreurs.append((numero, ' '.join(erreur.messages)))
+    if not valides:
+        return rapport
+
+    references = {ligne['reference'] for _, ligne in valides if ligne['reference']}
+    cles = {ligne['cle'] for _, ligne in valides if ligne['cle']}
+    maintenant = timezone.now()
+
+    with transaction.atomic():
+        # Verrou sur les produits reçus : une vente en parallèle attend la fin de la réception
+        existants = list(
+            Produit.objects.select_for_update().filter(Q(reference__in=references) | Q(nom_recherche__in=cles))
+        )
+        par_reference = {produit.reference: produit for produit in existants if produit.reference}
+        par_nom = {}
+        for produit in existants:
+            par_nom.setdefault(produit.nom_recherche, []).append(produit)
+
+        nouveaux = {}   # ('reference' | 'nom', valeur) -> Produit à créer
+        recus = []      # (produit, ligne, stock après la ligne)
+        for numero, ligne in valides:
+            try:
+                produit = _produit_de_ligne(ligne, par_reference, par_nom, nouveaux, creer_produits)
+            except ValidationError as erreur:
+                rapport.erreurs.append((numero, ' '.join(erreur.messages)))
+                continue
+            produit.quantite_stock += ligne['quantite']
+            if ligne['prix_achat'] is not None:
+                produit.prix_achat = ligne['prix_achat']
+            if ligne['prix_vente'] is not None:
+                produit.prix_vente = ligne['prix_vente']
+            produit.date_modification = maintenant
+            recus.append((produit, ligne, produit.quantite_stock))
+        if not recus:
+            return rapport
+
+        for produit, _, _ in recus:
+            produit.normaliser()
+        mis_a_jour = {produit.pk: produit for produit, _, _ in recus if produit.pk is not None}
+        Produit.objects.bulk_update(
+            mis_a_jour.values(),
+            ['reference', 'quantite_stock', 'prix_achat', 'prix_vente', 'date_modification'],
+            batch_size=500,
+        )
+        crees = list(nouveaux.values())
+        _attribuer_categories(crees)
+        Produit.objects.bulk_create(crees, batch_size=500)
+
+        date_mouvement = date_mouvement or timezone.localdate()
+        MouvementStock.objects.bulk_create([
+            MouvementStock(
+                produit=produit,
+                type_mouvement='ENTREE',
+                quantite=ligne['quantite'],
+                utilisateur=utilisateur,
+                raison=raison,
+                date_mouvement=date_mouvement,
+                stock_apres=stock_apres,
+            )
+            for produit, ligne, stock_apres in recus
+        ], batch_size=500)
+        invalider_kpis(BOUTIQUE)
+
+    rapport.lignes_appliquees = len(recus)
+    rapport.unites = sum(ligne['quantite'] for _, ligne, _ in recus)
+    rapport.produits_crees = [produit.nom for produit in crees]
+    rapport.produits_mis_a_jour = len(mis_a_jour)
+    rapport.erreurs.sort()
+    return rapport
+
+
+def _produit_de_ligne(ligne, par_reference, par_nom, nouveaux, creer_produits):
+    """Produit (existant ou à créer) désigné par une ligne, ou ValidationError."""
+    reference = ligne['reference']
+    produit = par_reference.get(reference) if reference else None
+    if produit is None and ligne['cle']:
+        # Référence inconnue : un produit du même nom encore sans référence la reçoit
+        homonymes = [p for p in par_nom.get(ligne['cle'], []) if not reference or p.reference is None]
+        if len(homonymes) > 1:
+            raise ValidationError(
+                f"{len(homonymes)} produits s'appellent « {ligne['nom']} » : préciser la référence."
+            )
+        if homonymes:
+            produit = homonymes[0]
+            if reference:
+                produit.reference = reference
+                par_reference[reference] = produit
+    if produit is not None:
+        return produit
+
+    cle = ('reference', reference) if reference else ('nom', ligne['cle'])
+    if cle in nouveaux:
+        return nouveaux[cle]
+    if not creer_produits:
+        raise ValidationError(f"Produit inconnu : {ligne['reference'] or ligne['nom']}.")
+    manquants = [
+        libelle for libelle, valeur in
+        (('nom', ligne['nom']), ("prix d'achat", ligne['prix_achat']), ('prix de vente', ligne['prix_vente']))
+        if valeur in (None, '')
+    ]
+    if manquants:
+        raise ValidationError(
+            f"Produit inconnu : {ligne['reference'] or ligne['nom']} ; {', '.join(manquants)} requis pour le créer."
+        )
+    produit = Produit(
+        nom=ligne['nom'],
+        reference=ligne['reference'],
+        prix_achat=ligne['prix_achat'],
+        prix_vente=ligne['prix_vente'],
+        quantite_stock=0,
+    )
+    produit._categorie_recue = ligne['categorie']
+    nouveaux[cle] = produit
+    return produit
+
+
+def _attribuer_categories(produits):
+    """Catégorie des produits créés, reconnue sans accents ni casse ; les catégories inconnues sont créées."""
+    if not any(produit._categorie_recue for produit in produits):
+        return
+    connues = {normaliser_recherche(categorie.nom): categorie for categorie in referentiel.liste(Categorie)}
+    a_creer = {}
+    for produit in produits:
+        cle = normaliser_recherche(produit._categorie_recue)
+        if cle and cle not in connues:
+            a_creer.setdefault(cle, Categorie(nom=produit._categorie_recue))
+    if a_creer:
+        Categorie.objects.bulk_create(a_creer.values())
+        referentiel.invalider(Categorie)
+        connues.update(a_creer)
+    for produit in produits:
+        categorie = connues.get(normaliser_recherche(produit._categorie_recue))
+        produit.categorie_id = categorie.pk if categorie else None
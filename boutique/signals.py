@@ -1,10 +1,15 @@
 # boutique/signals.py
 
-from django.db.models.signals import post_save
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
-from .models import MouvementStock, Vente, LigneDeVente
+from core import referentiel
+from core.cache_kpi import BOUTIQUE, invalider_kpis
+from .models import (
+    Categorie, MouvementStock, Produit, Vente, LigneDeVente, ResumeVentesCategorieJour, alerter_si_stock_bas,
+)
 
 @receiver(post_save, sender=MouvementStock)
 def verifier_stock_bas(sender, instance, created, **kwargs):
@@ -13,33 +18,110 @@ def verifier_stock_bas(sender, instance, created, **kwargs):
     Note: La mise à jour du stock est maintenant gérée par la méthode ajuster_stock() du modèle Produit.
     """
     if created:
-        produit = instance.produit
-        
-        # Vérifier le seuil (sans modifier le stock qui est déjà géré)
-        if produit.est_stock_bas():
-            # ENVOYER UNE NOTIFICATION
-            message = f"ALERTE: Le stock de '{produit.nom}' est bas ({produit.quantite_stock}/{produit.seuil_stock_bas})!"
-            print(message)  # Pour le développement/debug
-            
-            # Créer une notification dans la base de données (si vous avez un modèle Notification)
-            # Notification.objects.create(
-            #     message=message,
-            #     type="STOCK_BAS",
-            #     produit=produit
-            # )
-            
-            # Envoyer un email (décommentez pour activer)
-            # if hasattr(settings, 'EMAIL_NOTIFICATIONS_ENABLED') and settings.EMAIL_NOTIFICATIONS_ENABLED:
-            #     send_mail(
-            #         f'Alerte stock bas: {produit.nom}',
-            #         message,
-            #         settings.DEFAULT_FROM_EMAIL,
-            #         [settings.ADMIN_EMAIL],
-            #         fail_silently=True,
-            #     )
+        alerter_si_stock_bas(instance.produit)
+
+# ---------------------------------------------------------------------------
+# Total des ventes
+# ---------------------------------------------------------------------------
+
+_report = threading.local()
+
+
+@contextmanager
+def totaux_differes():
+    """
+    Diffère le recalcul du total des ventes pendant la saisie de plusieurs lignes.
+
+    À l'intérieur du bloc, les sauvegardes de LigneDeVente se contentent de noter la
+    vente concernée ; chaque vente touchée est recalculée une seule fois, en un seul
+    UPDATE, à la sortie du bloc (rien n'est recalculé si le bloc lève une exception).
+    Les blocs imbriqués sont regroupés dans le bloc le plus externe.
+    """
+    if getattr(_report, 'ventes', None) is not None:
+        yield
+        return
+
+    _report.ventes = set()
+    try:
+        yield
+        ventes = _report.ventes
+    finally:
+        _report.ventes = None
+    if ventes:
+        Vente.recalculer_totaux(ventes)
+
 
 @receiver(post_save, sender=LigneDeVente)
-def mettre_a_jour_total_vente(sender, instance, created, **kwargs):
-    """Met à jour le total de la vente quand une ligne est ajoutée/modifiée"""
-    instance.vente.calculer_total()
+def mettre_a_jour_total_vente(sender, instance, created, raw=False, **kwargs):
+    """
+    Met à jour le total de la vente quand une ligne est ajoutée/modifiée.
+
+    - dans un bloc totaux_differes() : recalcul unique à la sortie du bloc ;
+    - sinon (ex. modification d'une ligne dans l'admin) : on applique seulement
+      la différence entre l'ancien et le nouveau sous-total de la ligne.
+    """
+    if raw:
+        return
+
+    ancienne = None if created else getattr(instance, '_contribution', None)
+    differees = getattr(_report, 'ventes', None)
+
+    if differees is not None:
+        differees.add(instance.vente_id)
+        if ancienne:
+            differees.add(ancienne[0])
+    elif created:
+        Vente.ajouter_au_total(instance.vente_id, instance.sous_total())
+    elif ancienne is None:
+        # Origine de la ligne inconnue : recalcul complet par sécurité
+        instance.vente.calculer_total()
+    else:
+        ancienne_vente_id, ancien_sous_total = ancienne
+        if ancienne_vente_id == instance.vente_id:
+            Vente.ajouter_au_total(instance.vente_id, instance.sous_total() - ancien_sous_total)
+        else:
+            Vente.ajouter_au_total(ancienne_vente_id, -ancien_sous_total)
+            Vente.ajouter_au_total(instance.vente_id, instance.sous_total())
+
+    instance.memoriser_contribution()
+
+
+@receiver(post_delete, sender=LigneDeVente)
+def retirer_ligne_du_total(sender, instance, origin=None, **kwargs):
+    """Retire le sous-total d'une ligne supprimée du total de sa vente."""
+    if isinstance(origin, Vente) or getattr(origin, 'model', None) is Vente:
+        return  # la vente elle-même est supprimée (cascade)
+
+    vente_id, sous_total = getattr(instance, '_contribution', None) or (instance.vente_id, instance.sous_total())
+    differees = getattr(_report, 'ventes', None)
+    if differees is not None:
+        differees.add(vente_id)
+    else:
+        Vente.ajouter_au_total(vente_id, -sous_total)
+
+
+# ---------------------------------------------------------------------------
+# Indicateurs du dashboard (voir core.cache_kpi)
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Produit)
+@receiver(post_delete, sender=Produit)
+@receiver(post_save, sender=Categorie)
+@receiver(post_delete, sender=Categorie)
+def invalider_kpis_catalogue(sender, raw=False, **kwargs):
+    """Prix, stock et catégories entrent dans la valeur du stock affichée au dashboard."""
+    if not raw:
+        invalider_kpis(BOUTIQUE)
+
+
+@receiver(pre_delete, sender=Categorie)
+def reporter_resumes_categorie(sender, instance, **kwargs):
+    """Avant le SET_NULL de la suppression, qui heurterait la ligne « sans catégorie » du même jour."""
+    ResumeVentesCategorieJour.reporter_sans_categorie(instance.pk)
+
+
+# ---------------------------------------------------------------------------
+# Données de référence en mémoire (voir core.referentiel)
+# ---------------------------------------------------------------------------
 
+referentiel.enregistrer(Categorie, lambda: Categorie.objects.order_by('nom'))
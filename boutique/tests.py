@@ -1,3 +1,1017 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+from core.models import ProfilUtilisateur
+from core.n_plus_un import DetecteurNPlusUn, RequetesVuesMixin
+
+from .forms import LigneDeVenteFormSet, MouvementStockForm
+from .models import (
+    Categorie, InstantaneStock, Inventaire, LigneDeVente, MouvementStock, Paiement, Produit,
+    ResumeVentesCategorieJour, ResumeVentesJour, Vente,
+)
+from .receptions import lire_reception, receptionner
+from .signals import totaux_differes
+
+
+class FinaliserVenteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_user('caissier', password='motdepasse-test')
+        cls.categorie = Categorie.objects.create(nom='Cosmétiques')
+
+    def creer_vente(self, nb_lignes, quantite=1, stock=10):
+        vente = Vente.objects.create(vendeur=self.vendeur)
+        for i in range(nb_lignes):
+            produit = Produit.objects.create(
+                nom=f'Produit {nb_lignes}-{i}',
+                categorie=self.categorie,
+                prix_achat=Decimal('2.00'),
+                prix_vente=Decimal('5.00'),
+                quantite_stock=stock,
+            )
+            LigneDeVente.objects.create(
+                vente=vente, produit=produit, quantite=quantite, prix_unitaire_vente=produit.prix_vente
+            )
+        vente.refresh_from_db()
+        return vente
+
+    def test_finaliser_decremente_le_stock_et_journalise(self):
+        vente = self.creer_vente(3, quantite=4)
+
+        self.assertTrue(vente.finaliser())
+
+        self.assertEqual(
+            set(Produit.objects.values_list('quantite_stock', flat=True)), {6}
+        )
+        mouvements = MouvementStock.objects.filter(vente=vente)
+        self.assertEqual(mouvements.count(), 3)
+        self.assertTrue(all(m.type_mouvement == 'SORTIE_VENTE' for m in mouvements))
+        vente.refresh_from_db()
+        self.assertTrue(vente.est_complete)
+
+    def test_finaliser_deux_fois_ne_fait_rien(self):
+        vente = self.creer_vente(1)
+        vente.finaliser()
+
+        self.assertFalse(vente.finaliser())
+        self.assertEqual(MouvementStock.objects.filter(vente=vente).count(), 1)
+
+    def test_stock_insuffisant_annule_tout_le_panier(self):
+        vente = self.creer_vente(2, quantite=3, stock=5)
+        LigneDeVente.objects.filter(vente=vente).update(quantite=6)
+
+        with self.assertRaises(ValidationError):
+            vente.finaliser()
+
+        self.assertEqual(
+            set(Produit.objects.values_list('quantite_stock', flat=True)), {5}
+        )
+        self.assertFalse(MouvementStock.objects.exists())
+        vente.refresh_from_db()
+        self.assertFalse(vente.est_complete)
+
+    def test_nombre_de_requetes_independant_de_la_taille_du_panier(self):
+        self.creer_vente(1).finaliser()  # crée les lignes de résumé du jour
+        petite = self.creer_vente(2)
+        grande = self.creer_vente(15)
+
+        with CaptureQueriesContext(connection) as petite_requetes:
+            petite.finaliser()
+        with CaptureQueriesContext(connection) as grande_requetes:
+            grande.finaliser()
+
+        self.assertEqual(len(petite_requetes), len(grande_requetes))
+
+
+class TotalVenteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_user('caissier', password='motdepasse-test')
+        cls.produit = Produit.objects.create(
+            nom='Shampoing', prix_achat=Decimal('2.00'), prix_vente=Decimal('5.00'), quantite_stock=100
+        )
+
+    def setUp(self):
+        self.vente = Vente.objects.create(vendeur=self.vendeur)
+
+    def ajouter_ligne(self, quantite, prix='5.00'):
+        return LigneDeVente.objects.create(
+            vente=self.vente, produit=self.produit, quantite=quantite, prix_unitaire_vente=Decimal(prix)
+        )
+
+    def test_totaux_differes_un_seul_recalcul(self):
+        with CaptureQueriesContext(connection) as requetes:
+            with totaux_differes():
+                for quantite in range(1, 6):
+                    self.ajouter_ligne(quantite)
+
+        maj_vente = [q for q in requetes if q['sql'].startswith('UPDATE "boutique_vente"')]
+        self.assertEqual(len(maj_vente), 1)
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total, Decimal('75.00'))
+
+    def test_totaux_differes_rien_si_exception(self):
+        with self.assertRaises(RuntimeError):
+            with totaux_differes():
+                self.ajouter_ligne(2)
+                raise RuntimeError
+
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total, Decimal('0.00'))
+
+    def test_modification_d_une_ligne_applique_le_delta(self):
+        self.ajouter_ligne(2)
+        ligne = self.ajouter_ligne(3)
+        ligne = LigneDeVente.objects.get(pk=ligne.pk)  # comme dans l'admin
+
+        ligne.quantite = 1
+        ligne.prix_unitaire_vente = Decimal('4.00')
+        with CaptureQueriesContext(connection) as requetes:
+            ligne.save()
+
+        self.assertFalse(any('FROM "boutique_lignedevente"' in q['sql'] for q in requetes))
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total, Decimal('14.00'))
+
+        # Une seconde sauvegarde de la même instance part de la nouvelle valeur
+        ligne.quantite = 2
+        ligne.save()
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total, Decimal('18.00'))
+
+    def test_suppression_d_une_ligne(self):
+        self.ajouter_ligne(2)
+        ligne = self.ajouter_ligne(3)
+
+        LigneDeVente.objects.get(pk=ligne.pk).delete()
+
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total, Decimal('10.00'))
+
+    def test_changement_de_vente(self):
+        ligne = self.ajouter_ligne(2)
+        autre = Vente.objects.create(vendeur=self.vendeur)
+
+        ligne = LigneDeVente.objects.get(pk=ligne.pk)
+        ligne.vente = autre
+        ligne.save()
+
+        self.vente.refresh_from_db()
+        autre.refresh_from_db()
+        self.assertEqual((self.vente.total, autre.total), (Decimal('0.00'), Decimal('10.00')))
+
+
+class CreerVenteVueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_user('caissier', password='motdepasse-test')
+        cls.produits = [
+            Produit.objects.create(
+                nom=f'Article {i}', prix_achat=Decimal('1.00'), prix_vente=Decimal('4.00'), quantite_stock=10
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.vendeur)
+
+    def donnees(self, lignes, acompte='0'):
+        data = {
+            'date_vente': '2025-01-15T10:30',
+            'client_nom': 'Awa',
+            'acompte': acompte,
+            'mode_paiement': 'ESPECES',
+            'lignes-TOTAL_FORMS': str(len(lignes)),
+            'lignes-INITIAL_FORMS': '0',
+            'lignes-MIN_NUM_FORMS': '0',
+            'lignes-MAX_NUM_FORMS': '1000',
+        }
+        for i, (produit, quantite) in enumerate(lignes):
+            data[f'lignes-{i}-produit'] = produit.pk
+            data[f'lignes-{i}-quantite'] = quantite
+            data[f'lignes-{i}-prix_unitaire_vente'] = '0'
+        return data
+
+    def test_creation_vente_complete(self):
+        reponse = self.client.post(
+            reverse('creer_vente'),
+            self.donnees([(self.produits[0], 2), (self.produits[1], 1)], acompte='5'),
+        )
+
+        vente = Vente.objects.get()
+        self.assertRedirects(reponse, reverse('detail_vente', args=[vente.pk]), fetch_redirect_response=False)
+        self.assertEqual(vente.total, Decimal('12.00'))
+        self.assertTrue(vente.est_complete)
+        self.assertEqual(vente.montant_encaisse, Decimal('5.00'))
+        self.assertEqual(vente.statut, Vente.STATUT_PARTIELLE)
+        self.produits[0].refresh_from_db()
+        self.assertEqual(self.produits[0].quantite_stock, 8)
+
+    def test_stock_insuffisant_n_enregistre_rien(self):
+        reponse = self.client.post(reverse('creer_vente'), self.donnees([(self.produits[0], 11)]))
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertFalse(Vente.objects.exists())
+
+    def test_ligne_designee_par_code(self):
+        Produit.objects.filter(pk=self.produits[2].pk).update(reference='6009876543210')
+        data = self.donnees([(self.produits[0], 1)])
+        data.update({
+            'lignes-TOTAL_FORMS': '2',
+            'lignes-1-reference': ' 6009876543210 ',
+            'lignes-1-quantite': '3',
+        })
+
+        self.client.post(reverse('creer_vente'), data)
+
+        ligne = LigneDeVente.objects.get(produit=self.produits[2])
+        self.assertEqual((ligne.quantite, ligne.prix_unitaire_vente), (3, Decimal('4.00')))
+        self.assertEqual(Vente.objects.get().total, Decimal('16.00'))
+
+    def test_produits_soumis_charges_en_une_requete(self):
+        Produit.objects.filter(pk=self.produits[2].pk).update(reference='6009876543210')
+        data = self.donnees([(self.produits[0], 1), (self.produits[1], 2), (self.produits[0], 1)])
+        data.update({'lignes-TOTAL_FORMS': '4', 'lignes-3-reference': '6009876543210', 'lignes-3-quantite': '1'})
+        formset = LigneDeVenteFormSet(data, instance=Vente(), prefix='lignes')
+
+        with self.assertNumQueries(1):
+            self.assertTrue(formset.is_valid())
+        self.assertEqual(
+            [f.cleaned_data['produit'] for f in formset.forms],
+            [self.produits[0], self.produits[1], self.produits[0], self.produits[2]],
+        )
+
+    def test_page_sans_catalogue_et_ligne_vide_pour_ajout(self):
+        reponse = self.client.get(reverse('creer_vente'))
+
+        self.assertNotContains(reponse, 'Article 1')
+        self.assertContains(reponse, 'name="lignes-__prefix__-produit"')
+        self.assertEqual(len(reponse.context['formset'].forms), 1)
+
+        # Après une erreur, la ligne réaffiche le nom du produit choisi
+        reponse = self.client.post(reverse('creer_vente'), self.donnees([(self.produits[1], 11)]))
+        self.assertContains(reponse, 'value="Article 1"')
+
+    def test_mouvement_stock_par_id(self):
+        reponse = self.client.get(reverse('ajouter_mouvement_stock'))
+        self.assertNotContains(reponse, 'Article 1')
+        self.assertContains(reponse, 'class="produit-id"')
+
+        form = MouvementStockForm({'produit': 'x', 'type_mouvement': 'ENTREE', 'quantite': 1})
+        self.assertIn('produit', form.errors)
+
+    def test_code_inconnu_refuse(self):
+        data = self.donnees([])
+        data.update({'lignes-TOTAL_FORMS': '1', 'lignes-0-reference': 'INCONNU', 'lignes-0-quantite': '1'})
+
+        reponse = self.client.post(reverse('creer_vente'), data)
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('reference', reponse.context['formset'].forms[0].errors)
+        self.assertFalse(Vente.objects.exists())
+
+
+class ResumesVentesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_user('caissier', password='motdepasse-test')
+        cls.soins = Categorie.objects.create(nom='Soins')
+        cls.creme = Produit.objects.create(
+            nom='Crème', categorie=cls.soins, prix_achat=Decimal('2.00'), prix_vente=Decimal('5.00'), quantite_stock=50
+        )
+        cls.peigne = Produit.objects.create(
+            nom='Peigne', prix_achat=Decimal('0.50'), prix_vente=Decimal('1.50'), quantite_stock=50
+        )
+
+    def vendre(self, *lignes):
+        vente = Vente.objects.create(vendeur=self.vendeur, date_vente=timezone.now())
+        for produit, quantite in lignes:
+            LigneDeVente.objects.create(
+                vente=vente, produit=produit, quantite=quantite, prix_unitaire_vente=produit.prix_vente
+            )
+        vente.refresh_from_db()
+        vente.finaliser()
+        return vente
+
+    def valeurs(self):
+        return (
+            list(ResumeVentesJour.objects.order_by('jour', 'vendeur').values(
+                'jour', 'vendeur', 'nb_ventes', 'chiffre_affaires', 'cout_achat', 'montant_encaisse', 'reste_a_payer'
+            )),
+            list(ResumeVentesCategorieJour.objects.order_by('jour', 'categorie').values(
+                'jour', 'categorie', 'quantite', 'chiffre_affaires', 'cout_achat'
+            )),
+        )
+
+    def test_finalisation_et_paiements_alimentent_les_resumes(self):
+        premiere = self.vendre((self.creme, 2), (self.peigne, 4))
+        self.vendre((self.creme, 1))
+        premiere.enregistrer_paiement(Decimal('10.00'), utilisateur=self.vendeur)
+        premiere.enregistrer_paiement(Decimal('10.00'), utilisateur=self.vendeur)  # trop-perçu
+
+        resume = ResumeVentesJour.objects.get()
+        self.assertEqual(resume.jour, timezone.localdate())
+        self.assertEqual(resume.nb_ventes, 2)
+        self.assertEqual(resume.chiffre_affaires, Decimal('21.00'))
+        self.assertEqual(resume.cout_achat, Decimal('8.00'))
+        self.assertEqual(resume.montant_encaisse, Decimal('20.00'))
+        self.assertEqual(resume.reste_a_payer, Decimal('5.00'))
+
+        soins = ResumeVentesCategorieJour.objects.get(categorie=self.soins)
+        self.assertEqual((soins.quantite, soins.chiffre_affaires), (3, Decimal('15.00')))
+        sans_categorie = ResumeVentesCategorieJour.objects.get(categorie=None)
+        self.assertEqual((sans_categorie.quantite, sans_categorie.cout_achat), (4, Decimal('2.00')))
+
+    def test_reconstruction_identique_a_la_maintenance_incrementale(self):
+        vente = self.vendre((self.creme, 2), (self.peigne, 1))
+        vente.enregistrer_paiement(Decimal('3.00'), utilisateur=self.vendeur)
+        self.vendre((self.peigne, 3))
+        attendu = self.valeurs()
+        # Un nouveau prix d'achat ne réécrit pas les marges passées
+        Produit.objects.filter(pk=self.creme.pk).update(prix_achat=Decimal('4.00'))
+
+        ResumeVentesJour.objects.update(chiffre_affaires=0)
+        call_command('reconstruire_resumes_ventes', stdout=StringIO())
+
+        self.assertEqual(self.valeurs(), attendu)
+        self.assertEqual(
+            set(LigneDeVente.objects.values_list('produit', 'prix_achat_unitaire')),
+            {(self.creme.pk, Decimal('2.00')), (self.peigne.pk, Decimal('0.50'))},
+        )
+
+    def test_une_seule_ligne_sans_categorie_par_jour(self):
+        self.vendre((self.creme, 2), (self.peigne, 1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ResumeVentesCategorieJour.objects.create(jour=timezone.localdate(), categorie=None, quantite=1)
+
+        # La suppression d'une catégorie reporte ses ventes sur la ligne « sans catégorie »
+        self.soins.delete()
+        sans_categorie = ResumeVentesCategorieJour.objects.get()
+        self.assertEqual((sans_categorie.categorie_id, sans_categorie.quantite), (None, 3))
+        self.assertEqual(sans_categorie.chiffre_affaires, Decimal('11.50'))
+
+
+class JourLocalVenteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_user('caissier', password='motdepasse-test')
+        cls.creme = Produit.objects.create(
+            nom='Crème', prix_achat=Decimal('2.00'), prix_vente=Decimal('5.00'), quantite_stock=10
+        )
+
+    def test_jour_local_stocke_et_utilise(self):
+        # 23h30 UTC = 1h30 le lendemain à Lubumbashi (UTC+2)
+        vente = Vente.objects.create(vendeur=self.vendeur, date_vente=datetime(2026, 3, 1, 23, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(vente.jour_vente, date(2026, 3, 2))
+
+        LigneDeVente.objects.create(vente=vente, produit=self.creme, quantite=1, prix_unitaire_vente=Decimal('5.00'))
+        vente.refresh_from_db()
+        vente.finaliser()
+        self.assertEqual(MouvementStock.objects.get(vente=vente).date_mouvement, date(2026, 3, 2))
+        self.assertEqual(ResumeVentesJour.objects.get().jour, date(2026, 3, 2))
+
+        self.client.force_login(self.vendeur)
+        reponse = self.client.get(reverse('ventes_journaliere'), {'date': '2026-03-02'})
+        self.assertEqual(list(reponse.context['ventes']), [vente])
+        self.assertEqual(reponse.context['ca_total'], Decimal('5.00'))
+
+    def test_jour_suivi_avec_update_fields(self):
+        vente = Vente.objects.create(vendeur=self.vendeur, date_vente=datetime(2026, 3, 1, 10, tzinfo=dt_timezone.utc))
+        vente.date_vente = datetime(2026, 3, 5, 10, tzinfo=dt_timezone.utc)
+        vente.save(update_fields=['date_vente'])
+
+        vente.refresh_from_db()
+        self.assertEqual(vente.jour_vente, date(2026, 3, 5))
+
+
+class RechercheProduitTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_user('caissier', password='motdepasse-test')
+        soins = Categorie.objects.create(nom='Soins')
+        prix = {'prix_achat': Decimal('1.00'), 'prix_vente': Decimal('2.00'), 'quantite_stock': 5, 'categorie': soins}
+        cls.eclat = Produit.objects.create(nom='Crème Éclat', reference='6001234500017', **prix)
+        cls.creole = Produit.objects.create(nom='Crèole coco', **prix)
+        cls.lait = Produit.objects.create(nom='Lait de crème', **prix)
+        Produit.objects.filter(pk=cls.creole.pk).update(frequence_ventes=7)
+
+    def test_sans_accents_ni_casse_prefixe_puis_frequence(self):
+        self.assertEqual(self.eclat.nom_recherche, 'creme eclat')
+        self.assertEqual(list(Produit.rechercher('CRE')), [self.creole, self.eclat, self.lait])
+        self.assertEqual(list(Produit.rechercher('crème')), [self.eclat, self.lait])
+
+    def test_saisie_courte_limitee_aux_debuts_de_nom(self):
+        self.assertEqual(list(Produit.rechercher('la')), [self.lait])
+        self.assertEqual(list(Produit.rechercher('  ')), [])
+
+    def test_reference_exacte_et_categorie_chargee(self):
+        # Une requête pour les débuts de nom / la référence, une pour compléter par l'intérieur des noms
+        with self.assertNumQueries(2):
+            resultats = [(p, p.categorie.nom) for p in Produit.rechercher('6001234500017')]
+        self.assertEqual(resultats, [(self.eclat, 'Soins')])
+
+    def test_frequence_incrementee_a_la_finalisation(self):
+        vente = Vente.objects.create(vendeur=self.vendeur)
+        LigneDeVente.objects.create(vente=vente, produit=self.lait, quantite=1, prix_unitaire_vente=Decimal('2.00'))
+        LigneDeVente.objects.create(vente=vente, produit=self.lait, quantite=2, prix_unitaire_vente=Decimal('2.00'))
+        vente.refresh_from_db()
+        vente.finaliser()
+
+        self.lait.refresh_from_db()
+        self.assertEqual(self.lait.frequence_ventes, 1)
+
+    def test_vue_autocomplete(self):
+        self.client.force_login(self.vendeur)
+        reponse = self.client.get(reverse('produit_autocomplete'), {'q': 'eclat'})
+
+        self.assertEqual(reponse.json()['results'], [{
+            'id': self.eclat.id, 'text': 'Crème Éclat', 'reference': '6001234500017',
+            'prix_vente': '2.00', 'stock': 5, 'categorie': 'Soins',
+        }])
+
+    def test_vue_par_code(self):
+        self.client.force_login(self.vendeur)
+        url = reverse('produit_par_reference')
+        # Session + utilisateur, puis une seule requête sur l'index unique
+        with self.assertNumQueries(3):
+            reponse = self.client.get(url, {'code': '6001234500017'})
+
+        self.assertEqual(reponse.json(), {
+            'id': self.eclat.id, 'text': 'Crème Éclat', 'reference': '6001234500017',
+            'prix_vente': '2.00', 'stock': 5,
+        })
+        self.assertEqual(self.client.get(url, {'code': '000'}).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class CompteursAtomiquesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_user('caissier', password='motdepasse-test')
+
+    def test_sortie_refusee_si_stock_insuffisant(self):
+        produit = Produit.objects.create(
+            nom='Savon', prix_achat=Decimal('1.00'), prix_vente=Decimal('2.00'), quantite_stock=2
+        )
+        # Un autre worker a vendu entre-temps : l'instance en mémoire est périmée
+        Produit.objects.filter(pk=produit.pk).update(quantite_stock=1)
+
+        with self.assertRaises(ValidationError):
+            produit.ajuster_stock(2, 'SORTIE_VENTE', self.vendeur)
+
+        self.assertEqual(produit.quantite_stock, 1)
+        self.assertFalse(MouvementStock.objects.exists())
+
+    def test_paiements_cumules_et_statut(self):
+        vente = Vente.objects.create(vendeur=self.vendeur, total=Decimal('10.00'))
+        autre_instance = Vente.objects.get(pk=vente.pk)
+
+        vente.enregistrer_paiement(Decimal('4.00'), utilisateur=self.vendeur)
+        self.assertEqual(vente.statut, Vente.STATUT_PARTIELLE)
+
+        # L'instance périmée ne doit pas écraser le premier paiement
+        autre_instance.enregistrer_paiement(Decimal('6.00'), utilisateur=self.vendeur)
+        self.assertEqual(autre_instance.montant_encaisse, Decimal('10.00'))
+        self.assertEqual(autre_instance.statut, Vente.STATUT_PAYEE)
+
+
+def lancer_en_parallele(fonction, nb_threads):
+    """
+    Exécute `fonction` dans `nb_threads` threads démarrés en même temps
+    (chaque thread a sa propre connexion). Renvoie le nombre d'appels réussis
+    et la liste des exceptions levées.
+    """
+    depart = threading.Barrier(nb_threads)
+    verrou = threading.Lock()
+    resultats = {'succes': 0, 'erreurs': []}
+
+    def executer():
+        try:
+            depart.wait()
+            fonction()
+            with verrou:
+                resultats['succes'] += 1
+        except Exception as exc:
+            with verrou:
+                resultats['erreurs'].append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=executer) for _ in range(nb_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultats['succes'], resultats['erreurs']
+
+
+# SQLite sérialise les écritures : ces tests n'ont de sens que sur une base
+# multi-écrivains comme PostgreSQL (production).
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrenceCompteursTests(TransactionTestCase):
+    NB_THREADS = 20
+
+    def setUp(self):
+        self.vendeur = User.objects.create_user('caissier', password='motdepasse-test')
+
+    def test_ventes_simultanees_du_meme_produit(self):
+        produit = Produit.objects.create(
+            nom='Crème', prix_achat=Decimal('1.00'), prix_vente=Decimal('3.00'), quantite_stock=7
+        )
+
+        def vendre_une_unite():
+            Produit.objects.get(pk=produit.pk).ajuster_stock(1, 'SORTIE_VENTE', self.vendeur)
+
+        succes, erreurs = lancer_en_parallele(vendre_une_unite, self.NB_THREADS)
+
+        self.assertEqual(succes, 7)
+        self.assertEqual(len(erreurs), self.NB_THREADS - 7)
+        self.assertTrue(all(isinstance(e, ValidationError) for e in erreurs))
+        produit.refresh_from_db()
+        self.assertEqual(produit.quantite_stock, 0)
+        self.assertEqual(MouvementStock.objects.filter(produit=produit).count(), 7)
+
+    def test_paiements_simultanes_sur_la_meme_vente(self):
+        vente = Vente.objects.create(vendeur=self.vendeur, total=Decimal('100.00'))
+
+        def payer():
+            Vente.objects.get(pk=vente.pk).enregistrer_paiement(Decimal('2.50'), utilisateur=self.vendeur)
+
+        succes, erreurs = lancer_en_parallele(payer, self.NB_THREADS)
+
+        self.assertEqual((succes, erreurs), (self.NB_THREADS, []))
+        vente.refresh_from_db()
+        self.assertEqual(vente.montant_encaisse, Decimal('2.50') * self.NB_THREADS)
+        self.assertEqual(vente.statut, Vente.STATUT_PARTIELLE)
+        self.assertEqual(vente.paiements.count(), self.NB_THREADS)
+
+    def test_finalisations_simultanees_de_la_meme_vente(self):
+        produit = Produit.objects.create(
+            nom='Gel', prix_achat=Decimal('1.00'), prix_vente=Decimal('3.00'), quantite_stock=50
+        )
+        vente = Vente.objects.create(vendeur=self.vendeur)
+        LigneDeVente.objects.create(vente=vente, produit=produit, quantite=2, prix_unitaire_vente=Decimal('3.00'))
+        finalisees = []
+
+        def finaliser():
+            finalisees.append(Vente.objects.get(pk=vente.pk).finaliser())
+
+        succes, erreurs = lancer_en_parallele(finaliser, self.NB_THREADS)
+
+        self.assertEqual((succes, erreurs), (self.NB_THREADS, []))
+        self.assertEqual(finalisees.count(True), 1)
+        produit.refresh_from_db()
+        self.assertEqual(produit.quantite_stock, 48)
+
+    def test_mouvement_antidate_pendant_un_instantane(self):
+        savon = Produit.objects.create(
+            nom='Savon', prix_achat=Decimal('1.00'), prix_vente=Decimal('3.00'), quantite_stock=0,
+        )
+        savon.ajuster_stock(10, 'ENTREE', self.vendeur, date_mouvement=date(2025, 1, 5))
+
+        def saisie_tardive():
+            try:
+                Produit.objects.get(pk=savon.pk).ajuster_stock(
+                    4, 'ENTREE', self.vendeur, date_mouvement=date(2025, 1, 20),
+                )
+            finally:
+                connection.close()
+
+        # Mouvement antidaté lancé entre l'horodatage de l'instantané et sa lecture
+        ecriture = threading.Thread(target=saisie_tardive)
+        stocks_au = InstantaneStock.stocks_au.__func__
+
+        def lecture_retardee(cls, jour, *args, **kwargs):
+            ecriture.start()
+            ecriture.join(timeout=1)
+            return stocks_au(cls, jour, *args, **kwargs)
+
+        with mock.patch.object(InstantaneStock, 'stocks_au', classmethod(lecture_retardee)):
+            InstantaneStock.prendre(date(2025, 1, 31))
+        ecriture.join()
+
+        self.assertEqual(InstantaneStock.stocks_au(date(2025, 1, 31)).get(pk=savon.pk).quantite_au, 14)
+        self.assertEqual(InstantaneStock.stocks_au(date(2025, 2, 28)).get(pk=savon.pk).quantite_au, 14)
+
+
+class RequetesVuesBoutiqueTests(RequetesVuesMixin, TestCase):
+    """Listes et détail : nombre de requêtes fixe, quel que soit le nombre de lignes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_superuser('gerant', password='motdepasse-test')
+        ProfilUtilisateur.objects.create(user=cls.vendeur, role='ADMIN')
+        cls.categorie = Categorie.objects.create(nom='Cosmétiques')
+
+    def setUp(self):
+        self.client.force_login(self.vendeur)
+
+    def produit(self):
+        return Produit.objects.create(
+            nom=f'Produit {Produit.objects.count()}', categorie=self.categorie,
+            prix_achat=Decimal('2.00'), prix_vente=Decimal('5.00'), quantite_stock=10,
+        )
+
+    def ajouter_produits(self, nb):
+        for _ in range(nb):
+            self.produit()
+
+    def ajouter_ventes(self, nb):
+        """Ventes finalisées non payées : une par vendeur, avec leur mouvement de stock."""
+        for _ in range(nb):
+            vendeur = User.objects.create_user(f'vendeur{User.objects.count()}')
+            vente = Vente.objects.create(vendeur=vendeur)
+            LigneDeVente.objects.create(vente=vente, produit=self.produit(), quantite=2, prix_unitaire_vente=Decimal('5.00'))
+            vente.finaliser()
+
+    def test_detecteur_signale_un_chargement_en_boucle(self):
+        self.ajouter_ventes(3)
+
+        with DetecteurNPlusUn().activer() as detecteur:
+            [str(mouvement) for mouvement in MouvementStock.objects.all()]
+        self.assertEqual(list(detecteur.repetitions().values()), [3])
+
+        with DetecteurNPlusUn().activer() as detecteur:
+            [str(mouvement) for mouvement in MouvementStock.objects.select_related('produit')]
+        self.assertEqual(detecteur.repetitions(), {})
+
+    def test_liste_produits(self):
+        self.assertRequetesParVolume(3, reverse('liste_produits'), self.ajouter_produits)
+
+    def test_historique_mouvements(self):
+        self.assertRequetesParVolume(4, reverse('historique_mouvements'), self.ajouter_ventes)
+
+    def test_liste_ventes(self):
+        self.assertRequetesParVolume(4, reverse('liste_ventes'), self.ajouter_ventes)
+
+    def test_liste_dettes(self):
+        self.assertRequetesParVolume(4, reverse('liste_dettes'), self.ajouter_ventes)
+
+    def test_ventes_journaliere(self):
+        self.assertRequetesParVolume(4, reverse('ventes_journaliere'), self.ajouter_ventes)
+
+    def test_detail_vente(self):
+        vente = Vente.objects.create(vendeur=self.vendeur)
+
+        def ajouter_lignes_et_paiements(nb):
+            for _ in range(nb):
+                LigneDeVente.objects.create(vente=vente, produit=self.produit(), quantite=1, prix_unitaire_vente=Decimal('5.00'))
+                Paiement.objects.create(vente=vente, montant=Decimal('1.00'), enregistre_par=self.vendeur)
+
+        self.assertRequetesParVolume(5, reverse('detail_vente', args=[vente.pk]), ajouter_lignes_et_paiements)
+
+    def test_admin_mouvements_et_lignes(self):
+        self.assertRequetesParVolume(7, reverse('admin:boutique_mouvementstock_changelist'), self.ajouter_ventes)
+        self.assertEqual(self.requetes_vue(reverse('admin:boutique_lignedevente_changelist')), 7)
+
+
+class ExportsBoutiqueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_user('caissier', password='motdepasse-test')
+        cls.produit = Produit.objects.create(
+            nom='Savon', reference='SAV-1', prix_achat=Decimal('1.00'), prix_vente=Decimal('3.00'), quantite_stock=100,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.vendeur)
+
+    def vendre(self, jour, quantite=1):
+        vente = Vente.objects.create(vendeur=self.vendeur, client_nom='Awa; "la cliente"')
+        LigneDeVente.objects.create(vente=vente, produit=self.produit, quantite=quantite, prix_unitaire_vente=Decimal('3.00'))
+        vente.finaliser()
+        Vente.objects.filter(pk=vente.pk).update(jour_vente=jour)
+        return vente
+
+    def lignes_csv(self, url, **params):
+        reponse = self.client.get(url, params)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse.streaming)
+        contenu = b''.join(reponse.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(StringIO(contenu), delimiter=';'))
+
+    def test_export_ventes_filtre_par_periode(self):
+        self.vendre(date(2025, 1, 10), quantite=2)
+        recente = self.vendre(date(2025, 2, 10))
+
+        lignes = self.lignes_csv(reverse('export_ventes'), date_debut='2025-02-01', date_fin='pas une date')
+
+        self.assertEqual(lignes[0][:3], ['N° vente', 'Date', 'Vendeur'])
+        self.assertEqual(len(lignes), 2)
+        self.assertEqual(lignes[1][0], str(recente.pk))
+        self.assertEqual(lignes[1][2:6], ['caissier', 'Awa; "la cliente"', '3.00', '0.00'])
+        self.assertEqual(Decimal(lignes[1][6]), Decimal('3.00'))
+
+    def test_export_en_nombre_fixe_de_requetes(self):
+        url = reverse('export_mouvements')
+        self.vendre(date(2025, 1, 10))
+        with CaptureQueriesContext(connection) as peu:
+            self.lignes_csv(url)
+        for _ in range(10):
+            self.vendre(date(2025, 1, 10))
+        with CaptureQueriesContext(connection) as beaucoup:
+            lignes = self.lignes_csv(url, format='inconnu')
+
+        self.assertEqual(len(lignes), 12)
+        self.assertEqual(lignes[1][1:6], ['Savon', 'SAV-1', '', 'SORTIE_VENTE', '1'])
+        self.assertEqual(len(peu), len(beaucoup))
+
+    def test_export_xlsx(self):
+        self.vendre(date(2025, 1, 10))
+
+        reponse = self.client.get(reverse('export_ventes'), {'format': 'xlsx'})
+
+        self.assertIn('ventes-', reponse['Content-Disposition'])
+        with zipfile.ZipFile(BytesIO(b''.join(reponse.streaming_content))) as classeur:
+            feuille = classeur.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(feuille.count('<row>'), 2)
+        self.assertIn('<t xml:space="preserve">Awa; "la cliente"</t>', feuille)
+
+
+class ReceptionStockTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerant = User.objects.create_user('gerant', password='motdepasse-test')
+        cls.savon = Produit.objects.create(
+            nom='Savon', reference='SAV-1', prix_achat=Decimal('1.00'), prix_vente=Decimal('3.00'), quantite_stock=5,
+        )
+        cls.creme = Produit.objects.create(
+            nom='Crème Éclat', prix_achat=Decimal('4.00'), prix_vente=Decimal('9.00'), quantite_stock=0,
+        )
+
+    def test_reception_par_reference_nom_et_creation(self):
+        lignes = lire_reception(
+            "Référence;Désignation;Qté;Prix d'achat;Prix de vente;Catégorie\n"
+            "SAV-1;;10;1,25;;\n"
+            "CRE-9;creme  eclat;4;4.50;;\n"
+            "HUI-1;Huile coco;6;2.00;5.00;Soins\n"
+            "HUI-1;Huile coco;2;;;\n"
+            "SAV-1;;deux;;;\n"
+            "INC-1;Inconnu;1;2.00;;\n"
+        )
+
+        rapport = receptionner(lignes, utilisateur=self.gerant, raison='Facture F-12')
+
+        self.assertEqual(rapport.lignes_appliquees, 4)
+        self.assertEqual(rapport.unites, 22)
+        self.assertEqual(rapport.produits_crees, ['Huile coco'])
+        self.assertEqual([numero for numero, _ in rapport.erreurs], [6, 7])
+        self.savon.refresh_from_db()
+        self.creme.refresh_from_db()
+        self.assertEqual((self.savon.quantite_stock, self.savon.prix_achat), (15, Decimal('1.25')))
+        self.assertEqual((self.creme.quantite_stock, self.creme.reference), (4, 'CRE-9'))
+        huile = Produit.objects.get(reference='HUI-1')
+        self.assertEqual((huile.quantite_stock, huile.nom_recherche, huile.categorie.nom), (8, 'huile coco', 'Soins'))
+        self.assertEqual(
+            MouvementStock.objects.filter(type_mouvement='ENTREE', raison='Facture F-12', utilisateur=self.gerant).count(),
+            4,
+        )
+
+    def test_reception_en_nombre_fixe_de_requetes(self):
+        def texte(n, debut):
+            return ''.join(f"NEW-{i}\tProduit {i}\t3\t1.00\t2.00\n" for i in range(debut, debut + n))
+
+        with CaptureQueriesContext(connection) as peu:
+            receptionner(lire_reception(texte(2, 0) + "SAV-1\t\t1\n"))
+        with CaptureQueriesContext(connection) as beaucoup:
+            receptionner(lire_reception(texte(30, 100) + "SAV-1\t\t1\n"))
+
+        self.assertEqual(Produit.objects.filter(reference__startswith='NEW-').count(), 32)
+        self.assertEqual(len(peu), len(beaucoup))
+
+    def test_vue_reception(self):
+        self.client.force_login(self.gerant)
+        url = reverse('reception_stock')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        reponse = self.client.post(url, {
+            'texte': 'SAV-1\tSavon\t3\nSAV-1\tSavon\t-1\n',
+            'raison': 'BL-7',
+            'date_mouvement': '2025-03-01',
+            'creer_produits': 'on',
+        })
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.context['rapport'].erreurs[0][0], 2)
+        self.assertContains(reponse, 'Quantité invalide')
+        self.assertEqual(reponse.context['form']['raison'].value(), 'BL-7')
+        mouvement = MouvementStock.objects.get(raison='BL-7')
+        self.assertEqual((mouvement.quantite, mouvement.date_mouvement), (3, date(2025, 3, 1)))
+
+    def test_commande_simulation(self):
+        sortie = StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='cp1252', delete=False) as fichier:
+            fichier.write("sku;nom;quantite\nSAV-1;Savon;7\nXXX;Inconnu;1\n")
+        self.addCleanup(os.remove, fichier.name)
+
+        call_command('receptionner_stock', fichier.name, '--sans-creation', '--simulation', stdout=sortie)
+
+        self.assertIn('ligne 3 : Produit inconnu : XXX.', sortie.getvalue())
+        self.assertIn('Simulation : 1 lignes appliquées (7 unités)', sortie.getvalue())
+        self.savon.refresh_from_db()
+        self.assertEqual(self.savon.quantite_stock, 5)
+
+
+class InventaireTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerant = User.objects.create_user('gerant', password='motdepasse-test')
+        ProfilUtilisateur.objects.update_or_create(user=cls.gerant, defaults={'role': 'GESTIONNAIRE_BOUTIQUE'})
+        cls.compteur = User.objects.create_user('compteur', password='motdepasse-test')
+        cls.hygiene = Categorie.objects.create(nom='Hygiène')
+        cls.savon = Produit.objects.create(
+            nom='Savon', categorie=cls.hygiene, prix_achat=Decimal('1.00'), prix_vente=Decimal('3.00'), quantite_stock=10,
+        )
+        cls.shampoing = Produit.objects.create(
+            nom='Shampoing', categorie=cls.hygiene, prix_achat=Decimal('2.00'), prix_vente=Decimal('5.00'),
+            quantite_stock=4,
+        )
+        cls.peigne = Produit.objects.create(
+            nom='Peigne', prix_achat=Decimal('0.50'), prix_vente=Decimal('1.00'), quantite_stock=7,
+        )
+
+    def produits(self, n):
+        Produit.objects.bulk_create([
+            Produit(nom=f'Article {i}', nom_recherche=f'article {i}', prix_achat=Decimal('1.00'),
+                    prix_vente=Decimal('2.00'), quantite_stock=5)
+            for i in range(n)
+        ])
+
+    def test_ecarts_appliques_au_stock_actuel(self):
+        inventaire = Inventaire.ouvrir('Annuel', self.gerant)
+        # Vente pendant le comptage : elle reste déduite après l'inventaire
+        self.savon.ajuster_stock(2, 'SORTIE_VENTE', self.gerant)
+        inventaire.enregistrer_comptages({self.savon.pk: 7, self.shampoing.pk: 4}, self.compteur)
+        inventaire.enregistrer_comptages({self.peigne.pk: 9}, self.gerant)
+
+        self.assertEqual(inventaire.resume(), {
+            'nb_produits': 3, 'nb_comptes': 3, 'nb_ecarts': 2, 'valeur_ecarts': Decimal('-2.00'),
+        })
+        self.assertEqual(inventaire.appliquer(self.gerant, date_mouvement=date(2025, 12, 31)), 2)
+        self.assertIsNone(inventaire.appliquer(self.gerant))
+
+        self.assertEqual(
+            dict(Produit.objects.values_list('nom', 'quantite_stock')),
+            {'Savon': 5, 'Shampoing': 4, 'Peigne': 9},
+        )
+        self.assertEqual(
+            sorted(inventaire.mouvements.values_list('produit__nom', 'type_mouvement', 'quantite', 'date_mouvement')),
+            [('Peigne', 'AJUSTEMENT_PLUS', 2, date(2025, 12, 31)), ('Savon', 'AJUSTEMENT_MOINS', 3, date(2025, 12, 31))],
+        )
+        self.assertEqual(inventaire.statut, Inventaire.STATUT_APPLIQUE)
+        self.assertEqual(inventaire.enregistrer_comptages({self.savon.pk: 1}, self.gerant), 0)
+
+    def test_nombre_fixe_de_requetes(self):
+        def cycle():
+            with CaptureQueriesContext(connection) as requetes:
+                inventaire = Inventaire.ouvrir('Cycle', self.gerant)
+                lignes = inventaire.lignes.values_list('produit_id', flat=True)
+                inventaire.enregistrer_comptages({pid: 3 for pid in lignes}, self.compteur)
+                inventaire.appliquer(self.gerant)
+            return len(requetes)
+
+        self.produits(5)
+        peu = cycle()
+        # Reste sous la limite de paramètres par requête de SQLite (un seul INSERT de mouvements)
+        self.produits(80)
+        self.assertEqual(cycle(), peu)
+        self.assertEqual(MouvementStock.objects.filter(type_mouvement='AJUSTEMENT_MOINS').count(), 8 + 80)
+
+    def test_saisie_par_rayon_et_cloture(self):
+        inventaire = Inventaire.ouvrir('Hygiène', self.gerant, categorie=self.hygiene)
+        inventaire.enregistrer_comptages({self.shampoing.pk: 3}, self.gerant)
+        self.client.force_login(self.compteur)
+        url = reverse('saisie_inventaire', args=[inventaire.pk])
+
+        reponse = self.client.get(url, {'rayon': self.hygiene.pk})
+        self.assertContains(reponse, f'name="compte-{self.savon.pk}"')
+        self.assertNotContains(reponse, 'Peigne')
+        self.client.post(f'{url}?rayon={self.hygiene.pk}', {
+            f'compte-{self.savon.pk}': '8', f'avant-{self.savon.pk}': '',
+            # Valeur inchangée sur cette feuille : la saisie d'un collègue n'est pas écrasée
+            f'compte-{self.shampoing.pk}': '', f'avant-{self.shampoing.pk}': '',
+        })
+        self.assertEqual(
+            dict(inventaire.lignes.values_list('produit__nom', 'quantite_comptee')), {'Savon': 8, 'Shampoing': 3},
+        )
+
+        cloture = reverse('cloturer_inventaire', args=[inventaire.pk])
+        self.assertEqual(self.client.post(cloture, {'action': 'appliquer'}).status_code, 403)
+        self.client.force_login(self.gerant)
+        self.client.post(cloture, {'action': 'appliquer'})
+        reponse = self.client.get(reverse('detail_inventaire', args=[inventaire.pk]))
+        self.assertContains(reponse, 'Appliqué')
+        self.savon.refresh_from_db()
+        self.assertEqual(self.savon.quantite_stock, 8)
+
+
+class StockADateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerant = User.objects.create_user('gerant', password='motdepasse-test')
+        cls.hygiene = Categorie.objects.create(nom='Hygiène')
+        cls.savon = Produit.objects.create(
+            nom='Savon', categorie=cls.hygiene, prix_achat=Decimal('1.00'), prix_vente=Decimal('3.00'), quantite_stock=0,
+        )
+        cls.peigne = Produit.objects.create(
+            nom='Peigne', prix_achat=Decimal('0.50'), prix_vente=Decimal('1.00'), quantite_stock=0,
+        )
+        Produit.objects.update(date_creation=datetime(2024, 12, 1, tzinfo=dt_timezone.utc))
+
+    def mouvement(self, produit, quantite, type_mouvement, jour):
+        produit.ajuster_stock(quantite, type_mouvement, self.gerant, date_mouvement=jour)
+
+    def rejouer(self, produit, jour):
+        """Référence : cumul de tous les mouvements datés jusqu'à `jour`."""
+        return sum(
+            m.variation for m in MouvementStock.objects.filter(produit=produit, date_mouvement__lte=jour)
+        )
+
+    def test_stock_apres_chaque_mouvement(self):
+        self.mouvement(self.savon, 10, 'ENTREE', date(2025, 1, 5))
+        vente = Vente.objects.create(vendeur=self.gerant)
+        for quantite in (2, 3):
+            LigneDeVente.objects.create(vente=vente, produit=self.savon, quantite=quantite, prix_unitaire_vente=Decimal('3.00'))
+        vente.finaliser()
+        soldes = list(MouvementStock.objects.filter(produit=self.savon).order_by('pk').values_list('stock_apres', flat=True))
+        self.assertEqual(soldes, [10, 8, 5])
+
+        MouvementStock.objects.update(stock_apres=None)
+        self.assertEqual(MouvementStock.recalculer_soldes(), 3)
+        self.assertEqual(
+            list(MouvementStock.objects.filter(produit=self.savon).order_by('pk').values_list('stock_apres', flat=True)),
+            soldes,
+        )
+
+    def test_stock_au_depuis_instantane_et_mouvements_antidates(self):
+        self.mouvement(self.savon, 10, 'ENTREE', date(2025, 1, 5))
+        self.mouvement(self.peigne, 4, 'ENTREE', date(2025, 1, 20))
+        self.mouvement(self.savon, 3, 'SORTIE_VENTE', date(2025, 2, 10))
+        self.assertEqual(InstantaneStock.prendre(date(2025, 1, 31)), 2)
+        self.mouvement(self.savon, 5, 'ENTREE', date(2025, 2, 15))
+        # Saisie tardive d'une perte de janvier, après le calcul de l'instantané
+        self.mouvement(self.savon, 1, 'AJUSTEMENT_MOINS', date(2025, 1, 25))
+
+        for jour in (date(2024, 12, 31), date(2025, 1, 31), date(2025, 2, 12), date(2025, 3, 1)):
+            for depuis_instantane in (True, False):
+                stocks = dict(InstantaneStock.stocks_au(jour, depuis_instantane).values_list('nom', 'quantite_au'))
+                self.assertEqual(stocks, {'Savon': self.rejouer(self.savon, jour), 'Peigne': self.rejouer(self.peigne, jour)})
+
+        # Fiche créée après l'instantané avec un stock initial sans mouvement
+        creme = Produit.objects.create(nom='Crème', prix_achat=Decimal('4.00'), prix_vente=Decimal('9.00'), quantite_stock=6)
+        self.mouvement(creme, 2, 'ENTREE', date(2025, 2, 20))
+        self.assertEqual(InstantaneStock.stocks_au(date(2025, 3, 1)).get(pk=creme.pk).quantite_au, 8)
+
+        # Valorisation au prix d'achat de l'instantané, pas au prix actuel
+        Produit.objects.filter(pk=self.savon.pk).update(prix_achat=Decimal('2.00'))
+        savon = InstantaneStock.stocks_au(date(2025, 2, 12)).get(pk=self.savon.pk)
+        self.assertEqual((savon.quantite_au, savon.valeur_au), (6, Decimal('6.00')))
+
+    def test_vue_export_et_commande(self):
+        self.mouvement(self.savon, 10, 'ENTREE', date(2025, 1, 5))
+        self.mouvement(self.peigne, 4, 'ENTREE', date(2025, 3, 1))
+        self.client.force_login(self.gerant)
+
+        reponse = self.client.get(reverse('stock_a_date'), {'jour': '2025-02-01'})
+        self.assertContains(reponse, 'Hygiène')
+        self.assertEqual(reponse.context['valeur_totale'], Decimal('10.00'))
+        reponse = self.client.get(reverse('export_stock_a_date'), {'jour': '2025-02-01'})
+        lignes = list(csv.reader(StringIO(b''.join(reponse.streaming_content).decode('utf-8-sig')), delimiter=';'))
+        self.assertEqual([ligne[:4] for ligne in lignes[1:]], [['Peigne', '', '', '0'], ['Savon', '', 'Hygiène', '10']])
+
+        call_command('instantanes_stock', '--depuis', '2025-01', stdout=StringIO())
+        fin_mois_precedent = timezone.localdate().replace(day=1) - timezone.timedelta(days=1)
+        self.assertEqual(InstantaneStock.objects.filter(jour=fin_mois_precedent).count(), 2)
+        self.assertEqual(
+            InstantaneStock.objects.get(jour=date(2025, 2, 28), produit=self.peigne).quantite, 0,
+        )
+        with self.assertRaises(CommandError):
+            call_command('instantanes_stock', '--jour', '2025-02-30', stdout=StringIO())
@@ -12,15 +12,27 @@ urlpatterns = [
 
     # Mouvements de stock
     path('stock/mouvements/', views.historique_mouvements, name='historique_mouvements'),
+    path('stock/mouvements/export/', views.export_mouvements, name='export_mouvements'),
     path('stock/ajuster/', views.ajouter_mouvement_stock, name='ajouter_mouvement_stock'),
+    path('stock/reception/', views.reception_stock, name='reception_stock'),
+    path('stock/a-date/', views.stock_a_date, name='stock_a_date'),
+    path('stock/a-date/export/', views.export_stock_a_date, name='export_stock_a_date'),
+
+    # Inventaires
+    path('stock/inventaires/', views.liste_inventaires, name='liste_inventaires'),
+    path('stock/inventaires/<int:pk>/', views.detail_inventaire, name='detail_inventaire'),
+    path('stock/inventaires/<int:pk>/saisie/', views.saisie_inventaire, name='saisie_inventaire'),
+    path('stock/inventaires/<int:pk>/cloturer/', views.cloturer_inventaire, name='cloturer_inventaire'),
 
     # Ventes
     path('ventes/<int:vente_id>/paiements/ajouter/', views.ajouter_paiement, name='ajouter_paiement'),
     path('ventes/dettes/', views.liste_dettes, name='liste_dettes'),
+    path('ventes/export/', views.export_ventes, name='export_ventes'),
     path('ventes/', views.liste_ventes, name='liste_ventes'),
     path('ventes/<int:pk>/', views.detail_vente, name='detail_vente'),
     path('ventes/nouvelle/', views.creer_vente, name='creer_vente'),
     path('ventes/journalier/', views.ventes_journaliere, name='ventes_journaliere'),
     path('produit-autocomplete/', views.produit_autocomplete, name='produit_autocomplete'),
+    path('produits/code/', views.produit_par_reference, name='produit_par_reference'),
 
 ]
\ No newline at end of file
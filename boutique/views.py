@@ -1,3 +1,6 @@
+import hashlib
+
+from django.core.cache import cache
 from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
@@ -5,10 +8,17 @@ from django.contrib import messages
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.utils import timezone
-from .models import Produit, MouvementStock, Vente, Categorie,LigneDeVente
-from .forms import ProduitForm, MouvementStockForm, VenteForm, LigneDeVenteFormSet,PaiementForm
+from .models import Produit, MouvementStock, Vente, Categorie,LigneDeVente, ResumeVentesJour, Inventaire, InstantaneStock
+from .forms import ProduitForm, MouvementStockForm, ReceptionStockForm, InventaireForm, VenteForm, LigneDeVenteFormSet,PaiementForm
+from .receptions import receptionner
+from .signals import totaux_differes
+from core import referentiel
+from core.decorators import role_requis
+from core.exports import filtre_periode, reponse_export
+from core.pagination import paginer_par_curseur
 from decimal import Decimal
-from django.db.models import ExpressionWrapper, F, Sum, DecimalField
+from django.db.models import Count, ExpressionWrapper, F, OuterRef, Subquery, Sum, DecimalField, Value
+from django.db.models.functions import Abs, Coalesce
 
 # ✅ PRODUIT VIEWS
 
@@ -117,10 +127,40 @@ def ajouter_mouvement_stock(request):
     
     return render(request, 'boutique/mouvements/formulaire.html', {'form': form})
 
+@login_required
+def reception_stock(request):
+    """Enregistre une livraison fournisseur en une fois (fichier CSV ou lignes collées)"""
+    rapport = None
+    if request.method == 'POST':
+        form = ReceptionStockForm(request.POST, request.FILES)
+        if form.is_valid():
+            rapport = receptionner(
+                form.cleaned_data['lignes'],
+                utilisateur=request.user,
+                raison=form.cleaned_data['raison'] or None,
+                date_mouvement=form.cleaned_data['date_mouvement'],
+                creer_produits=form.cleaned_data['creer_produits'],
+            )
+            if not rapport.erreurs:
+                messages.success(request, f"Réception enregistrée : {rapport}.")
+                return redirect('historique_mouvements')
+            messages.warning(request, f"Réception enregistrée en partie : {rapport}.")
+            # Les lignes valides sont appliquées : formulaire vidé pour ne pas les renvoyer
+            form = ReceptionStockForm(initial={
+                'raison': form.cleaned_data['raison'],
+                'date_mouvement': form.cleaned_data['date_mouvement'],
+            })
+        else:
+            messages.error(request, "Veuillez corriger les erreurs ci-dessous.")
+    else:
+        form = ReceptionStockForm()
+
+    return render(request, 'boutique/mouvements/reception.html', {'form': form, 'rapport': rapport})
+
 @login_required
 def historique_mouvements(request):
     """Affiche l'historique des mouvements de stock"""
-    mouvements = MouvementStock.objects.select_related('produit', 'utilisateur').order_by('-date_mouvement')
+    mouvements = MouvementStock.objects.select_related('produit', 'utilisateur')
     
     # Filtrage par produit si spécifié
     produit_id = request.GET.get('produit')
@@ -128,10 +168,161 @@ def historique_mouvements(request):
         mouvements = mouvements.filter(produit_id=produit_id)
     
     return render(request, 'boutique/mouvements/historique.html', {
-        'mouvements': mouvements,
-        'produits': Produit.objects.all()  # Pour le filtre
+        'mouvements': paginer_par_curseur(request, mouvements, 'date_mouvement'),
+    })
+
+
+@login_required
+def export_mouvements(request):
+    """Mouvements de stock en CSV / XLSX : période, produit et type de mouvement en filtres GET."""
+    mouvements = MouvementStock.objects.filter(filtre_periode(request, 'date_mouvement'))
+    if request.GET.get('produit', '').isdigit():
+        mouvements = mouvements.filter(produit_id=request.GET['produit'])
+    if request.GET.get('type'):
+        mouvements = mouvements.filter(type_mouvement=request.GET['type'])
+    return reponse_export(
+        request, 'mouvements',
+        ['Date', 'Produit', 'Référence', 'Catégorie', 'Type', 'Quantité', 'Utilisateur', 'Vente', 'Raison', 'Stock après'],
+        mouvements.order_by('date_mouvement', 'pk').values_list(
+            'date_mouvement', 'produit__nom', 'produit__reference', 'produit__categorie__nom',
+            'type_mouvement', 'quantite', 'utilisateur__username', 'vente_id', 'raison', 'stock_apres',
+        ),
+    )
+
+def _jour_demande(request):
+    """Jour ?jour=AAAA-MM-JJ des rapports de stock à date (aujourd'hui si absent ou invalide)."""
+    try:
+        return timezone.datetime.strptime(request.GET.get('jour', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return timezone.localdate()
+
+@login_required
+def stock_a_date(request):
+    """Stock et valeur d'achat du stock à la fin d'un jour donné, par catégorie"""
+    jour = _jour_demande(request)
+    categories = {}
+    for categorie, quantite, valeur in InstantaneStock.stocks_au(jour).values_list(
+        'categorie__nom', 'quantite_au', 'valeur_au',
+    ):
+        total = categories.setdefault(categorie or "Sans catégorie", {'nb_produits': 0, 'quantite': 0, 'valeur': Decimal('0')})
+        total['nb_produits'] += 1
+        total['quantite'] += quantite
+        total['valeur'] += valeur or 0
+    return render(request, 'boutique/mouvements/stock_a_date.html', {
+        'jour': jour,
+        'categories': sorted(categories.items()),
+        'quantite_totale': sum(total['quantite'] for total in categories.values()),
+        'valeur_totale': sum((total['valeur'] for total in categories.values()), Decimal('0')),
+    })
+
+@login_required
+def export_stock_a_date(request):
+    """Stock de chaque produit à la fin du jour ?jour=, en CSV / XLSX."""
+    jour = _jour_demande(request)
+    return reponse_export(
+        request, f'stock_{jour:%Y%m%d}',
+        ['Produit', 'Référence', 'Catégorie', 'Quantité', "Prix d'achat", 'Valeur'],
+        InstantaneStock.stocks_au(jour).order_by('nom', 'pk').values_list(
+            'nom', 'reference', 'categorie__nom', 'quantite_au', 'prix_achat_au', 'valeur_au',
+        ),
+    )
+
+# ✅ INVENTAIRE VIEWS
+
+# Écarts affichés sur la page d'une session (les plus importants d'abord)
+ECARTS_AFFICHES = 200
+
+@login_required
+def liste_inventaires(request):
+    """Sessions d'inventaire et ouverture d'une nouvelle session"""
+    if request.method == 'POST':
+        form = InventaireForm(request.POST)
+        if form.is_valid():
+            inventaire = Inventaire.ouvrir(
+                form.cleaned_data['nom'], request.user, categorie=form.cleaned_data['categorie'],
+            )
+            messages.success(request, f"Inventaire '{inventaire.nom}' ouvert : stock attendu figé.")
+            return redirect('detail_inventaire', pk=inventaire.pk)
+        messages.error(request, "Veuillez corriger les erreurs ci-dessous.")
+    else:
+        form = InventaireForm()
+
+    inventaires = Inventaire.objects.select_related('categorie', 'ouvert_par')
+    return render(request, 'boutique/inventaires/liste.html', {'form': form, 'inventaires': inventaires})
+
+@login_required
+def detail_inventaire(request, pk):
+    """Avancement par rayon et écarts d'une session d'inventaire"""
+    inventaire = get_object_or_404(Inventaire.objects.select_related('categorie'), pk=pk)
+    ecarts = inventaire.ecarts().select_related('produit').order_by(Abs('ecart').desc(), 'produit__nom')
+    return render(request, 'boutique/inventaires/detail.html', {
+        'inventaire': inventaire,
+        'resume': inventaire.resume(),
+        'rayons': inventaire.rayons(),
+        'ecarts': ecarts[:ECARTS_AFFICHES],
     })
 
+@login_required
+def saisie_inventaire(request, pk):
+    """
+    Feuille de comptage d'un rayon (?rayon=<catégorie> ou ?rayon=aucun). Seules
+    les quantités modifiées sur la feuille sont envoyées à la base : deux
+    personnes peuvent compter le même rayon sans écraser leurs saisies.
+    """
+    inventaire = get_object_or_404(Inventaire, pk=pk)
+    rayon = request.GET.get('rayon', '')
+    if rayon != 'aucun' and not rayon.isdigit():
+        return redirect('detail_inventaire', pk=pk)
+
+    if request.method == 'POST':
+        if not inventaire.est_en_cours:
+            messages.error(request, "Cet inventaire est clôturé : les comptages ne sont plus modifiables.")
+            return redirect('detail_inventaire', pk=pk)
+        comptages, erreurs = {}, 0
+        for cle, valeur in request.POST.items():
+            if not cle.startswith('compte-') or not cle[7:].isdigit():
+                continue
+            valeur = valeur.strip()
+            if valeur == request.POST.get(f'avant-{cle[7:]}', '').strip():
+                continue
+            if valeur and not valeur.isdigit():
+                erreurs += 1
+                continue
+            comptages[int(cle[7:])] = int(valeur) if valeur else None
+        ecrites = inventaire.enregistrer_comptages(comptages, request.user)
+        messages.success(request, f"{ecrites} comptage(s) enregistré(s).")
+        if erreurs:
+            messages.error(request, f"{erreurs} quantité(s) illisible(s) ignorée(s) : entier positif attendu.")
+        return redirect(f"{request.path}?rayon={rayon}")
+
+    lignes = inventaire.lignes.select_related('produit').order_by('produit__nom')
+    lignes = lignes.filter(categorie=None) if rayon == 'aucun' else lignes.filter(categorie_id=rayon)
+    return render(request, 'boutique/inventaires/saisie.html', {
+        'inventaire': inventaire,
+        'lignes': lignes,
+        'rayon': rayon,
+        'categorie': referentiel.obtenir(Categorie, int(rayon)) if rayon.isdigit() else None,
+    })
+
+@login_required
+@role_requis('GESTIONNAIRE_BOUTIQUE', 'ADMIN', refus="Seul un gestionnaire peut clôturer un inventaire.")
+def cloturer_inventaire(request, pk):
+    """Applique les écarts au stock ou abandonne la session (POST)"""
+    inventaire = get_object_or_404(Inventaire, pk=pk)
+    if request.method == 'POST':
+        if request.POST.get('action') == 'appliquer':
+            nombre = inventaire.appliquer(request.user)
+            if nombre is None:
+                messages.error(request, "Cet inventaire est déjà clôturé.")
+            else:
+                messages.success(request, f"Inventaire appliqué : {nombre} ajustement(s) de stock.")
+        elif request.POST.get('action') == 'annuler':
+            if inventaire.annuler():
+                messages.success(request, "Inventaire annulé : le stock n'a pas été modifié.")
+            else:
+                messages.error(request, "Cet inventaire est déjà clôturé.")
+    return redirect('detail_inventaire', pk=pk)
+
 # ✅ VENTE VIEWS
 
 
@@ -157,7 +348,7 @@ def rapport_stock(request):
     
     return render(request, 'boutique/rapports/stock.html', {
         'produits': produits,
-        'categories': Categorie.objects.all()
+        'categories': referentiel.liste(Categorie)
     })
 
 @login_required
@@ -178,35 +369,40 @@ def creer_vente(request):
         formset = LigneDeVenteFormSet(request.POST)
 
         if vente_form.is_valid() and formset.is_valid():
-            with transaction.atomic():
-                vente = vente_form.save(commit=False)
-                vente.vendeur = request.user
-                vente.save()
-
-                lignes = formset.save(commit=False)
-                for form, ligne in zip(formset.forms, lignes):
-                    # prix par défaut si manquant
-                    if (not ligne.prix_unitaire_vente or ligne.prix_unitaire_vente == 0) and ligne.produit:
-                        ligne.prix_unitaire_vente = ligne.produit.prix_vente
-
-                    ligne.vente = vente
-                    ligne.full_clean()
-                    ligne.save()
-
-                # Montant total & sortie de stock (option A)
-                vente.calculer_total()
-                vente.finaliser()
-
-                # Acompte ?
-                acompte = vente_form.cleaned_data.get('acompte') or Decimal('0.00')
-                mode = vente_form.cleaned_data.get('mode_paiement') or "ESPECES"
-                if acompte > 0:
-                    # On n’autorise pas plus que le total
-                    acompte = min(acompte, vente.total)
-                    vente.enregistrer_paiement(acompte, utilisateur=request.user, mode=mode, note="Acompte à la création")
-
-                messages.success(request, "Vente enregistrée avec succès.")
-                return redirect('detail_vente', vente.id)
+            try:
+                with transaction.atomic():
+                    vente = vente_form.save(commit=False)
+                    vente.vendeur = request.user
+                    vente.save()
+
+                    lignes = formset.save(commit=False)
+                    # Un seul calcul du total pour tout le panier (et non un par ligne)
+                    with totaux_differes():
+                        for form, ligne in zip(formset.forms, lignes):
+                            # prix par défaut si manquant
+                            if (not ligne.prix_unitaire_vente or ligne.prix_unitaire_vente == 0) and ligne.produit:
+                                ligne.prix_unitaire_vente = ligne.produit.prix_vente
+
+                            ligne.vente = vente
+                            ligne.save()
+                    vente.refresh_from_db(fields=['total'])
+
+                    # Sortie de stock (option A) : le stock de tout le
+                    # panier est vérifié d'un coup par finaliser()
+                    vente.finaliser()
+
+                    # Acompte ?
+                    acompte = vente_form.cleaned_data.get('acompte') or Decimal('0.00')
+                    mode = vente_form.cleaned_data.get('mode_paiement') or "ESPECES"
+                    if acompte > 0:
+                        # On n’autorise pas plus que le total
+                        acompte = min(acompte, vente.total)
+                        vente.enregistrer_paiement(acompte, utilisateur=request.user, mode=mode, note="Acompte à la création")
+
+                    messages.success(request, "Vente enregistrée avec succès.")
+                    return redirect('detail_vente', vente.id)
+            except ValidationError as e:
+                messages.error(request, " ".join(e.messages))
         else:
             messages.error(request, "Veuillez corriger les erreurs du formulaire.")
     else:
@@ -249,34 +445,66 @@ def ajouter_paiement(request, vente_id):
 def liste_dettes(request):
     ventes = (Vente.objects
               .filter(total__gt=F('montant_encaisse'))
-              .order_by('-date_vente')
               .select_related('vendeur'))
-    return render(request, 'boutique/ventes/liste_dettes.html', {'ventes': ventes})
+    return render(request, 'boutique/ventes/liste_dettes.html', {
+        'ventes': paginer_par_curseur(request, ventes, 'date_vente'),
+    })
+
+# Durée (secondes) pendant laquelle une même saisie réutilise ses résultats
+DUREE_CACHE_RECHERCHE = 30
+
 
 @login_required
 def produit_autocomplete(request):
     q = request.GET.get('q', '').strip()
-    results = []
-    if q:
-        produits = Produit.objects.filter(nom__icontains=q).order_by('nom')[:10]
-        for p in produits:
-            results.append({
+    if not q:
+        return JsonResponse({'results': []})
+
+    cle = 'produit_autocomplete:' + hashlib.md5(q.encode()).hexdigest()
+    results = cache.get(cle)
+    if results is None:
+        results = [
+            {
                 'id': p.id,
                 'text': p.nom,
+                'reference': p.reference or '',
                 'prix_vente': str(p.prix_vente),
                 'stock': p.quantite_stock,
                 'categorie': p.categorie.nom if p.categorie else '',
-            })
+            }
+            for p in Produit.rechercher(q)
+        ]
+        cache.set(cle, results, DUREE_CACHE_RECHERCHE)
     return JsonResponse({'results': results})
 
 
+@login_required
+def produit_par_reference(request):
+    """Résout un code scanné (SKU / EAN) en une seule requête sur l'index unique."""
+    code = request.GET.get('code', '').strip()
+    produit = (Produit.objects
+               .filter(reference=code)
+               .values('id', 'nom', 'reference', 'prix_vente', 'quantite_stock')
+               .first()) if code else None
+    if produit is None:
+        return JsonResponse({'erreur': f"Aucun produit avec le code « {code} »."}, status=404)
+    return JsonResponse({
+        'id': produit['id'],
+        'text': produit['nom'],
+        'reference': produit['reference'],
+        'prix_vente': str(produit['prix_vente']),
+        'stock': produit['quantite_stock'],
+    })
+
+
 
 
 
 @login_required
 def detail_vente(request, pk):
-    vente = get_object_or_404(Vente, pk=pk)
-    lignes = vente.lignes.select_related('produit')  # Optimisation
+    vente = get_object_or_404(Vente.objects.select_related('vendeur').prefetch_related('paiements'), pk=pk)
+    # Liste (et non queryset) : le template la compte et la parcourt plusieurs fois
+    lignes = list(vente.lignes.select_related('produit'))
 
     return render(request, 'boutique/ventes/detail_vente.html', {
         'vente': vente,
@@ -285,8 +513,42 @@ def detail_vente(request, pk):
 
 @login_required
 def liste_ventes(request):
-    ventes = Vente.objects.select_related('vendeur').order_by('-date_vente')
-    return render(request, 'boutique/ventes/liste_ventes.html', {'ventes': ventes})
+    # Nombre de lignes par sous-requête, évaluée pour les seules ventes de la page
+    nb_lignes = (
+        LigneDeVente.objects
+        .filter(vente=OuterRef('pk'))
+        .values('vente')
+        .annotate(nb=Count('pk'))
+        .values('nb')
+    )
+    ventes = (Vente.objects
+              .select_related('vendeur')
+              .annotate(nb_lignes=Coalesce(Subquery(nb_lignes), Value(0))))
+    return render(request, 'boutique/ventes/liste_ventes.html', {
+        'ventes': paginer_par_curseur(request, ventes, 'date_vente'),
+    })
+
+
+@login_required
+def export_ventes(request):
+    """Ventes en CSV / XLSX : période (jour de vente), statut et vendeur en filtres GET."""
+    ventes = Vente.objects.filter(filtre_periode(request, 'jour_vente'))
+    if request.GET.get('statut'):
+        ventes = ventes.filter(statut=request.GET['statut'])
+    if request.GET.get('vendeur', '').isdigit():
+        ventes = ventes.filter(vendeur_id=request.GET['vendeur'])
+    return reponse_export(
+        request, 'ventes',
+        ['N° vente', 'Date', 'Vendeur', 'Client', 'Total', 'Encaissé', 'Reste à payer', 'Statut', 'Finalisée'],
+        ventes.order_by('date_vente', 'pk')
+        .annotate(reste=ExpressionWrapper(
+            F('total') - F('montant_encaisse'), output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+        .values_list(
+            'pk', 'date_vente', 'vendeur__username', 'client_nom', 'total', 'montant_encaisse', 'reste',
+            'statut', 'est_complete',
+        ),
+    )
 
 
 @login_required
@@ -297,21 +559,19 @@ def ventes_journaliere(request):
         try:
             date = timezone.datetime.strptime(date_str, '%Y-%m-%d').date()
         except ValueError:
-            date = timezone.now().date()
+            date = timezone.localdate()
     else:
-        date = timezone.now().date()
-
-    ventes = Vente.objects.filter(date_vente__date=date, est_complete=True)
-
-    lignes = LigneDeVente.objects.filter(vente__in=ventes)
+        date = timezone.localdate()
 
-    ca_total = lignes.aggregate(
-        total_ca=Sum(ExpressionWrapper(F('prix_unitaire_vente') * F('quantite'), output_field=DecimalField()))
-    )['total_ca'] or 0
+    ventes = Vente.objects.filter(jour_vente=date, est_complete=True).select_related('vendeur')
 
-    cout_total = lignes.aggregate(
-        total_cout=Sum(ExpressionWrapper(F('produit__prix_achat') * F('quantite'), output_field=DecimalField()))
-    )['total_cout'] or 0
+    # Totaux lus dans les résumés journaliers (pas de ré-agrégation des lignes)
+    totaux = ResumeVentesJour.objects.filter(jour=date).aggregate(
+        total_ca=Sum('chiffre_affaires'),
+        total_cout=Sum('cout_achat'),
+    )
+    ca_total = totaux['total_ca'] or 0
+    cout_total = totaux['total_cout'] or 0
 
     marge = ca_total - cout_total
 
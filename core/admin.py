@@ -1,8 +1,9 @@
 from django.contrib import admin
+from django.utils.html import format_html
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as DefaultUserAdmin
 from core.models import Depense, ProfilUtilisateur
-from .models import ConnexionHistorique
+from .models import ConnexionHistorique, RequeteLente
 
 # Étendre l'affichage dans admin
 class ProfilUtilisateurInline(admin.StackedInline):
@@ -29,3 +30,30 @@ class ConnexionHistoriqueAdmin(admin.ModelAdmin):
     readonly_fields = ('user', 'event', 'timestamp', 'ip_address', 'user_agent', 'session_key', 'note')
     ordering = ('-timestamp',)
 
+
+@admin.register(RequeteLente)
+class RequeteLenteAdmin(admin.ModelAdmin):
+    list_display = ('sql_court', 'vue', 'occurrences', 'duree_max_ms', 'duree_moyenne', 'derniere_occurrence')
+    list_filter = ('vue',)
+    search_fields = ('sql', 'vue', 'empreinte')
+    readonly_fields = (
+        'empreinte', 'sql', 'plan_formate', 'vue', 'empreinte_parametres', 'occurrences',
+        'duree_totale_ms', 'duree_max_ms', 'premiere_occurrence', 'derniere_occurrence',
+    )
+    exclude = ('plan',)
+    ordering = ('-duree_totale_ms',)
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="SQL")
+    def sql_court(self, obj):
+        return obj.sql[:120]
+
+    @admin.display(description="Durée moyenne (ms)")
+    def duree_moyenne(self, obj):
+        return round(obj.duree_moyenne_ms, 1)
+
+    @admin.display(description="Plan (EXPLAIN)")
+    def plan_formate(self, obj):
+        return format_html('<pre style="white-space: pre-wrap">{}</pre>', obj.plan)
@@ -6,6 +6,7 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
+        import core.checks  # noqa: F401
         import core.signals  # noqa: F401
 
 
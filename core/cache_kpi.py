@@ -0,0 +1,60 @@
+# core/cache_kpi.py
+
+"""
+Cache des indicateurs (KPI) des dashboards, par entité et par jour.
+
+La clé d'un jeu d'indicateurs contient le jour et la version courante de
+l'entité. Les chemins d'écriture (finalisation, paiement, stock, prestation,
+dépense) changent la version : le calcul suivant repart de la base, les
+anciennes clés expirent d'elles-mêmes.
+"""
+
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.metriques import acces_cache
+
+BOUTIQUE = 'BOUTIQUE'
+SALON = 'SALON'
+
+# Au-delà, le jeu d'indicateurs est recalculé même sans écriture : borne la
+# fraîcheur si une écriture échappe aux invalidations (import, shell, SQL direct)
+DUREE_KPIS = 5 * 60
+
+
+def _cle_version(entite):
+    return f'kpi:{entite}:version'
+
+
+def _version(entite):
+    cle = _cle_version(entite)
+    version = cache.get(cle)
+    if version is None:
+        cache.add(cle, uuid.uuid4().hex, None)
+        version = cache.get(cle)
+    return version
+
+
+def _changer_versions(entites):
+    cache.set_many({_cle_version(entite): uuid.uuid4().hex for entite in entites}, None)
+
+
+def invalider_kpis(*entites):
+    """À appeler après toute écriture qui modifie les indicateurs de ces entités."""
+    _changer_versions(entites)
+    # Encore une fois après le commit : un dashboard a pu recalculer entre-temps
+    # à partir de données pas encore validées
+    transaction.on_commit(lambda: _changer_versions(entites))
+
+
+def kpis_en_cache(entite, jour, calculer):
+    """Indicateurs de `entite` pour `jour` : lus en cache, sinon `calculer()` puis mis en cache."""
+    cle = f'kpi:{entite}:{jour.isoformat()}:{_version(entite)}'
+    kpis = cache.get(cle)
+    acces_cache('kpi', kpis is not None)
+    if kpis is None:
+        kpis = calculer()
+        cache.set(cle, kpis, DUREE_KPIS)
+    return kpis
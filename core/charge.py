@@ -0,0 +1,279 @@
+# core/charge.py
+
+"""
+Test de charge de l'heure de pointe contre un serveur lancé à part (runserver
+ou gunicorn, SQLite ou PostgreSQL local), piloté par la commande tester_charge.
+
+Chaque utilisateur virtuel est un thread avec sa propre session (cookies,
+jeton CSRF) qui enchaîne les itérations de son scénario, séparées d'un temps
+de réflexion. Bibliothèque standard uniquement (urllib) : rien à installer
+sur le poste qui génère la charge.
+"""
+
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from http.cookies import SimpleCookie
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin, urlsplit, urlunsplit
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+from django.utils import timezone
+
+from core.instrumentation import centile
+
+OK, ERREUR, CONFLIT = 'ok', 'erreur', 'conflit'
+
+# Message de Vente.finaliser quand le stock a été pris par une autre caisse
+STOCK_INSUFFISANT = 'Stock insuffisant'
+
+# Recherches envoyées par l'autocomplétion pendant la frappe d'un nom
+FRAPPES = 4
+
+DATE_FORMULAIRE = '%Y-%m-%dT%H:%M'
+
+
+class _SansRedirection(HTTPRedirectHandler):
+    """Les redirections sont renvoyées telles quelles (302 = formulaire accepté)."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClientHTTP:
+    """Session d'un utilisateur virtuel : cookies et jeton CSRF, sans redirection automatique."""
+
+    def __init__(self, base, https=False, delai=30):
+        self.base = base
+        # Derrière un proxy TLS (DEBUG désactivé) : cookies Secure renvoyés
+        # et Referer HTTPS exigé par la protection CSRF
+        self.https = https
+        self.delai = delai
+        self.cookies = {}
+        self._ouvreur = build_opener(_SansRedirection)
+
+    def requete(self, chemin, donnees=None, params=None):
+        """(statut, en-têtes, corps) ; un statut d'erreur HTTP est renvoyé, pas levé."""
+        url = urljoin(self.base, chemin)
+        if params:
+            url += '?' + urlencode(params)
+        entetes = {'Cookie': '; '.join(f'{nom}={valeur}' for nom, valeur in self.cookies.items())}
+        if self.https:
+            entetes['X-Forwarded-Proto'] = 'https'
+            entetes['Referer'] = urlunsplit(urlsplit(url)._replace(scheme='https'))
+        corps = None
+        if donnees is not None:
+            donnees = {'csrfmiddlewaretoken': self.cookies.get('csrftoken', ''), **donnees}
+            corps = urlencode(donnees).encode()
+        try:
+            reponse = self._ouvreur.open(Request(url, data=corps, headers=entetes), timeout=self.delai)
+        except HTTPError as erreur:
+            reponse = erreur
+        with reponse:
+            contenu = reponse.read()
+        for entete in reponse.headers.get_all('Set-Cookie') or []:
+            for nom, morsel in SimpleCookie(entete).items():
+                self.cookies[nom] = morsel.value
+        return reponse.code, reponse.headers, contenu
+
+    def connecter(self, url_connexion, username, password):
+        self.requete(url_connexion)  # cookie CSRF
+        statut, _, _ = self.requete(url_connexion, {'username': username, 'password': password})
+        return statut == 302 and 'sessionid' in self.cookies
+
+
+class Statistiques:
+    """Durées et issues des actions par (scénario, action), partagées entre les threads."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.durees = defaultdict(list)
+        self.issues = defaultdict(Counter)
+
+    def noter(self, scenario, action, duree, issue):
+        with self._verrou:
+            self.durees[scenario, action].append(duree)
+            self.issues[scenario, action][issue] += 1
+
+    def rapport(self, duree_totale):
+        """Une ligne par (scénario, action) puis une ligne « total » par scénario."""
+        groupes = defaultdict(list)
+        for scenario, action in sorted(self.durees):
+            groupes[scenario].append(action)
+        lignes = []
+        for scenario, actions in groupes.items():
+            for action in actions:
+                lignes.append(self._ligne(scenario, action, self.durees[scenario, action],
+                                          self.issues[scenario, action], duree_totale))
+            lignes.append(self._ligne(
+                scenario, 'total',
+                [d for action in actions for d in self.durees[scenario, action]],
+                sum((self.issues[scenario, action] for action in actions), Counter()),
+                duree_totale,
+            ))
+        return lignes
+
+    @staticmethod
+    def _ligne(scenario, action, durees, issues, duree_totale):
+        nombre = len(durees)
+        return {
+            'scenario': scenario,
+            'action': action,
+            'requetes': nombre,
+            'debit': round(nombre / duree_totale, 2),
+            # Les conflits de stock comptent dans le taux d'erreur
+            'erreurs_pct': round((issues[ERREUR] + issues[CONFLIT]) / nombre * 100, 1),
+            'conflits': issues[CONFLIT],
+            'p50_ms': round(centile(durees, 50) * 1000, 1),
+            'p95_ms': round(centile(durees, 95) * 1000, 1),
+            'p99_ms': round(centile(durees, 99) * 1000, 1),
+        }
+
+
+class Scenario:
+    """Utilisateur virtuel : `iteration()` est répétée jusqu'à l'échéance."""
+
+    nom = ''
+    role = ''
+
+    def __init__(self, client, contexte, statistiques, graine, pause):
+        self.client = client
+        self.contexte = contexte  # urls, produits, personnel, services
+        self.urls = contexte['urls']
+        self.statistiques = statistiques
+        self.hasard = random.Random(graine)
+        self.pause = pause
+
+    def reflechir(self, facteur=1):
+        if self.pause:
+            time.sleep(self.hasard.uniform(0.5, 1.5) * self.pause * facteur)
+
+    def mesurer(self, action, url, donnees=None, params=None, attendu=200):
+        debut = time.perf_counter()
+        try:
+            statut, entetes, corps = self.client.requete(url, donnees, params)
+        except (URLError, OSError):
+            statut, entetes, corps = None, {}, b''
+        duree = time.perf_counter() - debut
+        if statut == attendu:
+            issue = OK
+        elif statut == 200 and STOCK_INSUFFISANT.encode() in corps:
+            issue = CONFLIT
+        else:
+            issue = ERREUR
+        self.statistiques.noter(self.nom, action, duree, issue)
+        return issue, entetes
+
+    def iteration(self):
+        raise NotImplementedError
+
+
+class Caissier(Scenario):
+    """Formulaire de vente, recherche des articles pendant la frappe, vente, puis son détail."""
+
+    nom = 'caissier'
+    role = 'VENDEUR'
+
+    def iteration(self):
+        self.mesurer('formulaire_vente', self.urls['creer_vente'])
+        produits = self.contexte['produits']
+        panier = self.hasard.sample(produits, k=min(self.hasard.randint(1, 3), len(produits)))
+        for produit in panier:
+            nom = produit['nom']
+            for longueur in range(max(len(nom) - FRAPPES + 1, 1), len(nom) + 1):
+                self.mesurer('autocomplete', self.urls['produit_autocomplete'], params={'q': nom[:longueur]})
+                self.reflechir(0.1)
+        self.reflechir()
+
+        donnees = {
+            'date_vente': timezone.localtime().strftime(DATE_FORMULAIRE),
+            'client_nom': 'Client de passage',
+            'acompte': '0',
+            'mode_paiement': 'ESPECES',
+            'lignes-TOTAL_FORMS': str(len(panier)),
+            'lignes-INITIAL_FORMS': '0',
+            'lignes-MIN_NUM_FORMS': '0',
+            'lignes-MAX_NUM_FORMS': '1000',
+        }
+        for i, produit in enumerate(panier):
+            donnees[f'lignes-{i}-produit'] = produit['id']
+            donnees[f'lignes-{i}-quantite'] = self.hasard.randint(1, 3)
+        issue, entetes = self.mesurer('enregistrer_vente', self.urls['creer_vente'], donnees, attendu=302)
+        if issue == OK:
+            self.mesurer('detail_vente', entetes['Location'])
+
+
+class GerantBoutique(Scenario):
+    nom = 'gerant_boutique'
+    role = 'GESTIONNAIRE_BOUTIQUE'
+
+    def iteration(self):
+        self.mesurer('dashboard', self.urls['dashboard'])
+        self.reflechir(5)
+
+
+class GerantSalon(Scenario):
+    nom = 'gerant_salon'
+    role = 'GESTIONNAIRE_SALON'
+
+    def iteration(self):
+        self.mesurer('dashboard_salon', self.urls['dashboard_salon'])
+        self.reflechir(5)
+
+
+class Coiffeur(Scenario):
+    """Saisie d'une prestation au salon."""
+
+    nom = 'coiffeur'
+    role = 'GESTIONNAIRE_SALON'
+
+    def iteration(self):
+        self.mesurer('formulaire_prestation', self.urls['ajouter_prestation'])
+        self.reflechir(3)
+        personnel = self.hasard.choice(self.contexte['personnel'])
+        service = self.hasard.choice(self.contexte['services'])
+        self.mesurer('enregistrer_prestation', self.urls['ajouter_prestation'], {
+            'personnel': personnel['id'],
+            'secteur': personnel['secteur_id'],
+            'service': service['id'],
+            'montant_paye': service['prix'],
+            'date_prestation': timezone.localtime().strftime(DATE_FORMULAIRE),
+        }, attendu=302)
+
+
+SCENARIOS = {scenario.nom: scenario for scenario in (Caissier, GerantBoutique, GerantSalon, Coiffeur)}
+
+
+def lancer(base, utilisateurs, contexte, duree, montee=0, pause=1.0, https=False, graine=0):
+    """
+    Fait tourner les utilisateurs virtuels pendant `duree` secondes et renvoie
+    (lignes du rapport, connexions refusées).
+
+    `utilisateurs` : liste de (nom du scénario, username, mot de passe). Les
+    départs sont étalés sur `montee` secondes.
+    """
+    statistiques = Statistiques()
+    refuses = []
+    debut = time.monotonic()
+    echeance = debut + montee + duree
+
+    def faire_tourner(rang, scenario, username, password):
+        time.sleep(montee * rang / max(len(utilisateurs), 1))
+        client = ClientHTTP(base, https=https)
+        if not client.connecter(contexte['urls']['connexion'], username, password):
+            refuses.append(username)
+            return
+        utilisateur = SCENARIOS[scenario](client, contexte, statistiques, graine + rang, pause)
+        while time.monotonic() < echeance:
+            utilisateur.iteration()
+
+    threads = [
+        threading.Thread(target=faire_tourner, args=(rang, *utilisateur), daemon=True)
+        for rang, utilisateur in enumerate(utilisateurs)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statistiques.rapport(time.monotonic() - debut), refuses
@@ -0,0 +1,24 @@
+# core/checks.py
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def verifier_cache_partage(app_configs, **kwargs):
+    """
+    Les versions du référentiel, des profils et des indicateurs vivent dans le
+    cache par défaut : un cache propre à chaque processus laisse les autres
+    workers servir des données périmées.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if settings.DEBUG or not backend.endswith(('LocMemCache', 'DummyCache')):
+        return []
+    return [Warning(
+        "Le cache par défaut n'est pas partagé entre les workers gunicorn.",
+        hint=(
+            "Les invalidations (référentiel, profils, indicateurs) ne seraient vues que par le "
+            "worker qui écrit : utiliser FileBasedCache ou RedisCache, ou un seul worker."
+        ),
+        id='core.W001',
+    )]
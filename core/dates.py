@@ -0,0 +1,28 @@
+# core/dates.py
+
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def jour_local(moment):
+    """Jour ouvrable (date locale, fuseau du projet) d'un horodatage."""
+    if timezone.is_aware(moment):
+        return timezone.localdate(moment)
+    return moment.date()
+
+
+def bornes_jour(debut, fin=None):
+    """
+    Intervalle semi-ouvert [début, fin) d'horodatages couvrant les jours locaux
+    `debut` à `fin` inclus (un seul jour si `fin` est omis).
+
+    À utiliser à la place de `champ__date=...`, qui oblige la base à convertir
+    chaque horodatage dans le fuseau local et empêche l'usage d'un index.
+    """
+    fin = fin or debut
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(debut, time.min), tz),
+        timezone.make_aware(datetime.combine(fin + timedelta(days=1), time.min), tz),
+    )
@@ -1,12 +1,20 @@
+from django.http import HttpResponseForbidden
 from django.shortcuts import redirect
 from functools import wraps
 
-def role_requis(role_attendu):
+def role_requis(*roles_acceptes, refus=None):
+    """
+    Réserve la vue aux rôles donnés (lus dans request.profil, voir
+    core.middleware.ProfilMiddleware). Sinon : redirection vers le dashboard,
+    ou 403 avec le message `refus` s'il est fourni.
+    """
     def decorateur(view_func):
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
-            if hasattr(request.user, 'profilutilisateur') and request.user.profilutilisateur.role == role_attendu:
+            if request.profil.a_role(*roles_acceptes):
                 return view_func(request, *args, **kwargs)
+            if refus is not None:
+                return HttpResponseForbidden(refus)
             return redirect('dashboard')  # Ou une page "non autorisé"
         return _wrapped_view
     return decorateur
@@ -0,0 +1,208 @@
+# core/exports.py
+
+"""
+Exports CSV et XLSX diffusés au fil de l'eau (StreamingHttpResponse).
+
+Les lignes viennent d'un `values_list(...).iterator(chunk_size=TAILLE_LOT)` :
+les colonnes jointes (produit, vendeur, personnel…) sont lues par la même
+requête, sans instancier de modèles, et la mémoire reste constante quel que
+soit le nombre de lignes. Le fichier XLSX (une archive zip de XML) est écrit
+entrée par entrée dans un zip non seekable : chaque lot de lignes est envoyé
+au client dès qu'il est compressé.
+"""
+
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Lignes lues par aller-retour avec la base (curseur serveur sur PostgreSQL)
+TAILLE_LOT = 2000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+_ORIGINE_EXCEL = datetime(1899, 12, 30)
+# Caractères de contrôle interdits dans le XML des feuilles
+_INTERDITS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def filtre_periode(request, champ):
+    """Q sur `champ` d'après les paramètres GET date_debut / date_fin (AAAA-MM-JJ), ignorés si illisibles."""
+    filtre = Q()
+    for parametre, lookup in (('date_debut', 'gte'), ('date_fin', 'lte')):
+        try:
+            filtre &= Q(**{f'{champ}__{lookup}': date.fromisoformat(request.GET.get(parametre, ''))})
+        except ValueError:
+            pass
+    return filtre
+
+
+def _valeur(valeur):
+    """Valeur telle qu'exportée : datetimes en heure locale, None vide."""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, datetime) and timezone.is_aware(valeur):
+        return timezone.localtime(valeur).replace(tzinfo=None)
+    return valeur
+
+
+class _Tampon:
+    """Fichier en écriture dont on récupère le contenu au fur et à mesure."""
+
+    def __init__(self):
+        self.morceaux = []
+
+    def write(self, donnees):
+        self.morceaux.append(donnees.encode() if isinstance(donnees, str) else donnees)
+        return len(donnees)
+
+    def flush(self):
+        pass
+
+    def vider(self):
+        contenu = b''.join(self.morceaux)
+        self.morceaux = []
+        return contenu
+
+
+def flux_csv(entetes, lignes):
+    """Lignes CSV (séparateur « ; », BOM pour Excel), un morceau par lot de lignes."""
+    tampon = _Tampon()
+    tampon.write('\ufeff')
+    ecrivain = csv.writer(tampon, delimiter=';')
+    ecrivain.writerow(entetes)
+    for numero, ligne in enumerate(lignes, 1):
+        ecrivain.writerow([_valeur(valeur) for valeur in ligne])
+        if numero % TAILLE_LOT == 0:
+            yield tampon.vider()
+    yield tampon.vider()
+
+
+def _cellule(valeur):
+    valeur = _valeur(valeur)
+    if valeur == '':
+        return '<c/>'
+    if isinstance(valeur, bool):
+        return f'<c t="b"><v>{int(valeur)}</v></c>'
+    if isinstance(valeur, (int, float, Decimal)):
+        return f'<c><v>{valeur}</v></c>'
+    if isinstance(valeur, datetime):
+        jours = (valeur - _ORIGINE_EXCEL).total_seconds() / 86400
+        return f'<c s="2"><v>{jours}</v></c>'
+    if isinstance(valeur, date):
+        return f'<c s="1"><v>{(valeur - _ORIGINE_EXCEL.date()).days}</v></c>'
+    texte = escape(_INTERDITS_XML.sub('', str(valeur)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texte}</t></is></c>'
+
+
+def _ligne_xml(valeurs):
+    return '<row>' + ''.join(_cellule(valeur) for valeur in valeurs) + '</row>'
+
+
+_FICHIERS_XLSX = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Styles : 0 = standard, 1 = date, 2 = date et heure
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="3"><xf xfId="0"/><xf numFmtId="14" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="164" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+
+def flux_xlsx(entetes, lignes, feuille='Export'):
+    """Classeur XLSX d'une feuille, un morceau compressé par lot de lignes."""
+    tampon = _Tampon()
+    with zipfile.ZipFile(tampon, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for nom, contenu in _FICHIERS_XLSX.items():
+            archive.writestr(nom, contenu)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(feuille[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield tampon.vider()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as xml:
+            xml.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _ligne_xml(entetes)
+            ).encode())
+            lot = []
+            for ligne in lignes:
+                lot.append(_ligne_xml(ligne))
+                if len(lot) == TAILLE_LOT:
+                    xml.write(''.join(lot).encode())
+                    lot = []
+                    # Vide tant que le compresseur n'a pas rempli son bloc
+                    contenu = tampon.vider()
+                    if contenu:
+                        yield contenu
+            xml.write((''.join(lot) + '</sheetData></worksheet>').encode())
+    yield tampon.vider()
+
+
+def reponse_export(request, nom, entetes, queryset):
+    """
+    Export de `queryset` (un values_list dans l'ordre de `entetes`) au format
+    demandé par le paramètre GET `format` : csv (défaut) ou xlsx.
+    """
+    format_ = request.GET.get('format', 'csv')
+    if format_ not in FORMATS:
+        format_ = 'csv'
+    lignes = queryset.iterator(chunk_size=TAILLE_LOT)
+    flux = flux_xlsx(entetes, lignes, feuille=nom) if format_ == 'xlsx' else flux_csv(entetes, lignes)
+    reponse = StreamingHttpResponse(flux, content_type=FORMATS[format_])
+    reponse['Content-Disposition'] = f'attachment; filename="{nom}-{timezone.localdate():%Y%m%d}.{format_}"'
+    return reponse
@@ -1,8 +1,62 @@
+import copy
+
 from django import forms
 from django.contrib.auth.models import User
+from django.forms.models import ModelChoiceIterator
+from core import referentiel
 from core.models import ProfilUtilisateur, Depense
 from django.contrib.auth.forms import AuthenticationForm
 
+
+class ReferentielChoiceIterator(ModelChoiceIterator):
+    """Options lues dans le référentiel en mémoire plutôt qu'en base."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for objet in referentiel.liste(self.queryset.model):
+            yield self.choice(objet)
+
+    def __len__(self):
+        return len(referentiel.liste(self.queryset.model)) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(referentiel.liste(self.queryset.model))
+
+
+class ReferentielChoiceField(forms.ModelChoiceField):
+    """
+    Choix d'une ligne d'un modèle enregistré dans core.referentiel : ni le rendu
+    ni la validation ne touchent la base (à utiliser via Meta.field_classes).
+    """
+    iterator = ReferentielChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            objet = referentiel.obtenir(self.queryset.model, int(value))
+        except (TypeError, ValueError):
+            objet = None
+        if objet is None:
+            return super().to_python(value)
+        # Copie : l'instance en mémoire est partagée entre les requêtes
+        return copy.copy(objet)
+
+
+class ReferentielFormMixin:
+    """
+    Pour les ModelForm utilisant ReferentielChoiceField : la ligne choisie est
+    déjà connue, inutile que le modèle revérifie son existence en base.
+    """
+
+    def _get_validation_exclusions(self):
+        exclusions = super()._get_validation_exclusions()
+        exclusions.update(
+            nom for nom, champ in self.fields.items() if isinstance(champ, ReferentielChoiceField)
+        )
+        return exclusions
+
 class InscriptionForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput)
     role = forms.ChoiceField(choices=ProfilUtilisateur.ROLE_CHOICES, label="Rôle")
@@ -0,0 +1,85 @@
+# core/instrumentation.py
+
+"""
+Mesure des requêtes SQL exécutées pendant un bloc de code (une requête HTTP
+pour InstrumentationMiddleware) : nombre, durée cumulée et requête la plus lente.
+Normalisation, empreinte et plan EXPLAIN des requêtes lentes (RequeteLente).
+"""
+
+import hashlib
+import math
+import re
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# Une requête SQL lente n'est expliquée que si elle lit ou modifie des lignes
+_EXPLICABLES = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+_CHAINE = re.compile(r"'(?:[^']|'')*'")
+_NOMBRE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTE = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+_ESPACES = re.compile(r'\s+')
+
+
+def normaliser_sql(sql):
+    """SQL sans valeurs littérales ni longueur de liste IN : « WHERE id IN (%s, ...) LIMIT ? »."""
+    sql = _CHAINE.sub('?', sql)
+    sql = _NOMBRE.sub('?', sql)
+    sql = _LISTE.sub('(%s, ...)', sql)
+    return _ESPACES.sub(' ', sql).strip()
+
+
+def centile(valeurs, rang):
+    """Centile par rang le plus proche (`rang` entre 0 et 100)."""
+    valeurs = sorted(valeurs)
+    return valeurs[max(math.ceil(rang / 100 * len(valeurs)) - 1, 0)]
+
+
+def empreinte(texte):
+    return hashlib.sha1(texte.encode()).hexdigest()
+
+
+def expliquer(alias, sql, params):
+    """Plan (EXPLAIN, sans ANALYZE : la requête n'est pas exécutée) ou '' si non applicable."""
+    if not sql.lstrip().upper().startswith(_EXPLICABLES):
+        return ''
+    connexion = connections[alias]
+    with connexion.cursor() as curseur:
+        curseur.execute(f'{connexion.ops.explain_query_prefix()} {sql}', params)
+        return '\n'.join(' '.join(str(colonne) for colonne in ligne) for ligne in curseur.fetchall())
+
+
+class MesureSQL:
+    """Wrapper d'exécution (connection.execute_wrapper) qui chronomètre chaque requête."""
+
+    def __init__(self, seuil=None):
+        self.nombre = 0
+        self.duree = 0.0
+        # (durée, sql, params, alias de la connexion) de la requête la plus lente
+        self.plus_lente = None
+        # Requêtes plus longues que `seuil` secondes, même forme que plus_lente
+        self.seuil = seuil
+        self.lentes = []
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = time.perf_counter() - debut
+            self.nombre += 1
+            self.duree += duree
+            requete = (duree, sql, params, context['connection'].alias)
+            if self.plus_lente is None or duree > self.plus_lente[0]:
+                self.plus_lente = requete
+            if self.seuil is not None and duree >= self.seuil:
+                self.lentes.append(requete)
+
+    @contextmanager
+    def activer(self):
+        """Chronomètre les requêtes de toutes les connexions pendant le bloc."""
+        with ExitStack() as pile:
+            for connexion in connections.all():
+                pile.enter_context(connexion.execute_wrapper(self))
+            yield self
@@ -0,0 +1,202 @@
+# core/jeu_essai.py
+
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+
+from boutique.models import Categorie, LigneDeVente, MouvementStock, Paiement, Produit, Vente
+from core.models import ConnexionHistorique, Depense
+from salon.models import Commission, Personnel, Prestation, Secteur, Service
+
+PREFIXE = 'essai-'
+
+
+@contextmanager
+def _dates_libres(*champs):
+    """Suspend auto_now_add pour pouvoir étaler les dates des lignes générées."""
+    for champ in champs:
+        champ.auto_now_add = False
+    try:
+        yield
+    finally:
+        for champ in champs:
+            champ.auto_now_add = True
+
+
+def _champ(modele, nom):
+    return modele._meta.get_field(nom)
+
+
+def generer_jeu_essai(nb_ventes, jours=365, graine=0, nb_produits=None, nb_categories=5, nb_personnel=10,
+                      resumes=True):
+    """
+    Insère un jeu de données synthétique réparti sur `jours` jours (en masse,
+    sans passer par les signaux) : catalogue, ventes avec lignes et paiements
+    (partiels pour une partie), mouvements, prestations, commissions, dépenses
+    et connexions. Les résumés journaliers sont ensuite reconstruits, sauf si
+    `resumes` est faux. Renvoie le nombre de lignes créées par modèle.
+
+    Destiné aux mesures (EXPLAIN, benchmarks) : ne pas lancer sur une base réelle
+    hors transaction annulée.
+    """
+    hasard = random.Random(graine)
+    maintenant = timezone.now()
+    # Références uniques d'un lancement à l'autre (SKU des produits)
+    lot = maintenant.strftime('%Y%m%d%H%M%S')
+
+    def instant():
+        return maintenant - timedelta(seconds=hasard.randrange(jours * 86400))
+
+    vendeur, _ = User.objects.get_or_create(username=f'{PREFIXE}vendeur')
+    categories = [
+        Categorie.objects.get_or_create(nom=f'{PREFIXE}categorie {i}')[0]
+        for i in range(nb_categories)
+    ]
+    produits = []
+    for i in range(nb_produits or max(nb_ventes // 5, 10)):
+        prix_achat = Decimal(hasard.randrange(100, 5000)) / 100
+        produits.append(Produit(
+            nom=f'{PREFIXE}produit {i}', nom_recherche=f'{PREFIXE}produit {i}', reference=f'{PREFIXE}{lot}-{i}',
+            categorie=categories[i % len(categories)] if categories else None,
+            quantite_stock=hasard.randrange(0, 300), seuil_stock_bas=5,
+            prix_achat=prix_achat, prix_vente=(prix_achat * Decimal('1.5')).quantize(Decimal('0.01')),
+        ))
+    produits = Produit.objects.bulk_create(produits, batch_size=1000)
+
+    secteurs = [
+        Secteur.objects.get_or_create(nom=nom, defaults={'taux_commission': Decimal('0.50')})[0]
+        for nom, _ in Secteur.NOM_CHOICES
+    ]
+    personnels = Personnel.objects.bulk_create([
+        Personnel(
+            nom=f'{PREFIXE}{i}', prenom='Test', secteur=secteurs[i % len(secteurs)],
+            taux_commission=Decimal(hasard.choice(['0.30', '0.40', '0.50'])),
+        )
+        for i in range(nb_personnel)
+    ])
+    services = Service.objects.bulk_create([
+        Service(nom=f'{PREFIXE}service {i}', prix=Decimal(prix), duree_estimee=timedelta(minutes=minutes))
+        for i, (prix, minutes) in enumerate([('5.00', 15), ('10.00', 30), ('25.00', 60), ('40.00', 90)])
+    ])
+
+    # Ventes : 1 à 3 lignes, total = somme des lignes ; 5 % non finalisées,
+    # 20 % des ventes finalisées payées à moitié seulement
+    ventes, lignes_par_vente = [], []
+    for _ in range(nb_ventes):
+        lignes = [
+            (produit, hasard.randrange(1, 4))
+            for produit in hasard.sample(produits, min(hasard.randrange(1, 4), len(produits)))
+        ]
+        total = sum(produit.prix_vente * quantite for produit, quantite in lignes)
+        est_complete = hasard.random() < 0.95
+        partielle = hasard.random() < 0.2
+        encaisse = (total / 2).quantize(Decimal('0.01')) if partielle else total
+        if not est_complete:
+            encaisse = Decimal('0')
+        date_vente = instant()
+        ventes.append(Vente(
+            vendeur=vendeur, date_vente=date_vente, jour_vente=timezone.localdate(date_vente),
+            total=total, est_complete=est_complete, montant_encaisse=encaisse,
+            statut=(
+                Vente.STATUT_IMPAYEE if not encaisse
+                else Vente.STATUT_PAYEE if encaisse == total else Vente.STATUT_PARTIELLE
+            ),
+        ))
+        lignes_par_vente.append(lignes)
+    # Ids croissants avec le temps, comme pour des ventes saisies au fil de l'eau
+    ordre = sorted(range(nb_ventes), key=lambda i: ventes[i].date_vente)
+    ventes = Vente.objects.bulk_create([ventes[i] for i in ordre], batch_size=1000)
+    lignes_par_vente = [lignes_par_vente[i] for i in ordre]
+
+    LigneDeVente.objects.bulk_create([
+        LigneDeVente(vente=vente, produit=produit, quantite=quantite, prix_unitaire_vente=produit.prix_vente)
+        for vente, lignes in zip(ventes, lignes_par_vente)
+        for produit, quantite in lignes
+    ], batch_size=1000)
+
+    with _dates_libres(_champ(Paiement, 'date_paiement')):
+        paiements = Paiement.objects.bulk_create([
+            Paiement(
+                vente=vente, montant=vente.montant_encaisse, enregistre_par=vendeur,
+                mode=hasard.choice(['ESPECES', 'MOBILE']), date_paiement=vente.date_vente,
+            )
+            for vente in ventes
+            if vente.montant_encaisse
+        ], batch_size=1000)
+
+    with _dates_libres(_champ(MouvementStock, 'created_at')):
+        mouvements = MouvementStock.objects.bulk_create([
+            MouvementStock(
+                produit=produit, type_mouvement='SORTIE_VENTE', quantite=quantite,
+                utilisateur=vendeur, vente=vente, raison=f"Vente #{vente.pk}",
+                date_mouvement=vente.jour_vente, created_at=vente.date_vente,
+            )
+            for vente, lignes in zip(ventes, lignes_par_vente)
+            if vente.est_complete
+            for produit, quantite in lignes
+        ], batch_size=1000)
+    MouvementStock.recalculer_soldes([produit.pk for produit in produits])
+
+    prestations = []
+    for _ in range(nb_ventes):
+        personnel = hasard.choice(personnels)
+        service = hasard.choice(services)
+        date_prestation = instant()
+        prestations.append(Prestation(
+            personnel=personnel, secteur=personnel.secteur, service=service, montant_paye=service.prix,
+            date_prestation=date_prestation, jour_prestation=timezone.localdate(date_prestation),
+        ))
+    prestations.sort(key=lambda p: p.date_prestation)
+    prestations = Prestation.objects.bulk_create(prestations, batch_size=1000)
+
+    with _dates_libres(_champ(Commission, 'date_calcul')):
+        Commission.objects.bulk_create([
+            Commission(
+                prestation=p, personnel=p.personnel, montant=p.montant_paye * p.personnel.taux_commission,
+                date_calcul=p.jour_prestation,
+            )
+            for p in prestations
+        ], batch_size=1000)
+
+    with _dates_libres(_champ(Depense, 'date_depense')):
+        depenses = Depense.objects.bulk_create([
+            Depense(
+                entite=hasard.choice(['BOUTIQUE', 'SALON']), secteur=hasard.choice(['HOMME', 'FEMME']),
+                description=f'{PREFIXE}dépense', montant=Decimal(hasard.randrange(5, 50)),
+                date_depense=timezone.localdate(instant()),
+            )
+            for _ in range(max(nb_ventes // 10, 10))
+        ], batch_size=1000)
+
+    with _dates_libres(_champ(ConnexionHistorique, 'timestamp')):
+        # Journal en ajout seul : horodatages croissants, comme en production
+        debut = maintenant - timedelta(days=jours)
+        pas = timedelta(days=jours) / max(nb_ventes, 1)
+        evenements = [ConnexionHistorique.EVENT_LOGIN] * 6 + [ConnexionHistorique.EVENT_LOGOUT] * 3 + [
+            ConnexionHistorique.EVENT_FAILED
+        ]
+        connexions = ConnexionHistorique.objects.bulk_create([
+            ConnexionHistorique(user=vendeur, event=hasard.choice(evenements), timestamp=debut + pas * i)
+            for i in range(nb_ventes)
+        ], batch_size=1000)
+
+    if resumes:
+        call_command('reconstruire_resumes_ventes', stdout=StringIO())
+        call_command('reconstruire_resumes_salon', stdout=StringIO())
+
+    return {
+        'produits': len(produits),
+        'ventes': len(ventes),
+        'paiements': len(paiements),
+        'mouvements': len(mouvements),
+        'prestations': len(prestations),
+        'commissions': len(prestations),
+        'depenses': len(depenses),
+        'connexions': len(connexions),
+    }
@@ -0,0 +1,193 @@
+# core/kpis.py
+
+"""
+Indicateurs des dashboards boutique et salon, et budgets de dépenses du jour.
+
+Chaque table n'est lue qu'une fois : les différents chiffres d'un même
+tableau (jour, mois, secteur, seuil de stock…) sont obtenus par agrégation
+conditionnelle (`Sum(..., filter=Q(...))`) ou par regroupement, au lieu d'une
+requête par chiffre. Les dashboards passent par le cache (core.cache_kpi) ;
+les budgets, qui décident d'une écriture, relisent toujours la base.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+
+from boutique.models import Categorie, Produit, ResumeVentesJour, Vente
+from core import referentiel
+from core.cache_kpi import BOUTIQUE, SALON, kpis_en_cache
+from core.models import Depense
+from salon.models import PART_SALON, Personnel, ResumePrestationsJour
+
+ZERO = Decimal('0')
+
+VALEUR_STOCK = ExpressionWrapper(
+    F('prix_achat') * F('quantite_stock'),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+def depenses_du_jour(jour):
+    """Dépenses du jour : boutique, salon (total) et salon par secteur, en une requête."""
+    totaux = Depense.objects.filter(date_depense=jour).aggregate(
+        boutique=Sum('montant', filter=Q(entite='BOUTIQUE')),
+        salon=Sum('montant', filter=Q(entite='SALON')),
+        homme=Sum('montant', filter=Q(entite='SALON', secteur='HOMME')),
+        femme=Sum('montant', filter=Q(entite='SALON', secteur='FEMME')),
+    )
+    return {cle: total or ZERO for cle, total in totaux.items()}
+
+
+def _ventes(jour):
+    """Ventes du jour et du mois lues dans les résumés, en une requête."""
+    debut_mois = jour.replace(day=1)
+    du_jour = Q(jour=jour)
+    totaux = ResumeVentesJour.objects.aggregate(
+        ventes=Sum('nb_ventes', filter=du_jour),
+        ca=Sum('chiffre_affaires', filter=du_jour),
+        cout=Sum('cout_achat', filter=du_jour),
+        ca_mois=Sum('chiffre_affaires', filter=Q(jour__gte=debut_mois, jour__lt=debut_mois + relativedelta(months=1))),
+    )
+    totaux = {cle: total or ZERO for cle, total in totaux.items()}
+    totaux['ventes'] = int(totaux['ventes'])
+    return totaux
+
+
+def _dettes():
+    """
+    Reste à payer de toutes les ventes non soldées, finalisées ou non (comme
+    liste_dettes) ; l'index partiel vente_dette_date_idx ne couvre que celles-ci.
+    """
+    reste = ExpressionWrapper(
+        F('total') - F('montant_encaisse'), output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    return Vente.objects.filter(total__gt=F('montant_encaisse')).aggregate(reste=Sum(reste))['reste'] or ZERO
+
+
+def _stock():
+    """Valeur, nombre de produits et produits sous le seuil, par catégorie (une requête)."""
+    return list(
+        Produit.objects
+        .values('categorie')
+        .annotate(
+            valeur=Sum(VALEUR_STOCK),
+            nb=Count('pk'),
+            faibles=Count('pk', filter=Q(quantite_stock__lte=F('seuil_stock_bas'))),
+        )
+        .order_by()
+    )
+
+
+def calculer_kpis_boutique(jour):
+    """Indicateurs du dashboard boutique, en cinq requêtes quel que soit le volume."""
+    ventes = _ventes(jour)
+    depenses = depenses_du_jour(jour)['boutique']
+    stock = _stock()
+    valeur_par_categorie = {ligne['categorie']: ligne['valeur'] for ligne in stock}
+    top_produits = list(Produit.objects.annotate(valeur_stock=VALEUR_STOCK).order_by('-valeur_stock')[:5])
+
+    marge_brute_jour = ventes['ca'] - ventes['cout']
+    return {
+        # résumé financier
+        'recette_brute_jour': ventes['ca'],
+        'cout_approvisionnement_jour': ventes['cout'],
+        'marge_brute_jour': marge_brute_jour,
+        'depenses_boutique_jour': depenses,
+        'revenu_net_jour': marge_brute_jour - depenses,
+        'dettes_totales': _dettes(),
+
+        # stats stock & ventes
+        'total_approvisionnement': sum((ligne['valeur'] or ZERO for ligne in stock), ZERO),
+        'categories': [
+            {'nom': categorie.nom, 'valeur_stock': valeur_par_categorie.get(categorie.pk)}
+            for categorie in referentiel.liste(Categorie)
+        ],
+        'top_produits': top_produits,
+        'total_produits': sum(ligne['nb'] for ligne in stock),
+        'ventes_jour': ventes['ventes'],
+        'stock_faible': sum(ligne['faibles'] for ligne in stock),
+        'revenus_mois': ventes['ca_mois'],
+    }
+
+
+def calculer_kpis_salon(jour):
+    """Indicateurs du dashboard salon (jour et veille, par secteur), en deux requêtes."""
+    veille = jour - timedelta(days=1)
+    resumes = {
+        (r['jour'], r['secteur__nom']): r
+        for r in ResumePrestationsJour.objects
+        .filter(jour__in=[jour, veille])
+        .values('jour', 'secteur__nom')
+        .annotate(nb=Sum('nb_prestations'), brut=Sum('montant_paye'), commissions=Sum('commissions'))
+    }
+
+    def resume(quand, secteur, champ):
+        return resumes.get((quand, secteur), {}).get(champ) or 0
+
+    # Part salon du chiffre d'affaires, aujourd'hui et hier (pour le %)
+    revenus_jour = (resume(jour, 'HOMME', 'brut') + resume(jour, 'FEMME', 'brut')) * PART_SALON
+    revenus_hier = (resume(veille, 'HOMME', 'brut') + resume(veille, 'FEMME', 'brut')) * PART_SALON
+    pct_ca = (revenus_jour - revenus_hier) / revenus_hier * 100 if revenus_hier > 0 else None
+
+    prestations_homme = resume(jour, 'HOMME', 'nb')
+    prestations_femme = resume(jour, 'FEMME', 'nb')
+    return {
+        # CA salon
+        'revenus_jour': revenus_jour,
+        'pct_ca': pct_ca,
+
+        # Stats globales
+        'total_personnel': len(referentiel.liste(Personnel)),
+        'total_prestations_jour': prestations_homme + prestations_femme,
+
+        # Commissions
+        'prestations_homme': prestations_homme,
+        'commissions_homme': resume(jour, 'HOMME', 'commissions') or ZERO,
+        'prestations_femme': prestations_femme,
+        'commissions_femme': resume(jour, 'FEMME', 'commissions') or ZERO,
+
+        # Dépenses salon
+        'depenses_salon_jour': depenses_du_jour(jour)['salon'],
+    }
+
+
+def kpis_boutique(jour):
+    return kpis_en_cache(BOUTIQUE, jour, lambda: calculer_kpis_boutique(jour))
+
+
+def kpis_salon(jour):
+    return kpis_en_cache(SALON, jour, lambda: calculer_kpis_salon(jour))
+
+
+def budget_boutique(jour):
+    """Recette brute du jour, dépenses boutique déjà faites et reste autorisé."""
+    recette = ResumeVentesJour.objects.filter(jour=jour).aggregate(total=Sum('chiffre_affaires'))['total'] or ZERO
+    depenses = depenses_du_jour(jour)['boutique']
+    return {
+        'recette_brute_jour': recette,
+        'depenses_du_jour': depenses,
+        'reste_autorise': recette - depenses,
+    }
+
+
+def budget_salon(jour):
+    """Par secteur : CA brut du jour, part salon disponible, dépenses faites et reste autorisé."""
+    brut = ResumePrestationsJour.objects.filter(jour=jour).aggregate(
+        homme=Sum('montant_paye', filter=Q(secteur__nom='HOMME')),
+        femme=Sum('montant_paye', filter=Q(secteur__nom='FEMME')),
+    )
+    depenses = depenses_du_jour(jour)
+    budget = {}
+    for secteur, suffixe in (('homme', 'h'), ('femme', 'f')):
+        brut_secteur = brut[secteur] or ZERO
+        dispo = brut_secteur * PART_SALON
+        budget.update({
+            f'brut_{secteur}': brut_secteur,
+            f'dispo_{secteur}': dispo,
+            f'dep_{suffixe}': depenses[secteur],
+            f'reste_{suffixe}': dispo - depenses[secteur],
+        })
+    return budget
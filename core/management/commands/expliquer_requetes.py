@@ -0,0 +1,138 @@
+# core/management/commands/expliquer_requetes.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from boutique.models import MouvementStock, Produit, Vente
+from core.dates import bornes_jour
+from core.jeu_essai import generer_jeu_essai
+from core.models import ConnexionHistorique, Depense
+from core.pagination import TAILLE_PAGE
+from salon.models import Commission, Prestation, Secteur
+
+PAGE = TAILLE_PAGE + 1
+
+
+def requetes_surveillees():
+    """
+    Requêtes principales des vues, avec l'index qu'elles doivent utiliser.
+
+    Chaque entrée : (libellé, queryset, index acceptés, PostgreSQL uniquement).
+    """
+    aujourd_hui = timezone.localdate()
+    debut, fin = bornes_jour(aujourd_hui)
+    debut_mois = aujourd_hui.replace(day=1)
+    produit = Produit.objects.order_by('pk').first()
+    secteur = Secteur.objects.order_by('pk').first()
+
+    return [
+        ("produit_autocomplete (préfixe)",
+         Produit.objects.filter(nom_recherche__startswith='essai-produit 12'),
+         ('produit_nom_recherche_idx',), True),
+        ("produit_autocomplete (intérieur du nom)",
+         Produit.objects.filter(nom_recherche__contains='produit 12'),
+         ('produit_nom_trgm',), True),
+        ("liste_ventes", Vente.objects.order_by('-date_vente', '-pk')[:PAGE],
+         ('vente_date_id_idx',), False),
+        ("ventes_journaliere", Vente.objects.filter(jour_vente=aujourd_hui, est_complete=True),
+         ('boutique_vente_jour_vente',), False),
+        ("ventes finalisées d'une période",
+         Vente.objects.filter(est_complete=True, date_vente__gte=debut, date_vente__lt=fin),
+         ('vente_complete_date_idx', 'vente_date_id_idx'), False),
+        ("liste_dettes",
+         Vente.objects.filter(total__gt=F('montant_encaisse')).order_by('-date_vente', '-pk')[:PAGE],
+         ('vente_dette_date_idx',), False),
+        ("historique_mouvements", MouvementStock.objects.order_by('-date_mouvement', '-pk')[:PAGE],
+         ('mouvement_date_id_idx',), False),
+        ("historique_mouvements (produit)",
+         MouvementStock.objects.filter(produit=produit).order_by('-date_mouvement', '-pk')[:PAGE],
+         ('mouvement_produit_date_idx', 'boutique_mouvementstock_produit_id'), False),
+        ("mouvements d'une période (audit)",
+         MouvementStock.objects.filter(created_at__gte=debut, created_at__lt=fin),
+         ('mouvement_created_brin',), True),
+        ("liste_prestations", Prestation.objects.order_by('-date_prestation', '-pk')[:PAGE],
+         ('prestation_date_id_idx',), False),
+        ("liste_prestations (jour)", Prestation.objects.filter(jour_prestation=aujourd_hui),
+         ('salon_prestation_jour_prestation',), False),
+        ("résumé salon (secteur, jour)",
+         Prestation.objects.filter(secteur=secteur, date_prestation__gte=debut, date_prestation__lt=fin),
+         ('prestation_secteur_date_idx',), False),
+        ("commissions du mois",
+         Commission.objects.filter(date_calcul__gte=debut_mois, date_calcul__lte=aujourd_hui)
+         .values('personnel').annotate(total=Sum('montant')),
+         ('commission_date_personnel_idx',), False),
+        ("liste_depenses_boutique",
+         Depense.objects.filter(entite='BOUTIQUE').order_by('-date_depense', '-pk')[:PAGE],
+         ('depense_entite_date_idx',), False),
+        ("dépenses salon du jour par secteur",
+         Depense.objects.filter(entite='SALON', secteur='HOMME', date_depense=aujourd_hui),
+         ('depense_entite_secteur_idx', 'depense_entite_date_idx'), False),
+        ("connexions des dernières 24 h",
+         ConnexionHistorique.objects.filter(timestamp__gte=timezone.now() - timedelta(days=1)),
+         ('connexion_timestamp_brin',), True),
+    ]
+
+
+def index_existants():
+    """Noms des index présents en base (l'index trigramme dépend de l'extension pg_trgm)."""
+    with connection.cursor() as curseur:
+        return {
+            nom
+            for table in connection.introspection.table_names(curseur)
+            for nom, contrainte in connection.introspection.get_constraints(curseur, table).items()
+            if contrainte['index']
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Capture le plan EXPLAIN des requêtes principales des vues et vérifie "
+        "qu'elles s'appuient sur les index prévus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jeu-essai', type=int, default=0, metavar='NB_VENTES',
+            help="Génère d'abord un jeu de données de cette taille (annulé en fin de commande)",
+        )
+        parser.add_argument('--plans', action='store_true', help="Affiche le plan complet de chaque requête")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['jeu_essai']:
+                volumes = generer_jeu_essai(options['jeu_essai'])
+                self.stdout.write("Jeu d'essai : " + ", ".join(f"{n} {m}" for m, n in volumes.items()))
+                # Statistiques à jour pour que le planificateur voie les volumes réels
+                with connection.cursor() as curseur:
+                    curseur.execute('ANALYZE')
+            echecs = self._verifier(options['plans'])
+            transaction.set_rollback(True)
+
+        if echecs:
+            raise CommandError(f"Index non utilisé pour : {', '.join(echecs)}")
+        self.stdout.write(self.style.SUCCESS("Toutes les requêtes surveillées utilisent leur index."))
+
+    def _verifier(self, afficher_plans):
+        echecs = []
+        existants = index_existants()
+        for libelle, queryset, index, postgres_seulement in requetes_surveillees():
+            if postgres_seulement and connection.vendor != 'postgresql':
+                self.stdout.write(f"  --  {libelle} (PostgreSQL uniquement)")
+                continue
+            if postgres_seulement and not existants.intersection(index):
+                self.stdout.write(f"  --  {libelle} (index absent : extension non installée)")
+                continue
+            plan = queryset.explain()
+            utilise = next((nom for nom in index if nom in plan), None)
+            if utilise:
+                self.stdout.write(f"  OK  {libelle} → {utilise}")
+            else:
+                echecs.append(libelle)
+                self.stdout.write(self.style.ERROR(f"  KO  {libelle} (attendu : {' ou '.join(index)})"))
+            if afficher_plans or not utilise:
+                self.stdout.write("      " + plan.replace("\n", "\n      "))
+        return echecs
@@ -0,0 +1,43 @@
+# core/management/commands/generer_jeu_essai.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.jeu_essai import generer_jeu_essai
+
+
+class Command(BaseCommand):
+    help = (
+        "Remplit la base avec un jeu de données synthétique réaliste (catalogue, ventes, "
+        "paiements, stock, personnel, prestations, dépenses, connexions) pour les mesures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventes', type=int, default=1000, help="Nombre de ventes (et de prestations)")
+        parser.add_argument('--produits', type=int, default=None, help="Nombre de produits (défaut : ventes / 5)")
+        parser.add_argument('--categories', type=int, default=5, help="Nombre de catégories")
+        parser.add_argument('--personnel', type=int, default=10, help="Nombre de membres du personnel")
+        parser.add_argument('--jours', type=int, default=3 * 365, help="Période couverte, en jours avant aujourd'hui")
+        parser.add_argument('--graine', type=int, default=0, help="Graine du générateur aléatoire")
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Autorise la génération quand DEBUG est désactivé (base de production ?)",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG est désactivé : relancer avec --force pour remplir cette base.")
+
+        with transaction.atomic():
+            volumes = generer_jeu_essai(
+                options['ventes'],
+                jours=options['jours'],
+                graine=options['graine'],
+                nb_produits=options['produits'],
+                nb_categories=options['categories'],
+                nb_personnel=options['personnel'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            "Jeu d'essai créé : " + ", ".join(f"{n} {modele}" for modele, n in volumes.items())
+        ))
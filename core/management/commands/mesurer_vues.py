@@ -0,0 +1,172 @@
+# core/management/commands/mesurer_vues.py
+
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import URLPattern, reverse
+
+import boutique.urls
+import core.urls
+import salon.urls
+from boutique.models import Inventaire, Produit, Vente
+from core.instrumentation import MesureSQL, centile
+from core.jeu_essai import PREFIXE, generer_jeu_essai
+from core.models import ProfilUtilisateur
+from salon.models import Personnel
+
+# Module d'URLs -> rôle de l'utilisateur qui les parcourt
+MODULES = [(core.urls, 'ADMIN'), (boutique.urls, 'ADMIN'), (salon.urls, 'GESTIONNAIRE_SALON')]
+
+# Vues qui terminent la session : non mesurées
+EXCLUES = {'logout', 'deconnexion'}
+
+# Vues à paramètre : modèle dont on prend la première ligne
+OBJETS = {
+    'modifier_produit': Produit,
+    'supprimer_produit': Produit,
+    'detail_vente': Vente,
+    'ajouter_paiement': Vente,
+    'detail_inventaire': Inventaire,
+    'saisie_inventaire': Inventaire,
+    'cloturer_inventaire': Inventaire,
+    'modifier_personnel': Personnel,
+    'supprimer_personnel': Personnel,
+}
+
+REFERENCE_PAR_DEFAUT = Path(settings.BASE_DIR) / 'mesures_vues.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Appelle chaque URL de core, boutique et salon avec le client de test et mesure "
+        "la latence (p50 / p95) et le nombre de requêtes SQL, comparés à une référence."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jeu-essai', type=int, default=0, metavar='NB_VENTES',
+            help="Génère d'abord un jeu de données de cette taille (annulé en fin de commande)",
+        )
+        parser.add_argument('--repetitions', type=int, default=20, help="Appels mesurés par URL")
+        parser.add_argument(
+            '--reference', default=str(REFERENCE_PAR_DEFAUT),
+            help="Fichier JSON des mesures de référence",
+        )
+        parser.add_argument('--enregistrer', action='store_true', help="Enregistre ces mesures comme référence")
+        parser.add_argument(
+            '--tolerance', type=float, default=25,
+            help="Hausse du p95 tolérée par rapport à la référence, en %%",
+        )
+        parser.add_argument(
+            '--marge-ms', type=float, default=5,
+            help="Hausse du p95 toujours tolérée, en ms (bruit de mesure des vues rapides)",
+        )
+
+    def handle(self, *args, **options):
+        # Tout est annulé en fin de commande : jeu d'essai, utilisateurs, sessions
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*']):
+            if options['jeu_essai']:
+                volumes = generer_jeu_essai(options['jeu_essai'])
+                self.stdout.write("Jeu d'essai : " + ", ".join(f"{n} {m}" for m, n in volumes.items()))
+            mesures = self._mesurer(options['repetitions'])
+            transaction.set_rollback(True)
+
+        reference_path = Path(options['reference'])
+        reference = json.loads(reference_path.read_text()) if reference_path.exists() else {}
+        regressions = self._afficher(mesures, reference, options['tolerance'], options['marge_ms'])
+
+        if options['enregistrer']:
+            reference_path.write_text(json.dumps(mesures, indent=2, ensure_ascii=False))
+            self.stdout.write(self.style.SUCCESS(f"Référence enregistrée dans {reference_path}"))
+        elif regressions:
+            raise CommandError(f"Régressions par rapport à la référence : {', '.join(regressions)}")
+
+    def _clients(self):
+        clients = {}
+        for role in {role for _, role in MODULES}:
+            user, _ = User.objects.get_or_create(
+                username=f'{PREFIXE}{role.lower()}', defaults={'is_superuser': role == 'ADMIN', 'is_staff': True},
+            )
+            ProfilUtilisateur.objects.update_or_create(user=user, defaults={'role': role})
+            # Une vue en erreur est mesurée avec son statut 500 au lieu d'arrêter la commande
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            clients[role] = client
+        return clients
+
+    def _urls(self):
+        """(nom, url, paramètres GET, rôle) de chaque vue mesurable."""
+        produit = Produit.objects.exclude(reference=None).order_by('pk').first()
+        parametres = {
+            'produit_autocomplete': {'q': PREFIXE},
+            'produit_par_reference': {'code': produit.reference if produit else ''},
+        }
+        for module, role in MODULES:
+            for motif in module.urlpatterns:
+                if not isinstance(motif, URLPattern) or not motif.name or motif.name in EXCLUES:
+                    continue
+                arguments = self._arguments(motif)
+                if arguments is None:
+                    self.stdout.write(f"  --  {motif.name} (aucune donnée pour ses paramètres)")
+                    continue
+                yield motif.name, reverse(motif.name, kwargs=arguments), parametres.get(motif.name, {}), role
+
+    def _arguments(self, motif):
+        """Paramètres d'URL de `motif` (pk de la première ligne du modèle), None si impossible."""
+        if not motif.pattern.converters:
+            return {}
+        modele = OBJETS.get(motif.name)
+        objet = modele.objects.order_by('pk').first() if modele else None
+        if objet is None:
+            return None
+        return {nom: objet.pk for nom in motif.pattern.converters}
+
+    def _mesurer(self, repetitions):
+        clients = self._clients()
+        mesures = {}
+        for nom, url, parametres, role in self._urls():
+            client = clients[role]
+            client.get(url, parametres, secure=True)  # chauffe : caches et référentiels
+            durees, requetes = [], []
+            for _ in range(repetitions):
+                mesure = MesureSQL()
+                debut = time.perf_counter()
+                with mesure.activer():
+                    reponse = client.get(url, parametres, secure=True)
+                durees.append((time.perf_counter() - debut) * 1000)
+                requetes.append(mesure.nombre)
+            mesures[nom] = {
+                'url': url,
+                'statut': reponse.status_code,
+                'p50_ms': round(centile(durees, 50), 1),
+                'p95_ms': round(centile(durees, 95), 1),
+                'requetes': max(requetes),
+            }
+        return mesures
+
+    def _afficher(self, mesures, reference, tolerance, marge_ms):
+        regressions = []
+        self.stdout.write(f"{'vue':32} {'statut':>6} {'p50 ms':>8} {'p95 ms':>8} {'SQL':>5}  référence")
+        for nom, mesure in mesures.items():
+            ligne = (
+                f"{nom:32} {mesure['statut']:>6} {mesure['p50_ms']:>8} {mesure['p95_ms']:>8} "
+                f"{mesure['requetes']:>5}"
+            )
+            ancienne = reference.get(nom)
+            if ancienne is None:
+                self.stdout.write(ligne)
+                continue
+            ligne += f"  p95 {ancienne['p95_ms']} ms, {ancienne['requetes']} SQL"
+            p95_max = max(ancienne['p95_ms'] * (1 + tolerance / 100), ancienne['p95_ms'] + marge_ms)
+            if mesure['requetes'] > ancienne['requetes'] or mesure['p95_ms'] > p95_max:
+                regressions.append(nom)
+                self.stdout.write(self.style.ERROR(ligne))
+            else:
+                self.stdout.write(ligne)
+        return regressions
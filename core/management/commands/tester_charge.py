@@ -0,0 +1,124 @@
+# core/management/commands/tester_charge.py
+
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from boutique.models import Produit
+from core.charge import SCENARIOS, lancer
+from core.models import ProfilUtilisateur
+from salon.models import Personnel, Service
+
+# Produits les plus vendus proposés aux caissiers virtuels
+NB_PRODUITS = 200
+
+
+class Command(BaseCommand):
+    help = (
+        "Simule l'heure de pointe contre un serveur déjà lancé (runserver, gunicorn) : "
+        "caissiers (vente + autocomplétion), gérants (dashboards), coiffeurs (prestations). "
+        "Affiche débit, taux d'erreur (conflits de stock compris) et latences par scénario."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/', help="Adresse du serveur testé")
+        parser.add_argument('--duree', type=float, default=60, help="Durée de la charge, en secondes")
+        parser.add_argument('--montee', type=float, default=5, help="Étalement des départs, en secondes")
+        parser.add_argument('--pause', type=float, default=1.0, help="Temps de réflexion moyen entre actions (s)")
+        parser.add_argument('--caissiers', type=int, default=4)
+        parser.add_argument('--gerants-boutique', type=int, default=1)
+        parser.add_argument('--gerants-salon', type=int, default=1)
+        parser.add_argument('--coiffeurs', type=int, default=2)
+        parser.add_argument('--mot-de-passe', default='charge-philia', help="Mot de passe des comptes de test")
+        parser.add_argument(
+            '--https', action='store_true',
+            help="Serveur avec DEBUG désactivé : requêtes marquées HTTPS (X-Forwarded-Proto)",
+        )
+        parser.add_argument('--graine', type=int, default=0, help="Graine du générateur aléatoire")
+        parser.add_argument('--json', help="Écrit aussi le rapport dans ce fichier JSON")
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Autorise la création des comptes de test quand DEBUG est désactivé",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG est désactivé : relancer avec --force pour créer les comptes de test.")
+
+        contexte = self._contexte()
+        utilisateurs = self._comptes(options)
+        self.stdout.write(
+            f"{len(utilisateurs)} utilisateurs virtuels sur {options['url']} pendant {options['duree']:g} s..."
+        )
+        lignes, refuses = lancer(
+            options['url'], utilisateurs, contexte, options['duree'],
+            montee=options['montee'], pause=options['pause'], https=options['https'], graine=options['graine'],
+        )
+        if len(refuses) == len(utilisateurs):
+            raise CommandError(f"Aucune connexion n'a abouti sur {options['url']} (serveur lancé ? même base ?)")
+        if refuses:
+            self.stdout.write(self.style.WARNING(f"Connexions refusées : {', '.join(refuses)}"))
+
+        self._afficher(lignes)
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(lignes, indent=2, ensure_ascii=False))
+
+    def _contexte(self):
+        """URLs et données que les utilisateurs virtuels saisissent (lues dans la base du serveur)."""
+        produits = list(
+            Produit.objects.filter(quantite_stock__gt=0)
+            .order_by('-frequence_ventes', 'pk')
+            .values('id', 'nom')[:NB_PRODUITS]
+        )
+        personnel = list(Personnel.objects.values('id', 'secteur_id'))
+        services = [{'id': s['id'], 'prix': str(s['prix'])} for s in Service.objects.values('id', 'prix')]
+        if not (produits and personnel and services):
+            raise CommandError(
+                "Il faut des produits en stock, du personnel et des services : lancer d'abord generer_jeu_essai."
+            )
+        noms = ('connexion', 'creer_vente', 'produit_autocomplete', 'dashboard', 'dashboard_salon', 'ajouter_prestation')
+        return {
+            'urls': {nom: reverse(nom) for nom in noms},
+            'produits': produits,
+            'personnel': personnel,
+            'services': services,
+        }
+
+    def _comptes(self, options):
+        """(scénario, username, mot de passe) de chaque utilisateur virtuel, comptes créés au besoin."""
+        nombres = {
+            'caissier': options['caissiers'],
+            'gerant_boutique': options['gerants_boutique'],
+            'gerant_salon': options['gerants_salon'],
+            'coiffeur': options['coiffeurs'],
+        }
+        utilisateurs = []
+        for scenario, nombre in nombres.items():
+            for i in range(nombre):
+                user, _ = User.objects.get_or_create(username=f'charge-{scenario}-{i}')
+                user.set_password(options['mot_de_passe'])
+                user.save()
+                ProfilUtilisateur.objects.update_or_create(user=user, defaults={'role': SCENARIOS[scenario].role})
+                utilisateurs.append((scenario, user.username, options['mot_de_passe']))
+        return utilisateurs
+
+    def _afficher(self, lignes):
+        self.stdout.write(
+            f"{'scénario':16} {'action':22} {'requêtes':>8} {'req/s':>7} {'err %':>6} {'conflits':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        for ligne in lignes:
+            texte = (
+                f"{ligne['scenario']:16} {ligne['action']:22} {ligne['requetes']:>8} {ligne['debit']:>7} "
+                f"{ligne['erreurs_pct']:>6} {ligne['conflits']:>8} "
+                f"{ligne['p50_ms']:>8} {ligne['p95_ms']:>8} {ligne['p99_ms']:>8}"
+            )
+            if ligne['action'] == 'total':
+                texte = self.style.MIGRATE_HEADING(texte)
+            elif ligne['erreurs_pct']:
+                texte = self.style.WARNING(texte)
+            self.stdout.write(texte)
@@ -0,0 +1,59 @@
+# core/metriques.py
+
+"""
+Métriques Prometheus de l'application (latence par vue, requêtes SQL, cache,
+activité commerciale, alertes de stock), exposées par la vue `metriques`.
+
+Avec gunicorn, définir PROMETHEUS_MULTIPROC_DIR (répertoire vide, partagé par
+les workers, vidé à chaque démarrage) : chaque worker y écrit ses valeurs et
+l'endpoint agrège tous les workers, quel que soit celui qui répond.
+"""
+
+import os
+
+from django.db import transaction
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+DUREE_REQUETE = Histogram(
+    'philia_requete_duree_secondes', "Durée de traitement des requêtes HTTP, par vue.",
+    ['vue', 'methode'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+SQL_PAR_REQUETE = Histogram(
+    'philia_requete_sql_nombre', "Nombre de requêtes SQL par requête HTTP, par vue.",
+    ['vue'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DUREE_SQL = Counter(
+    'philia_requete_sql_duree_secondes', "Temps passé en base par les requêtes HTTP, par vue.",
+    ['vue'],
+)
+ACCES_CACHE = Counter(
+    'philia_cache_acces', "Lectures des caches applicatifs (hit / miss).",
+    ['cache', 'resultat'],
+)
+VENTES_FINALISEES = Counter('philia_ventes_finalisees', "Ventes finalisées.")
+PAIEMENTS = Counter('philia_paiements', "Paiements enregistrés.")
+PRESTATIONS = Counter('philia_prestations', "Prestations enregistrées.")
+ALERTES_STOCK = Counter('philia_alertes_stock', "Produits passés sous leur seuil de stock.")
+
+
+def acces_cache(cache, trouve):
+    ACCES_CACHE.labels(cache, 'hit' if trouve else 'miss').inc()
+
+
+def compter_apres_commit(compteur):
+    """Incrémente `compteur` une fois la transaction validée (rien en cas de rollback)."""
+    transaction.on_commit(compteur.inc)
+
+
+def exposer():
+    """(contenu, type MIME) au format texte Prometheus, agrégé sur tous les workers."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registre = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registre)
+    else:
+        registre = REGISTRY
+    return generate_latest(registre), CONTENT_TYPE_LATEST
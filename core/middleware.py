@@ -0,0 +1,250 @@
+# core/middleware.py
+
+import json
+import logging
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import SimpleLazyObject
+
+from core import metriques
+from core.instrumentation import MesureSQL, empreinte, normaliser_sql
+from core.models import ProfilUtilisateur, RequeteLente
+
+logger = logging.getLogger('core.instrumentation')
+logger_lentes = logging.getLogger('core.requetes_lentes')
+
+CLE_SESSION_PROFIL = '_profil'
+CLE_VERSION_GLOBALE = 'profil:version'
+
+# Au-delà (secondes), le profil en session est relu même si aucune version n'a
+# changé : borne l'effet d'une invalidation manquée (clé évincée du cache)
+AGE_MAX_PROFIL = 300
+
+
+def _cle_version(user_id):
+    return f'profil:version:{user_id}'
+
+
+def invalider_profil(user_id=None):
+    """
+    Force le rechargement du profil en session : d'un utilisateur (rôle ou
+    groupes modifiés) ou de tous (permissions d'un groupe modifiées). Les
+    versions sont dans le cache par défaut, partagé par les workers.
+    """
+    cle = _cle_version(user_id) if user_id is not None else CLE_VERSION_GLOBALE
+    cache.set(cle, uuid.uuid4().hex, None)
+
+
+def _versions(user_id):
+    cles = [CLE_VERSION_GLOBALE, _cle_version(user_id)]
+    versions = cache.get_many(cles)
+    for cle in cles:
+        if cle not in versions:
+            cache.add(cle, uuid.uuid4().hex, None)
+            versions[cle] = cache.get(cle)
+    return [versions[cle] for cle in cles]
+
+
+class ProfilCourant:
+    """
+    Rôle et permissions de groupe de l'utilisateur connecté, lus une fois par
+    session. `role` vaut None pour un visiteur anonyme ou sans profil.
+    """
+
+    def __init__(self, user_id, role, permissions):
+        self.user_id = user_id
+        self.role = role
+        self.permissions = frozenset(permissions)
+
+    def a_role(self, *roles):
+        return self.role in roles
+
+    def get_role_display(self):
+        return dict(ProfilUtilisateur.ROLE_CHOICES).get(self.role, self.role)
+
+    @classmethod
+    def charger(cls, user_id):
+        """
+        Profil et permissions des groupes en une seule requête. Lue depuis
+        l'utilisateur : sans ligne de profil (rôle None), ses groupes comptent.
+        """
+        lignes = list(
+            User.objects
+            .filter(pk=user_id)
+            .values_list(
+                'profilutilisateur__role',
+                'groups__permissions__content_type__app_label',
+                'groups__permissions__codename',
+            )
+        )
+        role = lignes[0][0] if lignes else None
+        return cls(user_id, role, {f'{app}.{code}' for _, app, code in lignes if code})
+
+
+def _profil_de_la_requete(request):
+    user = request.user
+    if not user.is_authenticated:
+        return ProfilCourant(None, None, ())
+
+    versions = _versions(user.pk)
+    maintenant = time.time()
+    en_session = request.session.get(CLE_SESSION_PROFIL)
+    valide = (
+        bool(en_session)
+        and en_session['user_id'] == user.pk
+        and en_session['versions'] == versions
+        and 0 <= maintenant - en_session.get('charge_le', 0) < AGE_MAX_PROFIL
+    )
+    metriques.acces_cache('profil', valide)
+    if valide:
+        profil = ProfilCourant(user.pk, en_session['role'], en_session['permissions'])
+    else:
+        profil = ProfilCourant.charger(user.pk)
+        request.session[CLE_SESSION_PROFIL] = {
+            'user_id': user.pk,
+            'versions': versions,
+            'charge_le': maintenant,
+            'role': profil.role,
+            'permissions': sorted(profil.permissions),
+        }
+
+    if not user.is_superuser:
+        # Évite à has_perm() / {{ perms }} de relire les permissions de groupe
+        user._group_perm_cache = set(profil.permissions)
+    return profil
+
+
+class ProfilMiddleware:
+    """
+    Rend `request.profil` (ProfilCourant), résolu au premier accès puis
+    gardé en session : une page authentifiée ne coûte que la session et
+    l'utilisateur. À placer après AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profil = SimpleLazyObject(lambda: _profil_de_la_requete(request))
+        return self.get_response(request)
+
+
+class InstrumentationMiddleware:
+    """
+    Mesure une fraction des requêtes (INSTRUMENTATION_ECHANTILLON, entre 0 et 1) :
+    vue, durée totale, nombre de requêtes SQL, durée SQL cumulée et requête la
+    plus lente. Le résultat part en ligne JSON sur le logger `core.instrumentation`
+    et, si INSTRUMENTATION_SERVER_TIMING, en en-tête Server-Timing.
+
+    Inactif sauf si INSTRUMENTATION=True. À placer en tête de MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ACTIVE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.INSTRUMENTATION_ECHANTILLON:
+            return self.get_response(request)
+
+        mesure = MesureSQL()
+        debut = time.perf_counter()
+        with mesure.activer():
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+
+        duree_max, sql_max = mesure.plus_lente[:2] if mesure.plus_lente else (0.0, None)
+        resolver_match = getattr(request, 'resolver_match', None)
+        mesures = {
+            'vue': resolver_match.view_name if resolver_match else None,
+            'methode': request.method,
+            'chemin': request.path,
+            'statut': response.status_code,
+            'duree_ms': round(duree * 1000, 1),
+            'sql_nombre': mesure.nombre,
+            'sql_ms': round(mesure.duree * 1000, 1),
+            'sql_max_ms': round(duree_max * 1000, 1),
+            'sql_max': sql_max[:500] if sql_max else None,
+        }
+        logger.info(json.dumps(mesures, ensure_ascii=False), extra={'mesures': mesures})
+
+        if settings.INSTRUMENTATION_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'total;dur={mesures["duree_ms"]}, '
+                f'sql;dur={mesures["sql_ms"]};desc="{mesure.nombre} requetes", '
+                f'sql-max;dur={mesures["sql_max_ms"]}'
+            )
+        return response
+
+
+class MetriquesMiddleware:
+    """
+    Alimente les histogrammes Prometheus (core.metriques) pour chaque requête :
+    durée et nombre / durée des requêtes SQL, par vue. Inactif sauf si
+    METRIQUES=True. À placer en tête de MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRIQUES_ACTIVES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mesure = MesureSQL()
+        debut = time.perf_counter()
+        with mesure.activer():
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+
+        # URL non résolue (404) : un seul libellé, pour borner le nombre de séries
+        resolver_match = getattr(request, 'resolver_match', None)
+        vue = resolver_match.view_name if resolver_match else 'non_resolue'
+        metriques.DUREE_REQUETE.labels(vue, request.method).observe(duree)
+        metriques.SQL_PAR_REQUETE.labels(vue).observe(mesure.nombre)
+        metriques.DUREE_SQL.labels(vue).inc(mesure.duree)
+        return response
+
+
+class RequetesLentesMiddleware:
+    """
+    Relève les requêtes SQL plus longues que REQUETES_LENTES_SEUIL_MS (0 : inactif).
+    Après la réponse, chacune part en ligne JSON sur `core.requetes_lentes` et est
+    comptée dans RequeteLente (admin), avec son plan EXPLAIN à la première occurrence.
+    """
+
+    def __init__(self, get_response):
+        if settings.REQUETES_LENTES_SEUIL_MS <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mesure = MesureSQL(seuil=settings.REQUETES_LENTES_SEUIL_MS / 1000)
+        with mesure.activer():
+            response = self.get_response(request)
+        if not mesure.lentes:
+            return response
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        vue = resolver_match.view_name if resolver_match else request.path
+        for duree, sql, params, alias in mesure.lentes:
+            # Le relevé ne doit jamais faire échouer une réponse déjà calculée
+            try:
+                duree_ms = round(duree * 1000, 1)
+                sql_normalise = normaliser_sql(sql)
+                logger_lentes.warning(json.dumps({
+                    'vue': vue,
+                    'duree_ms': duree_ms,
+                    'empreinte': empreinte(sql_normalise),
+                    'sql': sql_normalise[:1000],
+                }, ensure_ascii=False, default=str))
+                RequeteLente.enregistrer(sql, params, duree_ms, vue=vue, alias=alias)
+            except Exception:
+                logger_lentes.exception("Requête lente non enregistrée")
+        return response
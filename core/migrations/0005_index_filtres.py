@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+from core.operations import RunSQLPostgres
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_connexionhistorique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='depense',
+            index=models.Index(fields=['entite', 'date_depense', 'id'], name='depense_entite_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='depense',
+            index=models.Index(fields=['entite', 'secteur', 'date_depense'], name='depense_entite_secteur_idx'),
+        ),
+        # Journal de connexions en ajout seul : BRIN sur l'horodatage
+        RunSQLPostgres(
+            sql='CREATE INDEX IF NOT EXISTS connexion_timestamp_brin ON core_connexionhistorique USING brin ("timestamp");',
+            reverse_sql='DROP INDEX IF EXISTS connexion_timestamp_brin;',
+        ),
+    ]
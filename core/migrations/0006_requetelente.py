@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_index_filtres'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequeteLente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('empreinte', models.CharField(max_length=40, unique=True)),
+                ('sql', models.TextField()),
+                ('plan', models.TextField(blank=True)),
+                ('vue', models.CharField(blank=True, help_text='Vue de la dernière occurrence', max_length=200)),
+                ('empreinte_parametres', models.CharField(blank=True, help_text='Paramètres de la dernière occurrence', max_length=40)),
+                ('occurrences', models.PositiveIntegerField(default=1)),
+                ('duree_totale_ms', models.FloatField(default=0)),
+                ('duree_max_ms', models.FloatField(default=0)),
+                ('premiere_occurrence', models.DateTimeField(auto_now_add=True)),
+                ('derniere_occurrence', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Requête lente',
+                'verbose_name_plural': 'Requêtes lentes',
+                'ordering': ['-duree_totale_ms'],
+            },
+        ),
+    ]
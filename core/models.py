@@ -1,7 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 from django.conf import settings
+from django.utils import timezone
+
+from core.instrumentation import empreinte, expliquer, normaliser_sql
 
 
 
@@ -35,6 +40,12 @@ class Depense(models.Model):
     date_depense = models.DateField(auto_now_add=True)
     justificatif = models.FileField(upload_to='justificatifs/', blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['entite', 'date_depense', 'id'], name='depense_entite_date_idx'),
+            models.Index(fields=['entite', 'secteur', 'date_depense'], name='depense_entite_secteur_idx'),
+        ]
+
     def __str__(self):
         return f"Dépense ({self.entite}): {self.description} - {self.montant} $"
     
@@ -66,3 +77,99 @@ class ConnexionHistorique(models.Model):
     def __str__(self):
         user_repr = self.user.username if self.user else "Inconnu"
         return f"{user_repr} {self.get_event_display()} à {self.timestamp}"
+
+
+
+class RequeteLente(models.Model):
+    """
+    Requête SQL ayant dépassé REQUETES_LENTES_SEUIL_MS, regroupée par empreinte
+    du SQL normalisé (valeurs retirées) : une ligne par forme de requête, avec
+    son nombre d'occurrences et le plan capturé à la première occurrence.
+    """
+    empreinte = models.CharField(max_length=40, unique=True)
+    sql = models.TextField()
+    plan = models.TextField(blank=True)
+    vue = models.CharField(max_length=200, blank=True, help_text="Vue de la dernière occurrence")
+    empreinte_parametres = models.CharField(max_length=40, blank=True, help_text="Paramètres de la dernière occurrence")
+    occurrences = models.PositiveIntegerField(default=1)
+    duree_totale_ms = models.FloatField(default=0)
+    duree_max_ms = models.FloatField(default=0)
+    premiere_occurrence = models.DateTimeField(auto_now_add=True)
+    derniere_occurrence = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Requête lente"
+        verbose_name_plural = "Requêtes lentes"
+        ordering = ['-duree_totale_ms']
+
+    def __str__(self):
+        return f"{self.sql[:80]} ({self.occurrences}×)"
+
+    @property
+    def duree_moyenne_ms(self):
+        return self.duree_totale_ms / self.occurrences if self.occurrences else 0
+
+    @classmethod
+    def enregistrer(cls, sql, params, duree_ms, vue='', alias='default'):
+        """Compte une occurrence de `sql` ; la première est enregistrée avec son plan EXPLAIN."""
+        sql_normalise = normaliser_sql(sql)
+        cle = empreinte(sql_normalise)
+        maintenant = timezone.now()
+        valeurs = {
+            'vue': vue or '',
+            'empreinte_parametres': empreinte(repr(params))[:12],
+            'derniere_occurrence': maintenant,
+        }
+        mise_a_jour = {
+            'occurrences': F('occurrences') + 1,
+            'duree_totale_ms': F('duree_totale_ms') + duree_ms,
+            'duree_max_ms': Greatest('duree_max_ms', Value(duree_ms)),
+            **valeurs,
+        }
+        if cls.objects.filter(empreinte=cle).update(**mise_a_jour):
+            return
+
+        try:
+            with transaction.atomic(using=alias):
+                plan = expliquer(alias, sql, params)
+        except Exception as erreur:
+            # Paramètres non rejouables (types adaptés par le driver) ou base indisponible
+            plan = f"EXPLAIN impossible : {erreur}"
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    empreinte=cle, sql=sql_normalise, plan=plan,
+                    duree_totale_ms=duree_ms, duree_max_ms=duree_ms, **valeurs,
+                )
+        except IntegrityError:
+            # Un autre worker vient de créer la ligne : on compte sur la sienne
+            cls.objects.filter(empreinte=cle).update(**mise_a_jour)
+
+
+class ResumeJournalier(models.Model):
+    """
+    Base des tables de résumés pré-agrégés (une ligne par jour et par clé).
+
+    Les lignes sont maintenues au fil des écritures par cumuler(), qui ajoute des
+    deltas en un UPDATE atomique et ne crée la ligne qu'au premier passage.
+    """
+    jour = models.DateField()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def cumuler(cls, cles, **deltas):
+        """Ajoute `deltas` aux compteurs de la ligne identifiée par `cles` (créée au besoin)."""
+        deltas = {champ: valeur for champ, valeur in deltas.items() if valeur}
+        if not deltas:
+            return
+        increments = {champ: F(champ) + valeur for champ, valeur in deltas.items()}
+        if cls.objects.filter(**cles).update(**increments):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(**cles, **deltas)
+        except IntegrityError:
+            # Un autre worker vient de créer la ligne : on cumule sur la sienne
+            cls.objects.filter(**cles).update(**increments)
@@ -0,0 +1,65 @@
+# core/n_plus_un.py
+
+"""
+Détection des chargements paresseux en boucle (« N+1 »), pour les tests.
+
+Une relation non préchargée lue dans une boucle de template
+(`{{ ligne.produit.nom }}`), dans un `__str__` ou dans une boucle Python
+exécute la même requête une fois par ligne : seule la valeur de la clé
+change. DetecteurNPlusUn regroupe les requêtes par forme normalisée
+(core.instrumentation.normaliser_sql) et signale les formes répétées.
+"""
+
+from collections import Counter
+
+from core.instrumentation import MesureSQL, normaliser_sql
+
+# Au-delà de ce nombre d'exécutions d'une même forme, on est dans une boucle
+REPETITIONS_MAX = 2
+
+
+class DetecteurNPlusUn(MesureSQL):
+    """MesureSQL qui compte aussi les exécutions de chaque forme de requête."""
+
+    def __init__(self, repetitions_max=REPETITIONS_MAX):
+        super().__init__()
+        self.repetitions_max = repetitions_max
+        self.formes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.formes[normaliser_sql(sql)] += 1
+        return super().__call__(execute, sql, params, many, context)
+
+    def repetitions(self):
+        """{forme: nombre d'exécutions} des requêtes répétées plus de `repetitions_max` fois."""
+        return {sql: n for sql, n in self.formes.items() if n > self.repetitions_max}
+
+
+class RequetesVuesMixin:
+    """Pour les TestCase : nombre de requêtes d'une vue, en échec sur un N+1."""
+
+    def requetes_vue(self, url, **params):
+        """Nombre de requêtes d'un GET sur `url` (caches déjà chauds) ; échoue sur un N+1."""
+        self.client.get(url, params)  # chauffe : référentiels, profil de session
+        detecteur = DetecteurNPlusUn()
+        with detecteur.activer():
+            reponse = self.client.get(url, params)
+        self.assertEqual(reponse.status_code, 200)
+        repetees = detecteur.repetitions()
+        if repetees:
+            self.fail(f"Chargements en boucle sur {url} :\n" + "\n".join(
+                f"  {n} x {sql}" for sql, n in repetees.items()
+            ))
+        return detecteur.nombre
+
+    def assertRequetesParVolume(self, attendu, url, ajouter, tailles=(2, 12), **params):
+        """
+        `url` exécute `attendu` requêtes pour chaque volume de `tailles`,
+        `ajouter(n)` créant n lignes de plus entre deux mesures.
+        """
+        deja = 0
+        for taille in tailles:
+            ajouter(taille - deja)
+            deja = taille
+            with self.subTest(taille=taille):
+                self.assertEqual(self.requetes_vue(url, **params), attendu)
@@ -0,0 +1,23 @@
+# core/operations.py
+
+from django.db import migrations
+
+
+class RunSQLPostgres(migrations.RunSQL):
+    """
+    RunSQL exécuté uniquement sur PostgreSQL.
+
+    Pour les objets propres à PostgreSQL (index BRIN, trigrammes…) : sur les
+    autres bases (SQLite en développement et en tests) l'opération est ignorée.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return "Raw SQL operation (PostgreSQL uniquement)"
@@ -0,0 +1,145 @@
+# core/pagination.py
+
+import base64
+import binascii
+from functools import cached_property
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+TAILLE_PAGE = 50
+TAILLE_PAGE_MAX = 200
+
+
+class PageCurseur:
+    """
+    Une page d'une liste paginée par curseur (clé date + id).
+
+    Se parcourt comme une liste dans les gabarits ; `url_suivante` et
+    `url_precedente` conservent les autres paramètres GET (filtres). `len()`
+    compte la page, `total` toute la liste filtrée : compté sur la première
+    page, puis transmis aux suivantes dans leur URL (paramètre `total`) pour
+    qu'une page profonde ne refasse pas un COUNT de toute la table.
+    """
+
+    def __init__(self, objets, requete, curseur_suivant=None, curseur_precedent=None, queryset=None):
+        self.objets = objets
+        self.requete = requete
+        self.curseur_suivant = curseur_suivant
+        self.curseur_precedent = curseur_precedent
+        self.queryset = queryset
+
+    @cached_property
+    def total(self):
+        """Nombre de lignes de la liste entière : repris de l'URL, sinon un COUNT (première page, lien enregistré)."""
+        transmis = _lire_total(self.requete.GET.get('total')) if self._avec_curseur() else None
+        if transmis is not None:
+            return transmis
+        if self.queryset is None:
+            return len(self.objets)
+        return self.queryset.count()
+
+    def _avec_curseur(self):
+        return bool(self.requete.GET.get('apres') or self.requete.GET.get('avant'))
+
+    def __iter__(self):
+        return iter(self.objets)
+
+    def __len__(self):
+        return len(self.objets)
+
+    def __bool__(self):
+        return bool(self.objets)
+
+    @property
+    def a_suivant(self):
+        return self.curseur_suivant is not None
+
+    @property
+    def a_precedent(self):
+        return self.curseur_precedent is not None
+
+    def url_suivante(self):
+        return self._url('apres', self.curseur_suivant) if self.a_suivant else ''
+
+    def url_precedente(self):
+        return self._url('avant', self.curseur_precedent) if self.a_precedent else ''
+
+    def _url(self, sens, curseur):
+        parametres = self.requete.GET.copy()
+        parametres.pop('apres', None)
+        parametres.pop('avant', None)
+        parametres[sens] = curseur
+        parametres['total'] = self.total
+        return '?' + parametres.urlencode()
+
+
+def _encoder(objet, champ):
+    brut = f"{getattr(objet, champ).isoformat()}|{objet.pk}"
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip('=')
+
+
+def _decoder(curseur, champ_modele):
+    """Renvoie (valeur, pk) ou None si le curseur est absent ou illisible."""
+    if not curseur:
+        return None
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4)).decode()
+        valeur, pk = brut.rsplit('|', 1)
+        return champ_modele.to_python(valeur), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, ValidationError):
+        return None
+
+
+def _lire_total(valeur):
+    try:
+        total = int(valeur)
+    except (TypeError, ValueError):
+        return None
+    return total if total >= 0 else None
+
+
+def _lire_taille(valeur, defaut):
+    try:
+        taille = int(valeur)
+    except (TypeError, ValueError):
+        return defaut
+    return max(1, min(taille, TAILLE_PAGE_MAX))
+
+
+def paginer_par_curseur(request, queryset, champ, taille=TAILLE_PAGE):
+    """
+    Pagine `queryset` du plus récent au plus ancien selon (`champ`, id).
+
+    Contrairement à OFFSET, le coût d'une page ne dépend pas de sa profondeur
+    dans l'historique, et l'insertion de nouvelles lignes ne décale pas les
+    pages suivantes. Paramètres GET : `apres` / `avant` (curseurs) et `taille`.
+    """
+    champ_modele = queryset.model._meta.get_field(champ)
+    liste = queryset
+    taille = _lire_taille(request.GET.get('taille'), taille)
+    avant = _decoder(request.GET.get('avant'), champ_modele)
+    apres = None if avant else _decoder(request.GET.get('apres'), champ_modele)
+
+    if avant:
+        # Page précédente : on remonte vers les plus récents puis on réinverse
+        valeur, pk = avant
+        objets = list(
+            queryset.filter(Q(**{f'{champ}__gt': valeur}) | Q(**{champ: valeur, 'pk__gt': pk}))
+            .order_by(champ, 'pk')[:taille + 1]
+        )
+        encore = len(objets) > taille
+        objets = objets[:taille][::-1]
+        precedent = _encoder(objets[0], champ) if encore else None
+        suivant = _encoder(objets[-1], champ) if objets else None
+    else:
+        if apres:
+            valeur, pk = apres
+            queryset = queryset.filter(Q(**{f'{champ}__lt': valeur}) | Q(**{champ: valeur, 'pk__lt': pk}))
+        objets = list(queryset.order_by(f'-{champ}', '-pk')[:taille + 1])
+        encore = len(objets) > taille
+        objets = objets[:taille]
+        suivant = _encoder(objets[-1], champ) if encore else None
+        precedent = _encoder(objets[0], champ) if apres and objets else None
+
+    return PageCurseur(objets, request, suivant, precedent, queryset=liste)
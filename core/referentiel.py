@@ -0,0 +1,90 @@
+# core/referentiel.py
+
+"""
+Données de référence (catégories, services, secteurs, personnel) gardées en
+mémoire dans chaque processus.
+
+Chaque modèle enregistré a une version stockée dans le cache Django, qui doit
+donc être partagé par les workers (voir CACHES dans les settings). Toute
+écriture (post_save / post_delete) change cette version ; chaque worker compare
+sa copie locale à la version partagée et recharge la table au besoin. Une
+lecture ne coûte donc qu'un accès au cache au lieu d'une requête SQL. Une copie
+est de toute façon rechargée après AGE_MAX_COPIE secondes, ce qui borne
+l'effet d'une invalidation manquée (écriture hors ORM, cache vidé).
+
+Les objets renvoyés sont partagés : ne pas les modifier.
+"""
+
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from core.metriques import acces_cache
+
+_chargeurs = {}     # modèle -> fonction renvoyant le queryset à mettre en mémoire
+_dependants = {}    # modèle -> modèles dont la copie inclut des lignes de celui-ci
+_copies = {}        # modèle -> (version, objets, objets par pk, instant du chargement)
+
+AGE_MAX_COPIE = 60
+
+
+def _cle(modele):
+    return f'referentiel:{modele._meta.label_lower}:version'
+
+
+def enregistrer(modele, chargeur, depend_de=()):
+    """
+    Garde en mémoire le résultat de `chargeur()` pour `modele`. Les écritures
+    sur `modele` ou sur un modèle de `depend_de` (relations chargées avec lui)
+    invalident la copie dans tous les processus.
+    """
+    _chargeurs[modele] = chargeur
+    _dependants.setdefault(modele, set()).add(modele)
+    for source in (modele, *depend_de):
+        _dependants.setdefault(source, set()).add(modele)
+        uid = f'referentiel:{source._meta.label_lower}'
+        post_save.connect(_sur_ecriture, sender=source, dispatch_uid=uid)
+        post_delete.connect(_sur_ecriture, sender=source, dispatch_uid=uid)
+
+
+def invalider(modele):
+    """Change la version partagée de `modele` et des copies qui en dépendent."""
+    for cible in _dependants.get(modele, {modele}):
+        cache.set(_cle(cible), uuid.uuid4().hex, None)
+
+
+def _sur_ecriture(sender, **kwargs):
+    invalider(sender)
+    # Encore une fois après le commit : un autre worker a pu recharger
+    # l'ancienne version entre l'écriture et la fin de la transaction
+    transaction.on_commit(lambda: invalider(sender))
+
+
+def _copie(modele):
+    cle = _cle(modele)
+    version = cache.get(cle)
+    if version is None:
+        cache.add(cle, uuid.uuid4().hex, None)
+        version = cache.get(cle)
+    maintenant = time.monotonic()
+    copie = _copies.get(modele)
+    valide = copie is not None and copie[0] == version and maintenant - copie[3] < AGE_MAX_COPIE
+    acces_cache('referentiel', valide)
+    if not valide:
+        objets = list(_chargeurs[modele]())
+        copie = (version, objets, {objet.pk: objet for objet in objets}, maintenant)
+        _copies[modele] = copie
+    return copie
+
+
+def liste(modele):
+    """Toutes les lignes de `modele`, dans l'ordre du chargeur."""
+    return _copie(modele)[1]
+
+
+def obtenir(modele, pk):
+    """La ligne `pk` de `modele`, ou None si elle n'existe pas."""
+    return _copie(modele)[2].get(pk)
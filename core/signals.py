@@ -1,5 +1,5 @@
-from django.contrib.auth.models import Group, Permission
-from django.db.models.signals import post_migrate
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
 from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
 from boutique.models import Produit, Vente
@@ -7,7 +7,9 @@ from salon.models import Prestation, Commission
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from .models import ConnexionHistorique
+from .cache_kpi import invalider_kpis
+from .middleware import invalider_profil
+from .models import ConnexionHistorique, Depense, ProfilUtilisateur
 
 
 @receiver(post_migrate)
@@ -81,3 +83,38 @@ def log_failed_login(sender, credentials, request, **kwargs):
         user_agent=request.META.get("HTTP_USER_AGENT", "")[:1000] if request else "",
         note=f"Tentative pour '{username}'",
     )
+
+
+# Profil gardé en session par ProfilMiddleware : à relire si le rôle,
+# les groupes de l'utilisateur ou les permissions d'un groupe changent.
+@receiver(post_save, sender=ProfilUtilisateur)
+@receiver(post_delete, sender=ProfilUtilisateur)
+def invalider_profil_role(sender, instance, **kwargs):
+    invalider_profil(instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalider_profil_groupes(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalider_profil(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            invalider_profil(user_id)
+    else:
+        invalider_profil()  # groupe vidé (clear) : utilisateurs inconnus
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalider_profil_permissions(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalider_profil()
+
+
+# Indicateurs des dashboards (voir core.cache_kpi)
+@receiver(post_save, sender=Depense)
+@receiver(post_delete, sender=Depense)
+def invalider_kpis_depense(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalider_kpis(instance.entite)
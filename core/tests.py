@@ -1,3 +1,656 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core import checks
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from boutique.models import Categorie, LigneDeVente, Paiement, Produit, ResumeVentesJour, Vente
+from core import kpis, referentiel
+from core.instrumentation import normaliser_sql
+from core.jeu_essai import generer_jeu_essai
+from core.management.commands.expliquer_requetes import index_existants, requetes_surveillees
+from core.middleware import AGE_MAX_PROFIL
+from core.models import Depense, ProfilUtilisateur, RequeteLente
+from core.n_plus_un import RequetesVuesMixin
+from salon.forms import PrestationForm
+from salon.models import Personnel, Prestation, Secteur, Service
+
+
+class DashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('gerant', password='motdepasse-test')
+        ProfilUtilisateur.objects.create(user=cls.admin, role='ADMIN')
+        produit = Produit.objects.create(
+            nom='Lotion', prix_achat=Decimal('3.00'), prix_vente=Decimal('8.00'), quantite_stock=20
+        )
+        vente = Vente.objects.create(vendeur=cls.admin)
+        LigneDeVente.objects.create(vente=vente, produit=produit, quantite=3, prix_unitaire_vente=Decimal('8.00'))
+        vente.refresh_from_db()
+        vente.finaliser()
+        vente.enregistrer_paiement(Decimal('20.00'), utilisateur=cls.admin)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_dashboard_lit_les_resumes_du_jour(self):
+        reponse = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.context['recette_brute_jour'], Decimal('24.00'))
+        self.assertEqual(reponse.context['cout_approvisionnement_jour'], Decimal('9.00'))
+        self.assertEqual(reponse.context['ventes_jour'], 1)
+        self.assertEqual(reponse.context['dettes_totales'], Decimal('4.00'))
+        self.assertEqual(reponse.context['revenus_mois'], Decimal('24.00'))
+
+    def test_dettes_comptent_les_ventes_non_finalisees(self):
+        # Comme liste_dettes : toute vente non soldée, finalisée ou non
+        en_cours = Vente.objects.create(vendeur=self.admin)
+        LigneDeVente.objects.create(
+            vente=en_cours, produit=Produit.objects.get(), quantite=1, prix_unitaire_vente=Decimal('8.00'),
+        )
+        reponse = self.client.get(reverse('dashboard'))
+        self.assertEqual(reponse.context['dettes_totales'], Decimal('12.00'))
+
+    def test_indicateurs_en_cache_jusqu_a_la_prochaine_ecriture(self):
+        self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.client.get(reverse('dashboard'))
+        # Session et utilisateur seulement : les indicateurs viennent du cache
+        self.assertEqual(len(requetes), 2)
+
+        Depense.objects.create(
+            description='Transport', montant=Decimal('5.00'), entite='BOUTIQUE',
+        )
+        reponse = self.client.get(reverse('dashboard'))
+        self.assertEqual(reponse.context['depenses_boutique_jour'], Decimal('5.00'))
+
+        vente = Vente.objects.get()
+        vente.enregistrer_paiement(Decimal('4.00'), utilisateur=self.admin)
+        reponse = self.client.get(reverse('dashboard'))
+        self.assertEqual(reponse.context['dettes_totales'], Decimal('0'))
+
+    def test_budget_depense_boutique(self):
+        reponse = self.client.get(reverse('ajouter_depense_boutique'))
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.context['reste_autorise'], Decimal('24.00'))
+
+
+class KpisTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendeur = User.objects.create_user('vendeur', password='motdepasse-test')
+        cls.soins = Categorie.objects.create(nom='Soins')
+        Categorie.objects.create(nom='Parfums')
+        creme = Produit.objects.create(
+            nom='Crème', categorie=cls.soins, prix_achat=Decimal('2.00'), prix_vente=Decimal('5.00'),
+            quantite_stock=10,
+        )
+        Produit.objects.create(
+            nom='Savon', prix_achat=Decimal('1.00'), prix_vente=Decimal('2.00'), quantite_stock=1, seuil_stock_bas=2,
+        )
+        vente = Vente.objects.create(vendeur=cls.vendeur)
+        LigneDeVente.objects.create(vente=vente, produit=creme, quantite=2, prix_unitaire_vente=Decimal('5.00'))
+        vente.refresh_from_db()
+        vente.finaliser()
+
+        homme = Secteur.objects.create(nom='HOMME', taux_commission=Decimal('0.50'))
+        coiffeur = Personnel.objects.create(nom='Kabila', prenom='Jo', secteur=homme, taux_commission=Decimal('0.30'))
+        service = Service.objects.create(nom='Coupe', prix=Decimal('10.00'), duree_estimee=timedelta(minutes=30))
+        Prestation.objects.create(
+            personnel=coiffeur, secteur=homme, service=service, montant_paye=Decimal('40.00'),
+            date_prestation=timezone.now(),
+        )
+
+        Depense.objects.create(entite='BOUTIQUE', description='Sacs', montant=Decimal('3.00'))
+        Depense.objects.create(entite='SALON', secteur='HOMME', description='Gel', montant=Decimal('5.00'))
+        cls.jour = Depense.objects.first().date_depense
+
+    def setUp(self):
+        cache.clear()
+        # Référentiels en mémoire : hors du décompte des requêtes
+        referentiel.liste(Categorie)
+        referentiel.liste(Personnel)
+
+    def test_dashboard_boutique_en_nombre_fixe_de_requetes(self):
+        with self.assertNumQueries(5):
+            resultat = kpis.calculer_kpis_boutique(self.jour)
+
+        self.assertEqual(resultat['recette_brute_jour'], Decimal('10.00'))
+        self.assertEqual(resultat['revenu_net_jour'], Decimal('3.00'))
+        self.assertEqual(resultat['total_approvisionnement'], Decimal('17.00'))
+        self.assertEqual(resultat['total_produits'], 2)
+        self.assertEqual(resultat['stock_faible'], 1)
+        self.assertEqual(
+            [(c['nom'], c['valeur_stock']) for c in resultat['categories']],
+            [('Parfums', None), ('Soins', Decimal('16.00'))],
+        )
+
+        Produit.objects.bulk_create(
+            Produit(nom=f'Lot {i}', categorie=self.soins, prix_achat=Decimal('1.00'), prix_vente=Decimal('2.00'))
+            for i in range(20)
+        )
+        with self.assertNumQueries(5):
+            self.assertEqual(kpis.calculer_kpis_boutique(self.jour)['total_produits'], 22)
+
+    def test_dashboard_salon_en_nombre_fixe_de_requetes(self):
+        with self.assertNumQueries(2):
+            resultat = kpis.calculer_kpis_salon(timezone.localdate())
+
+        self.assertEqual(resultat['revenus_jour'], Decimal('20.00'))
+        self.assertEqual(resultat['prestations_homme'], 1)
+        self.assertEqual(resultat['total_personnel'], 1)
+
+    def test_budgets_de_depenses(self):
+        with self.assertNumQueries(2):
+            budget = kpis.budget_boutique(self.jour)
+        self.assertEqual(budget['reste_autorise'], Decimal('7.00'))
+
+        with self.assertNumQueries(2):
+            budget = kpis.budget_salon(self.jour)
+        self.assertEqual((budget['dispo_homme'], budget['dep_h'], budget['reste_h']),
+                         (Decimal('20.00'), Decimal('5.00'), Decimal('15.00')))
+        self.assertEqual(budget['reste_f'], Decimal('0'))
+
+
+class PaginationCurseurTests(RequetesVuesMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerant = User.objects.create_user('caissier', password='motdepasse-test')
+        ProfilUtilisateur.objects.create(user=cls.gerant, role='GESTIONNAIRE_BOUTIQUE')
+        aujourd_hui = date.today()
+        for i in range(7):
+            depense = Depense.objects.create(entite='BOUTIQUE', description=f"Achat {i}", montant=Decimal('1.00'))
+            # Plusieurs dépenses le même jour : l'id départage
+            Depense.objects.filter(pk=depense.pk).update(date_depense=aujourd_hui - timedelta(days=i // 2))
+        cls.attendu = list(Depense.objects.order_by('-date_depense', '-pk').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.gerant)
+
+    def page(self, requete=''):
+        reponse = self.client.get(reverse('liste_depenses_boutique') + requete)
+        self.assertEqual(reponse.status_code, 200)
+        return reponse.context['depenses']
+
+    def test_parcours_complet_dans_les_deux_sens(self):
+        pages = [self.page('?taille=3')]
+        while pages[-1].a_suivant:
+            pages.append(self.page(pages[-1].url_suivante()))
+
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+        # Le total affiché compte toute la liste, pas la page
+        self.assertEqual([p.total for p in pages], [7, 7, 7])
+        self.assertEqual([d.pk for p in pages for d in p], self.attendu)
+        self.assertFalse(pages[0].a_precedent)
+
+        retour = self.page(pages[-1].url_precedente())
+        self.assertEqual([d.pk for d in retour], self.attendu[3:6])
+        self.assertEqual(self.page(retour.url_precedente()).objets, pages[0].objets)
+
+    def test_total_compte_sur_la_premiere_page_seulement(self):
+        premiere = self.page('?taille=3')
+        with CaptureQueriesContext(connection) as requetes:
+            suivante = self.page(premiere.url_suivante())
+        self.assertEqual(suivante.total, 7)
+        self.assertFalse([q for q in requetes.captured_queries if 'COUNT(' in q['sql']])
+
+        # Lien enregistré sans le total : recompté
+        self.assertEqual(self.page('?taille=3&apres=' + premiere.curseur_suivant).total, 7)
+
+    def test_insertion_ne_decale_pas_la_page_suivante(self):
+        premiere = self.page('?taille=3')
+        Depense.objects.create(entite='BOUTIQUE', description="Nouvelle", montant=Decimal('2.00'))
+
+        self.assertEqual([d.pk for d in self.page(premiere.url_suivante())], self.attendu[3:6])
+
+    def test_nombre_de_requetes_independant_du_volume(self):
+        def ajouter(nb):
+            for _ in range(nb):
+                Depense.objects.create(entite='BOUTIQUE', description="Achat", montant=Decimal('1.00'))
+
+        self.assertRequetesParVolume(4, reverse('liste_depenses_boutique'), ajouter, tailles=(0, 60))
+
+    def test_curseur_illisible_et_taille_bornee(self):
+        self.assertEqual([d.pk for d in self.page('?apres=%%%&taille=abc')], self.attendu)
+        self.assertEqual(len(self.page('?taille=0')), 1)
+
+
+class ExportDepensesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerant = User.objects.create_user('caissier', password='motdepasse-test')
+        ProfilUtilisateur.objects.create(user=cls.gerant, role='GESTIONNAIRE_BOUTIQUE')
+        Depense.objects.create(entite='BOUTIQUE', description="Sacs <kraft> & étiquettes", montant=Decimal('12.50'))
+        Depense.objects.create(entite='SALON', secteur='HOMME', description="Savon", montant=Decimal('3.00'))
+
+    def setUp(self):
+        self.client.force_login(self.gerant)
+
+    def test_export_xlsx_de_son_entite(self):
+        reponse = self.client.get(reverse('export_depenses_boutique'), {'format': 'xlsx'})
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('depenses-boutique-', reponse['Content-Disposition'])
+        with zipfile.ZipFile(BytesIO(b''.join(reponse.streaming_content))) as classeur:
+            self.assertIsNone(classeur.testzip())
+            feuille = classeur.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(feuille.count('<row>'), 2)
+        self.assertIn('Sacs &lt;kraft&gt; &amp; étiquettes', feuille)
+        self.assertIn('<c><v>12.50</v></c>', feuille)
+        self.assertIn('<c s="1"><v>', feuille)  # date au format date d'Excel
+
+        self.assertEqual(self.client.get(reverse('export_depenses_salon')).status_code, 403)
+
+
+class ExpliquerRequetesTests(TestCase):
+
+    # Sur un si petit volume, le planificateur de PostgreSQL préfère souvent un
+    # parcours séquentiel : la vérification s'y fait avec un jeu d'essai réaliste
+    @unittest.skipUnless(connection.vendor == 'sqlite', "plans vérifiés sur SQLite (volume de test trop faible)")
+    def test_plans_captures_sur_un_jeu_essai_annule(self):
+        sortie = StringIO()
+        call_command('expliquer_requetes', jeu_essai=1000, stdout=sortie)
+
+        self.assertIn("OK  liste_ventes → vente_date_id_idx", sortie.getvalue())
+        self.assertIn("Toutes les requêtes surveillées utilisent leur index.", sortie.getvalue())
+        self.assertFalse(Vente.objects.exists())
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "index propres à PostgreSQL")
+    def test_index_propres_a_postgresql_utilisables(self):
+        # Parcours séquentiel désactivé : sur le volume du jeu d'essai, le plan
+        # montre si l'index (BRIN, trigramme…) sert la requête
+        generer_jeu_essai(1000)
+        with connection.cursor() as curseur:
+            curseur.execute('ANALYZE')
+            curseur.execute('SET LOCAL enable_seqscan = off')
+        existants = index_existants()
+        for libelle, queryset, index, postgres_seulement in requetes_surveillees():
+            if not postgres_seulement or not existants.intersection(index):
+                continue
+            with self.subTest(libelle):
+                plan = queryset.explain()
+                self.assertTrue(any(nom in plan for nom in index), plan)
+
+
+class JeuEssaiEtMesuresTests(TestCase):
+
+    def test_generation(self):
+        with self.assertRaises(CommandError):
+            call_command('generer_jeu_essai', ventes=20, stdout=StringIO())
+
+        call_command('generer_jeu_essai', ventes=40, produits=12, categories=3, force=True, stdout=StringIO())
+
+        self.assertEqual(Produit.objects.count(), 12)
+        self.assertEqual(Categorie.objects.count(), 3)
+        self.assertEqual(Vente.objects.count(), 40)
+        self.assertTrue(LigneDeVente.objects.exists())
+        self.assertTrue(Paiement.objects.exists())
+        # Résumés reconstruits : cohérents avec les ventes finalisées
+        self.assertEqual(
+            ResumeVentesJour.objects.aggregate(n=Sum('nb_ventes'))['n'],
+            Vente.objects.filter(est_complete=True).count(),
+        )
+
+    def test_mesures_comparees_a_la_reference(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = f'{dossier}/reference.json'
+            options = {'jeu_essai': 30, 'repetitions': 1, 'reference': chemin, 'stdout': StringIO()}
+            call_command('mesurer_vues', enregistrer=True, **options)
+            with open(chemin) as f:
+                reference = json.load(f)
+            self.assertEqual(reference['dashboard']['statut'], 200)
+            self.assertFalse(Vente.objects.exists())  # jeu d'essai annulé
+
+            reference['liste_ventes']['requetes'] = 0
+            with open(chemin, 'w') as f:
+                json.dump(reference, f)
+            with self.assertRaisesMessage(CommandError, 'liste_ventes'):
+                call_command('mesurer_vues', tolerance=10 ** 6, **options)
+
+
+class TesterChargeTests(LiveServerTestCase):
+
+    def test_scenarios_contre_un_serveur(self):
+        call_command('generer_jeu_essai', ventes=20, produits=10, force=True, stdout=StringIO())
+        ventes, prestations = Vente.objects.count(), Prestation.objects.count()
+
+        lignes = {}
+        # Un scénario à la fois : la base SQLite en mémoire des tests ne supporte
+        # pas les écritures concurrentes des threads du serveur
+        for scenario in ('caissiers', 'gerants_boutique', 'gerants_salon', 'coiffeurs'):
+            nombres = {'caissiers': 0, 'gerants_boutique': 0, 'gerants_salon': 0, 'coiffeurs': 0, scenario: 1}
+            with tempfile.TemporaryDirectory() as dossier:
+                chemin = f'{dossier}/charge.json'
+                call_command(
+                    'tester_charge', url=self.live_server_url, duree=1, montee=0, pause=0,
+                    json=chemin, force=True, stdout=StringIO(), **nombres,
+                )
+                with open(chemin) as f:
+                    lignes.update({(ligne['scenario'], ligne['action']): ligne for ligne in json.load(f)})
+
+        for scenario in ('caissier', 'gerant_boutique', 'gerant_salon', 'coiffeur'):
+            self.assertGreater(lignes[scenario, 'total']['requetes'], 0)
+            self.assertEqual(lignes[scenario, 'total']['erreurs_pct'], 0)
+        self.assertGreater(lignes['caissier', 'autocomplete']['requetes'], 0)
+        self.assertGreater(Vente.objects.count(), ventes)
+        self.assertGreater(Prestation.objects.count(), prestations)
+
+
+class ReferentielTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.homme = Secteur.objects.create(nom='HOMME', taux_commission=Decimal('0.50'))
+        cls.coiffeur = Personnel.objects.create(nom='Kabila', prenom='Jo', secteur=cls.homme)
+        Service.objects.create(nom='Coupe', prix=Decimal('10.00'), duree_estimee=timedelta(minutes=30))
+        Categorie.objects.create(nom='Soins')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lecture_sans_requete_apres_chargement(self):
+        with self.assertNumQueries(2):
+            self.assertEqual([c.nom for c in referentiel.liste(Categorie)], ['Soins'])
+            referentiel.liste(Personnel)
+        with self.assertNumQueries(0):
+            referentiel.liste(Categorie)
+            self.assertEqual(referentiel.obtenir(Personnel, self.coiffeur.pk).secteur, self.homme)
+
+    def test_ecriture_invalide_la_copie_et_ses_dependants(self):
+        referentiel.liste(Personnel)
+        Secteur.objects.filter(pk=self.homme.pk).update(taux_commission=Decimal('0.60'))
+        # Changement hors ORM : la copie n'est pas encore invalidée
+        self.assertEqual(referentiel.obtenir(Personnel, self.coiffeur.pk).secteur.taux_commission, Decimal('0.50'))
+
+        secteur = Secteur.objects.get(pk=self.homme.pk)
+        secteur.save()
+        self.assertEqual(referentiel.obtenir(Personnel, self.coiffeur.pk).secteur.taux_commission, Decimal('0.60'))
+
+        Categorie.objects.create(nom='Accessoires')
+        self.assertEqual([c.nom for c in referentiel.liste(Categorie)], ['Accessoires', 'Soins'])
+
+    def test_version_partagee_entre_processus(self):
+        referentiel.liste(Categorie)
+        # Un autre worker (vrai processus, même cache) enregistre une écriture
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             'from boutique.models import Categorie; from core import referentiel; referentiel.invalider(Categorie)'],
+            cwd=settings.BASE_DIR, check=True, capture_output=True,
+            env={**os.environ, 'CACHE_LOCATION': settings.CACHES['default']['LOCATION']},
+        )
+        with self.assertNumQueries(1):
+            referentiel.liste(Categorie)
+
+    def test_copie_rechargee_apres_age_maximal(self):
+        referentiel.liste(Categorie)
+        plus_tard = referentiel.time.monotonic() + referentiel.AGE_MAX_COPIE
+        with mock.patch.object(referentiel.time, 'monotonic', return_value=plus_tard), self.assertNumQueries(1):
+            referentiel.liste(Categorie)
+
+    @override_settings(DEBUG=False, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cache_par_processus_signale(self):
+        self.assertEqual([m.id for m in checks.run_checks() if m.id == 'core.W001'], ['core.W001'])
+
+    def test_formulaire_sans_requete(self):
+        PrestationForm().as_p()
+        donnees = {
+            'personnel': self.coiffeur.pk, 'secteur': self.homme.pk, 'service': Service.objects.get().pk,
+            'montant_paye': '10.00', 'date_prestation': '2025-01-15T10:30',
+        }
+        with self.assertNumQueries(0):
+            PrestationForm().as_p()
+            form = PrestationForm(donnees)
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['personnel'], self.coiffeur)
+        self.assertIsNot(form.cleaned_data['personnel'], referentiel.obtenir(Personnel, self.coiffeur.pk))
+
+
+class ProfilMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerant = User.objects.create_user('gerant', password='motdepasse-test')
+        cls.profil = ProfilUtilisateur.objects.create(user=cls.gerant, role='GESTIONNAIRE_BOUTIQUE')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.gerant)
+
+    def requetes_profil(self, url):
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.client.get(url)
+        return reponse, [q['sql'] for q in requetes if 'core_profilutilisateur' in q['sql']]
+
+    def test_profil_lu_une_fois_par_session(self):
+        url = reverse('liste_depenses_boutique')
+        reponse, requetes = self.requetes_profil(url)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(len(requetes), 1)
+
+        reponse, requetes = self.requetes_profil(url)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(requetes, [])
+
+    def test_invalidation_depuis_un_autre_processus_et_age_maximal(self):
+        url = reverse('liste_depenses_boutique')
+        self.client.get(url)
+        # Rôle changé sur un autre worker : sa version est écrite dans le cache partagé
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             f'from core.middleware import invalider_profil; invalider_profil({self.gerant.pk})'],
+            cwd=settings.BASE_DIR, check=True, capture_output=True,
+            env={**os.environ, 'CACHE_LOCATION': settings.CACHES['default']['LOCATION']},
+        )
+        self.assertEqual(len(self.requetes_profil(url)[1]), 1)
+        self.assertEqual(self.requetes_profil(url)[1], [])
+
+        plus_tard = time.time() + AGE_MAX_PROFIL
+        with mock.patch('core.middleware.time.time', return_value=plus_tard):
+            self.assertEqual(len(self.requetes_profil(url)[1]), 1)
+
+    def test_changement_de_role_pris_en_compte(self):
+        url = reverse('liste_depenses_boutique')
+        self.client.get(url)
+
+        self.profil.role = 'GESTIONNAIRE_SALON'
+        self.profil.save()
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(reverse('liste_depenses_salon')).status_code, 200)
+
+    def test_permissions_de_groupe_en_session(self):
+        self.client.get(reverse('liste_depenses_boutique'))
+        groupe = Group.objects.get(name='Vendeur')
+        self.gerant.groups.add(groupe)
+
+        reponse = self.client.get(reverse('liste_depenses_boutique'))
+        self.assertIn('boutique.add_vente', reponse.wsgi_request.profil.permissions)
+        self.assertEqual(reponse.wsgi_request.user._group_perm_cache, set(reponse.wsgi_request.profil.permissions))
+
+    def test_permissions_de_groupe_sans_profil(self):
+        sans_profil = User.objects.create_user('sans_profil', password='motdepasse-test')
+        sans_profil.groups.add(Group.objects.get(name='Vendeur'))
+        self.client.force_login(sans_profil)
+
+        reponse = self.client.get(reverse('liste_depenses_boutique'))
+        requete = reponse.wsgi_request
+        self.assertIsNone(requete.profil.role)
+        self.assertIn('boutique.add_vente', requete.profil.permissions)
+        self.assertTrue(requete.user.has_perm('boutique.add_vente'))
+
+
+@override_settings(INSTRUMENTATION_ACTIVE=True, INSTRUMENTATION_ECHANTILLON=1.0)
+class InstrumentationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('gerant', password='motdepasse-test')
+        ProfilUtilisateur.objects.create(user=cls.admin, role='ADMIN')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_mesures_en_log_et_en_tete(self):
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            reponse = self.client.get(reverse('dashboard'))
+
+        mesures = json.loads(logs.records[0].getMessage())
+        self.assertEqual(mesures['vue'], 'dashboard')
+        self.assertEqual(mesures['statut'], 200)
+        self.assertGreater(mesures['sql_nombre'], 0)
+        self.assertTrue(mesures['sql_max'])
+        self.assertIn(f'sql;dur={mesures["sql_ms"]};desc="{mesures["sql_nombre"]} requetes"', reponse['Server-Timing'])
+
+    @override_settings(INSTRUMENTATION_ECHANTILLON=0.0)
+    def test_requete_hors_echantillon(self):
+        with self.assertNoLogs('core.instrumentation'):
+            reponse = self.client.get(reverse('dashboard'))
+        self.assertNotIn('Server-Timing', reponse)
+
+    @override_settings(INSTRUMENTATION_ACTIVE=False)
+    def test_desactive_par_defaut(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('dashboard')))
+
+
+class MetriquesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('gerant', password='motdepasse-test')
+        ProfilUtilisateur.objects.create(user=cls.admin, role='ADMIN')
+        cls.vendeur = User.objects.create_user('vendeur', password='motdepasse-test')
+        ProfilUtilisateur.objects.create(user=cls.vendeur, role='VENDEUR')
+
+    def valeur(self, nom, **labels):
+        return REGISTRY.get_sample_value(nom, labels) or 0
+
+    def test_acces_reserve(self):
+        self.assertEqual(self.client.get(reverse('metriques')).status_code, 403)
+        self.client.force_login(self.vendeur)
+        self.assertEqual(self.client.get(reverse('metriques')).status_code, 403)
+
+        self.client.force_login(self.admin)
+        reponse = self.client.get(reverse('metriques'))
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('philia_ventes_finalisees_total', reponse.content.decode())
+
+    @override_settings(METRIQUES_JETON='jeton-collecteur')
+    def test_acces_par_jeton(self):
+        reponse = self.client.get(reverse('metriques'), HTTP_AUTHORIZATION='Bearer jeton-collecteur')
+        self.assertEqual(reponse.status_code, 200)
+        reponse = self.client.get(reverse('metriques'), HTTP_AUTHORIZATION='Bearer autre')
+        self.assertEqual(reponse.status_code, 403)
+
+    @override_settings(METRIQUES_ACTIVES=True)
+    def test_latence_et_sql_par_vue(self):
+        avant = self.valeur('philia_requete_duree_secondes_count', vue='dashboard', methode='GET')
+        self.client.force_login(self.admin)
+        self.client.get(reverse('dashboard'))
+
+        self.assertEqual(self.valeur('philia_requete_duree_secondes_count', vue='dashboard', methode='GET'), avant + 1)
+        self.assertGreater(self.valeur('philia_requete_sql_nombre_sum', vue='dashboard'), 0)
+
+    def test_compteurs_metier_apres_commit(self):
+        produit = Produit.objects.create(
+            nom='Lotion', prix_achat=Decimal('3.00'), prix_vente=Decimal('8.00'), quantite_stock=5
+        )
+        vente = Vente.objects.create(vendeur=self.admin)
+        LigneDeVente.objects.create(vente=vente, produit=produit, quantite=4, prix_unitaire_vente=Decimal('8.00'))
+        vente.refresh_from_db()
+        ventes, paiements, alertes = (
+            self.valeur(nom) for nom in
+            ('philia_ventes_finalisees_total', 'philia_paiements_total', 'philia_alertes_stock_total')
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vente.finaliser()
+            vente.enregistrer_paiement(Decimal('10.00'), utilisateur=self.admin)
+
+        self.assertEqual(self.valeur('philia_ventes_finalisees_total'), ventes + 1)
+        self.assertEqual(self.valeur('philia_paiements_total'), paiements + 1)
+        self.assertEqual(self.valeur('philia_alertes_stock_total'), alertes + 1)
+
+
+class RequetesLentesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('gerant', password='motdepasse-test')
+        ProfilUtilisateur.objects.create(user=cls.admin, role='ADMIN')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_normalisation(self):
+        self.assertEqual(
+            normaliser_sql('SELECT "id" FROM "t"  WHERE "id" IN (%s, %s, %s) AND "nom" = \'a\' LIMIT 21'),
+            'SELECT "id" FROM "t" WHERE "id" IN (%s, ...) AND "nom" = ? LIMIT ?',
+        )
+        self.assertEqual(normaliser_sql('SELECT 1 WHERE x IN (%s, %s)'), normaliser_sql('SELECT 2 WHERE x IN (%s, %s, %s)'))
+
+    @override_settings(REQUETES_LENTES_SEUIL_MS=0.000001)
+    def test_requetes_regroupees_par_empreinte_avec_plan(self):
+        with self.assertLogs('core.requetes_lentes', 'WARNING'):
+            self.client.get(reverse('dashboard'))
+        resume = RequeteLente.objects.get(sql__contains='FROM "boutique_resumeventesjour"')
+        self.assertEqual(resume.vue, 'dashboard')
+        self.assertEqual(resume.occurrences, 1)
+        self.assertTrue(resume.plan)
+
+        cache.clear()
+        with self.assertLogs('core.requetes_lentes', 'WARNING'):
+            self.client.get(reverse('dashboard'))
+        resume.refresh_from_db()
+        self.assertEqual(resume.occurrences, 2)
+        self.assertEqual(RequeteLente.objects.filter(sql=resume.sql).count(), 1)
+
+    @override_settings(REQUETES_LENTES_SEUIL_MS=0.000001)
+    def test_erreur_de_releve_sans_effet_sur_la_reponse(self):
+        with mock.patch('core.middleware.RequeteLente.enregistrer', side_effect=TypeError('paramètre inattendu')):
+            with self.assertLogs('core.requetes_lentes', 'ERROR') as logs:
+                reponse = self.client.get(reverse('dashboard'))
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('Requête lente non enregistrée', '\n'.join(logs.output))
+
+        with mock.patch('core.models.expliquer', side_effect=TypeError('paramètre inattendu')):
+            RequeteLente.enregistrer('SELECT 1', (object(),), 5.0)
+        self.assertIn('EXPLAIN impossible', RequeteLente.objects.get(sql='SELECT ?').plan)
+
+    def test_page_admin(self):
+        lente = RequeteLente.objects.create(
+            empreinte='x' * 40, sql='SELECT ? FROM "core_depense"', plan='SCAN core_depense', duree_totale_ms=800,
+            duree_max_ms=800,
+        )
+        self.assertContains(self.client.get(reverse('admin:core_requetelente_changelist')), 'core_depense')
+        self.assertContains(
+            self.client.get(reverse('admin:core_requetelente_change', args=[lente.pk])), 'SCAN core_depense'
+        )
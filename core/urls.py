@@ -11,6 +11,8 @@ urlpatterns = [
     #path('depenses/ajouter/', ajouter_depense, name='ajouter_depense'),
     path('depenses/boutique/', liste_depenses_boutique, name='liste_depenses_boutique'),
     path('depenses/boutique/ajouter/', ajouter_depense_boutique, name='ajouter_depense_boutique'),
+    path('depenses/boutique/export/', export_depenses_boutique, name='export_depenses_boutique'),
+    path('metriques/', metriques, name='metriques'),
     
     
 ]
@@ -1,18 +1,22 @@
-from decimal import Decimal
-from django.http import HttpResponseForbidden
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render, redirect
 from django.contrib.auth.models import Group
 from django.contrib.auth import login
-from salon.models import Prestation
 from .forms import InscriptionForm, ConnexionForm, DepenseForm
+from core import metriques as metriques_app
+from core.kpis import budget_boutique, budget_salon, kpis_boutique
+from core.decorators import role_requis
 from core.models import ProfilUtilisateur, Depense
+from core.exports import filtre_periode, reponse_export
+from core.pagination import paginer_par_curseur
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from datetime import datetime
-from boutique.models import Categorie, LigneDeVente, Produit, Vente
-from django.db.models import Sum, F, DecimalField, ExpressionWrapper
 
 now = timezone.now()
 
@@ -93,111 +97,32 @@ def dashboard_view(request):
     # Date du jour en local
     aujourdhui = timezone.localdate()
 
-    profil = ProfilUtilisateur.objects.get(user=request.user)
-    is_admin = (profil.role == 'ADMIN')
+    return render(request, "core/dashboard.html", {
+        **kpis_boutique(aujourdhui),
+        'is_admin': request.profil.a_role('ADMIN'),
+    })
 
-    # 1) Ventes finalisées du jour
-    ventes_du_jour = Vente.objects.filter(
-        date_vente__date=aujourdhui,
-        est_complete=True
-    )
-    lignes_du_jour = LigneDeVente.objects.filter(vente__in=ventes_du_jour)
-
-    # 2) Recette brute (CA)
-    recette_brute_jour = lignes_du_jour.aggregate(
-        total_ca=Sum(
-            ExpressionWrapper(
-                F('prix_unitaire_vente') * F('quantite'),
-                output_field=DecimalField()
-            )
-        )
-    )['total_ca'] or Decimal('0')
-
-    # 3) Coût d’achat (approvisionnement)
-    cout_approvisionnement_jour = lignes_du_jour.aggregate(
-        total_cout=Sum(
-            ExpressionWrapper(
-                F('produit__prix_achat') * F('quantite'),
-                output_field=DecimalField()
-            )
-        )
-    )['total_cout'] or Decimal('0')
-
-    # 4) Marge brute
-    marge_brute_jour = recette_brute_jour - cout_approvisionnement_jour
-
-    # 5) Dépenses BOUTIQUE du jour
-    depenses_boutique_jour = Depense.objects.filter(
-        entite='BOUTIQUE',
-        date_depense=aujourdhui
-    ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
-
-    # 6) Revenu net
-    revenu_net_jour = marge_brute_jour - depenses_boutique_jour
-
-    # 7) 💳 Dettes totales (toutes ventes avec reste > 0)
-    dettes_qs = (
-        Vente.objects
-        .annotate(
-            reste=ExpressionWrapper(
-                F('total') - F('montant_encaisse'),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
-        )
-        .filter(reste__gt=0)
-    )
-    dettes_totales = dettes_qs.aggregate(total=Sum('reste'))['total'] or Decimal('0')
-
-    # ----- Stats stock & approvisionnement -----
-    produits = Produit.objects.all().annotate(
-        valeur_stock=ExpressionWrapper(
-            F('prix_achat') * F('quantite_stock'),
-            output_field=DecimalField(max_digits=12, decimal_places=2)
-        )
-    )
-    total_approvisionnement = produits.aggregate(total=Sum('valeur_stock'))['total'] or Decimal('0')
-    categories = Categorie.objects.annotate(
-        valeur_stock=Sum(
-            ExpressionWrapper(
-                F('produits__prix_achat') * F('produits__quantite_stock'),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
-        )
-    )
-    top_produits = produits.order_by('-valeur_stock')[:5]
-    total_produits = produits.count()
-    stock_faible = produits.filter(quantite_stock__lte=F('seuil_stock_bas')).count()
 
-    # Revenus du mois (sur ventes finalisées)
-    mois = aujourdhui.month
-    annee = aujourdhui.year
-    ventes_mois = Vente.objects.filter(date_vente__month=mois, date_vente__year=annee, est_complete=True)
-    revenus_mois = ventes_mois.aggregate(total=Sum('total'))['total'] or Decimal('0')
+def metriques(request):
+    """
+    Métriques au format texte Prometheus. Réservé aux administrateurs connectés
+    ou au collecteur muni du jeton METRIQUES_JETON (Authorization: Bearer …).
+    """
+    jeton = settings.METRIQUES_JETON
+    entete = request.headers.get('Authorization', '')
+    autorise = bool(jeton) and hmac.compare_digest(entete, f'Bearer {jeton}')
+    if not autorise and request.user.is_authenticated:
+        autorise = request.user.is_superuser or request.profil.a_role('ADMIN')
+    if not autorise:
+        return HttpResponseForbidden("Accès réservé à la supervision.")
 
-    return render(request, "core/dashboard.html", {
-        # résumé financier
-        'is_admin': is_admin,
-        'recette_brute_jour': recette_brute_jour,
-        'cout_approvisionnement_jour': cout_approvisionnement_jour,
-        'marge_brute_jour': marge_brute_jour,
-        'depenses_boutique_jour': depenses_boutique_jour,
-        'revenu_net_jour': revenu_net_jour,
-        'dettes_totales': dettes_totales,  # 🆕 pour l’affichage dans le dashboard
-
-        # stats stock & ventes
-        'total_approvisionnement': total_approvisionnement,
-        'categories': categories,
-        'top_produits': top_produits,
-        'total_produits': total_produits,
-        'ventes_jour': ventes_du_jour.count(),
-        'stock_faible': stock_faible,
-        'revenus_mois': revenus_mois,
-    })
+    contenu, type_mime = metriques_app.exposer()
+    return HttpResponse(contenu, content_type=type_mime)
 
 
 @login_required
 def liste_depenses(request):
-    depenses = Depense.objects.order_by('-date_depense')
+    depenses = paginer_par_curseur(request, Depense.objects.all(), 'date_depense')
     return render(request, 'core/depenses/liste.html', {'depenses': depenses})
 
 
@@ -217,52 +142,59 @@ def ajouter_depense(request):
 
 # ✅ Liste pour la BOUTIQUE
 @login_required
+@role_requis('GESTIONNAIRE_BOUTIQUE', 'ADMIN',
+             refus="Vous n'avez pas la permission d'accéder aux dépenses de la boutique.")
 def liste_depenses_boutique(request):
-    profil = ProfilUtilisateur.objects.get(user=request.user)
-    if profil.role != 'GESTIONNAIRE_BOUTIQUE' and profil.role != 'ADMIN':
-        return HttpResponseForbidden("Vous n'avez pas la permission d'accéder aux dépenses de la boutique.")
-
-    depenses = Depense.objects.filter(entite='BOUTIQUE').order_by('-date_depense')
+    depenses = paginer_par_curseur(request, Depense.objects.filter(entite='BOUTIQUE'), 'date_depense')
     return render(request, 'core/depenses/liste_boutique.html', {'depenses': depenses})
 
 
 # ✅ Liste pour le SALON
 @login_required
+@role_requis('GESTIONNAIRE_SALON', 'ADMIN',
+             refus="Vous n'avez pas la permission d'accéder aux dépenses du salon.")
 def liste_depenses_salon(request):
-    profil = ProfilUtilisateur.objects.get(user=request.user)
-    if profil.role != 'GESTIONNAIRE_SALON' and profil.role != 'ADMIN':
-        return HttpResponseForbidden("Vous n'avez pas la permission d'accéder aux dépenses du salon.")
-
-    depenses = Depense.objects.filter(entite='SALON').order_by('-date_depense')
+    depenses = paginer_par_curseur(request, Depense.objects.filter(entite='SALON'), 'date_depense')
     return render(request, 'core/depenses/liste_salon.html', {'depenses': depenses})
 
 
+def _export_depenses(request, entite):
+    """Dépenses d'une entité en CSV / XLSX : période et secteur en filtres GET."""
+    depenses = Depense.objects.filter(filtre_periode(request, 'date_depense'), entite=entite)
+    if request.GET.get('secteur'):
+        depenses = depenses.filter(secteur=request.GET['secteur'])
+    return reponse_export(
+        request, f'depenses-{entite.lower()}',
+        ['Date', 'Entité', 'Secteur', 'Description', 'Montant'],
+        depenses.order_by('date_depense', 'pk').values_list('date_depense', 'entite', 'secteur', 'description', 'montant'),
+    )
+
+
+@login_required
+@role_requis('GESTIONNAIRE_BOUTIQUE', 'ADMIN',
+             refus="Vous n'avez pas la permission d'accéder aux dépenses de la boutique.")
+def export_depenses_boutique(request):
+    return _export_depenses(request, 'BOUTIQUE')
+
+
+@login_required
+@role_requis('GESTIONNAIRE_SALON', 'ADMIN',
+             refus="Vous n'avez pas la permission d'accéder aux dépenses du salon.")
+def export_depenses_salon(request):
+    return _export_depenses(request, 'SALON')
+
+
 # ✅ Ajouter pour la BOUTIQUE
 @login_required
+@role_requis('GESTIONNAIRE_BOUTIQUE', 'ADMIN',
+             refus="Vous n'avez pas la permission d'ajouter une dépense pour la boutique.")
 def ajouter_depense_boutique(request):
-    # 🔒 Contrôle d’accès
-    profil = request.user.profilutilisateur
-    if profil.role not in ('GESTIONNAIRE_BOUTIQUE', 'ADMIN'):
-        return HttpResponseForbidden("Vous n'avez pas la permission d'ajouter une dépense pour la boutique.")
-
     # date du jour en local
     aujourdhui = timezone.localdate()
 
-    # 🔍 Recette brute du jour (CA)
-    ventes_du_jour = Vente.objects.filter(
-        date_vente__date=aujourdhui,
-        est_complete=True
-    )
-    recette_brute_jour = ventes_du_jour.aggregate(total=Sum('total'))['total'] or Decimal('0')
-
-    # 🔍 Dépenses déjà enregistrées aujourd'hui pour la boutique
-    depenses_du_jour = Depense.objects.filter(
-        entite='BOUTIQUE',
-        date_depense=aujourdhui
-    ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
-
-    # 🟢 Montant encore autorisé
-    reste_autorise = recette_brute_jour - depenses_du_jour
+    # Recette brute, dépenses déjà enregistrées et montant encore autorisé
+    budget = budget_boutique(aujourdhui)
+    reste_autorise = budget['reste_autorise']
 
     if request.method == 'POST':
         form = DepenseForm(request.POST, request.FILES)
@@ -281,46 +213,17 @@ def ajouter_depense_boutique(request):
     else:
         form = DepenseForm()
 
-    return render(request, 'core/depenses/ajouter_boutique.html', {
-        'form': form,
-        'recette_brute_jour': recette_brute_jour,
-        'depenses_du_jour': depenses_du_jour,
-        'reste_autorise': reste_autorise,
-    })
+    return render(request, 'core/depenses/ajouter_boutique.html', {'form': form, **budget})
 
 
 @login_required
+@role_requis('GESTIONNAIRE_SALON', 'ADMIN', refus="")
 def ajouter_depense_salon(request):
-    profil = ProfilUtilisateur.objects.get(user=request.user)
-    if profil.role not in ('GESTIONNAIRE_SALON', 'ADMIN'):
-        return HttpResponseForbidden()
-
     today = timezone.localdate()
 
-    # CA brut du jour
-    brut_homme = Prestation.objects.filter(
-        date_prestation__date=today,
-        secteur__nom='HOMME'
-    ).aggregate(total=Sum('montant_paye'))['total'] or Decimal('0')
-    brut_femme = Prestation.objects.filter(
-        date_prestation__date=today,
-        secteur__nom='FEMME'
-    ).aggregate(total=Sum('montant_paye'))['total'] or Decimal('0')
-
-    # Parts salon
-    dispo_homme = brut_homme * Decimal('0.5')
-    dispo_femme = brut_femme * Decimal('0.5')
-
-    # Dépenses déjà réalisées
-    dep_h = Depense.objects.filter(
-        entite='SALON', secteur='HOMME', date_depense=today
-    ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
-    dep_f = Depense.objects.filter(
-        entite='SALON', secteur='FEMME', date_depense=today
-    ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
-
-    reste_h = dispo_homme - dep_h
-    reste_f = dispo_femme - dep_f
+    # CA brut, part salon, dépenses déjà réalisées et reste autorisé par secteur
+    budget = budget_salon(today)
+    reste_h, reste_f = budget['reste_h'], budget['reste_f']
 
     if request.method == 'POST':
         form = DepenseForm(request.POST, request.FILES)
@@ -341,14 +244,4 @@ def ajouter_depense_salon(request):
     else:
         form = DepenseForm()
 
-    return render(request, 'core/depenses/ajouter_salon.html', {
-        'form': form,
-        'brut_homme': brut_homme,
-        'dispo_homme': dispo_homme,
-        'dep_h': dep_h,
-        'reste_h': reste_h,
-        'brut_femme': brut_femme,
-        'dispo_femme': dispo_femme,
-        'dep_f': dep_f,
-        'reste_f': reste_f,
-    })
\ No newline at end of file
+    return render(request, 'core/depenses/ajouter_salon.html', {'form': form, **budget})
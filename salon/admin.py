@@ -1,10 +1,36 @@
 from django.contrib import admin
 
-from salon.models import Personnel, Service, Prestation, Commission,Secteur
+from salon.models import Personnel, Service, Prestation, Commission,Secteur,ResumePrestationsJour
 
 # Register your models here.
-admin.site.register(Personnel)
 admin.site.register(Service)
-admin.site.register(Prestation)
-admin.site.register(Commission)
-admin.site.register(Secteur)
\ No newline at end of file
+
+
+@admin.register(ResumePrestationsJour)
+class ResumePrestationsJourAdmin(admin.ModelAdmin):
+    list_display = ('jour', 'secteur', 'personnel', 'nb_prestations', 'montant_paye', 'commissions', 'part_salon')
+    list_filter = ('jour', 'secteur')
+    ordering = ('-jour',)
+
+
+# Les __str__ du salon lisent secteur, service et personnel : jointures pour les listes de l'admin
+@admin.register(Secteur)
+class SecteurAdmin(admin.ModelAdmin):
+    list_select_related = ('responsable',)
+
+
+@admin.register(Personnel)
+class PersonnelAdmin(admin.ModelAdmin):
+    list_select_related = ('secteur',)
+
+
+@admin.register(Prestation)
+class PrestationAdmin(admin.ModelAdmin):
+    list_select_related = ('service', 'secteur', 'personnel__secteur')
+    raw_id_fields = ('personnel',)
+
+
+@admin.register(Commission)
+class CommissionAdmin(admin.ModelAdmin):
+    list_select_related = ('personnel__secteur',)
+    raw_id_fields = ('prestation', 'personnel')
@@ -1,18 +1,25 @@
 from django import forms
+from core.forms import ReferentielChoiceField, ReferentielFormMixin
 from .models import Personnel,Prestation
 from django.utils import timezone
 
-class PersonnelForm(forms.ModelForm):
+class PersonnelForm(ReferentielFormMixin, forms.ModelForm):
     class Meta:
         model = Personnel
         fields = ['nom', 'prenom', 'telephone', 'adresse', 'taux_commission', 'secteur']
+        field_classes = {'secteur': ReferentielChoiceField}
 
 DATETIME_LOCAL_FORMAT = "%Y-%m-%dT%H:%M"
 
-class PrestationForm(forms.ModelForm):
+class PrestationForm(ReferentielFormMixin, forms.ModelForm):
     class Meta:
         model = Prestation
         fields = ['personnel', 'secteur', 'service', 'montant_paye', 'date_prestation']
+        field_classes = {
+            'personnel': ReferentielChoiceField,
+            'secteur': ReferentielChoiceField,
+            'service': ReferentielChoiceField,
+        }
         widgets = {
             'date_prestation': forms.DateTimeInput(
                 attrs={'type': 'datetime-local', 'class': 'form-input'},
@@ -0,0 +1,71 @@
+# salon/management/commands/reconstruire_resumes_salon.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from core.cache_kpi import SALON, invalider_kpis
+from salon.models import PART_SALON, Prestation, ResumePrestationsJour
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les résumés journaliers du salon (jour × secteur × personnel) "
+        "à partir des prestations et de leurs commissions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help="Premier jour à reconstruire (AAAA-MM-JJ)")
+        parser.add_argument('--fin', help="Dernier jour à reconstruire (AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        debut = self._lire_date(options['debut'])
+        fin = self._lire_date(options['fin'])
+
+        prestations = Prestation.objects.annotate(jour=F('jour_prestation'))
+        resumes = ResumePrestationsJour.objects.all()
+        if debut:
+            prestations = prestations.filter(jour__gte=debut)
+            resumes = resumes.filter(jour__gte=debut)
+        if fin:
+            prestations = prestations.filter(jour__lte=fin)
+            resumes = resumes.filter(jour__lte=fin)
+
+        nouveaux = []
+        for r in prestations.values('jour', 'secteur', 'personnel').annotate(
+            nb=Count('id'),
+            montant=Sum('montant_paye'),
+            commissions=Sum('commission__montant'),
+            nb_commissions=Count('commission'),
+            nb_commissions_payees=Count('commission', filter=Q(commission__est_payee=True)),
+        ):
+            montant = r['montant'] or Decimal('0')
+            nouveaux.append(ResumePrestationsJour(
+                jour=r['jour'],
+                secteur_id=r['secteur'],
+                personnel_id=r['personnel'],
+                nb_prestations=r['nb'],
+                montant_paye=montant,
+                commissions=r['commissions'] or Decimal('0'),
+                part_salon=montant * PART_SALON,
+                nb_commissions=r['nb_commissions'],
+                nb_commissions_payees=r['nb_commissions_payees'],
+            ))
+
+        with transaction.atomic():
+            resumes.delete()
+            ResumePrestationsJour.objects.bulk_create(nouveaux, batch_size=1000)
+            invalider_kpis(SALON)
+
+        self.stdout.write(self.style.SUCCESS(f"{len(nouveaux)} résumés de prestations reconstruits."))
+
+    def _lire_date(self, valeur):
+        if not valeur:
+            return None
+        try:
+            return date.fromisoformat(valeur)
+        except ValueError:
+            raise CommandError(f"Date invalide : {valeur} (format attendu AAAA-MM-JJ)")
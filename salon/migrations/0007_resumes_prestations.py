@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0006_alter_prestation_date_prestation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumePrestationsJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('nb_prestations', models.PositiveIntegerField(default=0)),
+                ('montant_paye', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('commissions', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('part_salon', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('personnel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='salon.personnel')),
+                ('secteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='salon.secteur')),
+            ],
+            options={
+                'verbose_name': 'Résumé journalier des prestations',
+                'verbose_name_plural': 'Résumés journaliers des prestations',
+                'constraints': [models.UniqueConstraint(fields=('jour', 'secteur', 'personnel'), name='resume_prestations_jour_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0007_resumes_prestations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commission',
+            index=models.Index(fields=['date_calcul', 'personnel'], name='commission_date_personnel_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestation',
+            index=models.Index(fields=['date_prestation', 'id'], name='prestation_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestation',
+            index=models.Index(fields=['secteur', 'date_prestation'], name='prestation_secteur_date_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def remplir_jour_prestation(apps, schema_editor):
+    Prestation = apps.get_model('salon', 'Prestation')
+    lot = []
+    for prestation in Prestation.objects.only('pk', 'date_prestation').iterator(chunk_size=2000):
+        prestation.jour_prestation = timezone.localdate(prestation.date_prestation)
+        lot.append(prestation)
+        if len(lot) == 2000:
+            Prestation.objects.bulk_update(lot, ['jour_prestation'])
+            lot = []
+    Prestation.objects.bulk_update(lot, ['jour_prestation'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0008_index_filtres'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prestation',
+            name='jour_prestation',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(remplir_jour_prestation, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='prestation',
+            name='jour_prestation',
+            field=models.DateField(db_index=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:17
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def compter_commissions(apps, schema_editor):
+    """Renseigne les nouveaux compteurs à partir des commissions existantes."""
+    Commission = apps.get_model('salon', 'Commission')
+    Resume = apps.get_model('salon', 'ResumePrestationsJour')
+    comptes = (
+        Commission.objects
+        .annotate(
+            jour=F('prestation__jour_prestation'),
+            secteur=F('prestation__secteur'),
+            membre=F('prestation__personnel'),
+        )
+        .values('jour', 'secteur', 'membre')
+        .annotate(nb=Count('pk'), payees=Count('pk', filter=Q(est_payee=True)))
+    )
+    for c in comptes:
+        Resume.objects.filter(jour=c['jour'], secteur_id=c['secteur'], personnel_id=c['membre']).update(
+            nb_commissions=c['nb'], nb_commissions_payees=c['payees'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0009_prestation_jour_prestation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumeprestationsjour',
+            name='nb_commissions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='resumeprestationsjour',
+            name='nb_commissions_payees',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(compter_commissions, migrations.RunPython.noop),
+    ]
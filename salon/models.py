@@ -3,6 +3,12 @@ from django.conf import settings
 from decimal import Decimal
 from django.utils import timezone
 
+from core.dates import jour_local
+from core.models import ResumeJournalier
+
+# Part du montant payé qui revient au salon (le reste revient au personnel)
+PART_SALON = Decimal('0.5')
+
 
 class Secteur(models.Model):
     NOM_CHOICES = [
@@ -58,11 +64,51 @@ class Prestation(models.Model):
     service = models.ForeignKey(Service, on_delete=models.PROTECT)
     secteur = models.ForeignKey(Secteur, on_delete=models.PROTECT)
     date_prestation = models.DateTimeField(default=timezone.now())
+    # Jour local de la prestation, stocké et indexé (voir Vente.jour_vente)
+    jour_prestation = models.DateField(editable=False, db_index=True)
     montant_paye = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_prestation', 'id'], name='prestation_date_id_idx'),
+            models.Index(fields=['secteur', 'date_prestation'], name='prestation_secteur_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.service.nom} ({self.secteur.nom}) par {self.personnel} le {self.date_prestation.strftime('%d/%m/%Y')}"
 
+    def save(self, *args, **kwargs):
+        self.jour_prestation = jour_local(self.date_prestation)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'date_prestation' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'jour_prestation'}
+        super().save(*args, **kwargs)
+
+    def cle_resume(self):
+        """Clé (jour local, secteur, personnel) de la ligne de résumé qui compte cette prestation."""
+        return (self.jour_prestation, self.secteur_id, self.personnel_id)
+
+    def contribution_en_base(self):
+        """
+        Ce que la prestation compte, telle qu'en base, dans ResumePrestationsJour :
+        (clé, montant payé, commission, commission payée), ou None si elle n'y est
+        pas encore (commission None sans commission).
+        """
+        if self.pk is None:
+            return None
+        ligne = (
+            Prestation.objects.filter(pk=self.pk)
+            .values_list(
+                'jour_prestation', 'secteur_id', 'personnel_id',
+                'montant_paye', 'commission__montant', 'commission__est_payee',
+            )
+            .first()
+        )
+        if ligne is None:
+            return None
+        jour, secteur_id, personnel_id, montant, commission, est_payee = ligne
+        return (jour, secteur_id, personnel_id), montant, commission, bool(est_payee)
+
 class Commission(models.Model):
     prestation = models.OneToOneField(Prestation, on_delete=models.CASCADE)
     personnel = models.ForeignKey(Personnel, on_delete=models.CASCADE)
@@ -70,5 +116,68 @@ class Commission(models.Model):
     date_calcul = models.DateField(auto_now_add=True)
     est_payee = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_calcul', 'personnel'], name='commission_date_personnel_idx'),
+        ]
+
     def __str__(self):
-        return f"Commission pour {self.personnel} - {self.montant} CDF"
\ No newline at end of file
+        return f"Commission pour {self.personnel} - {self.montant} CDF"
+
+
+class ResumePrestationsJour(ResumeJournalier):
+    """Prestations d'un jour pour un secteur et un membre du personnel (maintenu par les signaux)."""
+    secteur = models.ForeignKey(Secteur, on_delete=models.CASCADE, related_name='+')
+    personnel = models.ForeignKey(Personnel, on_delete=models.CASCADE, related_name='+')
+    nb_prestations = models.PositiveIntegerField(default=0)
+    montant_paye = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    commissions = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    part_salon = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    nb_commissions = models.PositiveIntegerField(default=0)
+    nb_commissions_payees = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Résumé journalier des prestations"
+        verbose_name_plural = "Résumés journaliers des prestations"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['jour', 'secteur', 'personnel'], name='resume_prestations_jour_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Prestations du {self.jour:%d/%m/%Y} (secteur {self.secteur_id}, personnel {self.personnel_id})"
+
+    @staticmethod
+    def _compteurs(montant, commission, est_payee, signe):
+        """Compteurs d'une contribution ; montant None pour une commission seule, commission None sans commission."""
+        compteurs = {}
+        if montant is not None:
+            compteurs.update(nb_prestations=signe, montant_paye=signe * montant, part_salon=signe * montant * PART_SALON)
+        if commission is not None:
+            compteurs.update(
+                commissions=signe * commission, nb_commissions=signe, nb_commissions_payees=signe * int(est_payee),
+            )
+        return compteurs
+
+    @classmethod
+    def remplacer(cls, avant, apres):
+        """
+        Remplace dans les résumés la contribution `avant` par `apres`, chacune None
+        ou (clé, montant payé, commission, commission payée) avec clé = (jour,
+        secteur, personnel). Écrit en deltas par cumuler() : deux prestations
+        enregistrées en même temps ne s'écrasent pas. Une ligne est supprimée
+        quand sa dernière prestation en sort.
+        """
+        deltas = {}
+        for contribution, signe in ((avant, -1), (apres, 1)):
+            if contribution is not None:
+                cle, *valeurs = contribution
+                ligne = deltas.setdefault(cle, {})
+                for champ, valeur in cls._compteurs(*valeurs, signe).items():
+                    ligne[champ] = ligne.get(champ, 0) + valeur
+        for (jour, secteur_id, personnel_id), compteurs in deltas.items():
+            cles = {'jour': jour, 'secteur_id': secteur_id, 'personnel_id': personnel_id}
+            cls.cumuler(cles, **compteurs)
+            if compteurs.get('nb_prestations', 0) < 0:
+                cls.objects.filter(**cles, nb_prestations=0).delete()
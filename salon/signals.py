@@ -1,10 +1,36 @@
 # salon/signals.py
 
-from django.db.models.signals import post_save
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from decimal import Decimal
-from django.utils import timezone
-from .models import Prestation, Commission
+from core import metriques, referentiel
+from core.cache_kpi import SALON, invalider_kpis
+from .models import Prestation, Commission, Personnel, ResumePrestationsJour, Secteur, Service
+
+# Commissions écrites par les signaux de Prestation : leur montant entre dans le
+# résumé avec la prestation (mettre_a_jour_resume_prestations), pas en plus
+_commission_de_prestation = threading.local()
+
+
+@contextmanager
+def _depuis_prestation():
+    _commission_de_prestation.actif = True
+    try:
+        yield
+    finally:
+        _commission_de_prestation.actif = False
+
+
+@receiver(pre_save, sender=Prestation)
+@receiver(pre_delete, sender=Prestation)
+def memoriser_contribution_prestation(sender, instance: Prestation, raw=False, **kwargs):
+    """Ce que la prestation compte déjà dans son résumé, relu en base avant l'écriture."""
+    if not raw:
+        instance._contribution_avant = instance.contribution_en_base()
 
 
 @receiver(post_save, sender=Prestation)
@@ -25,13 +51,14 @@ def calculer_commission(sender, instance, created, **kwargs):
     montant_commission = prestation.montant_paye * Decimal(str(taux_commission))
 
     # update_or_create garantit qu'une seule commission existe pour la prestation
-    Commission.objects.update_or_create(
-        prestation=prestation,
-        defaults={
-            'personnel': personnel,
-            'montant': montant_commission
-        }
-    )
+    with _depuis_prestation():
+        Commission.objects.update_or_create(
+            prestation=prestation,
+            defaults={
+                'personnel': personnel,
+                'montant': montant_commission
+            }
+        )
 
     print(f"✅ Commission calculée : {montant_commission} pour la prestation {prestation.id}")
 
@@ -61,24 +88,109 @@ def sync_commission_with_prestation(sender, instance: Prestation, created, **kwa
         # si taux n'est pas un Decimal compatible
         montant_commission = (montant_paye * Decimal(str(taux))).quantize(Decimal("0.01"))
 
-    # ✅ 3) Date de calcul = date de la prestation (locale)
-    dp = instance.date_prestation
-    if dp is None:
-        # fallback: aujourd’hui (ne devrait pas arriver si le champ est required)
-        calc_date = timezone.localdate()
-    else:
-        if timezone.is_aware(dp):
-            calc_date = dp.astimezone(timezone.get_current_timezone()).date()
-        else:
-            # dp peut être un DateTimeField naïf ou un DateField
-            calc_date = getattr(dp, "date", lambda: dp)()
+    # ✅ 3) Date de calcul = jour local de la prestation (rempli par Prestation.save)
+    calc_date = instance.jour_prestation
 
     # ✅ 4) Upsert de la commission (1 commission par prestation)
-    Commission.objects.update_or_create(
-        prestation=instance,
-        defaults={
-            "personnel": instance.personnel,
-            "montant": montant_commission,
-            "date_calcul": calc_date,
-        },
-    )
\ No newline at end of file
+    with _depuis_prestation():
+        Commission.objects.update_or_create(
+            prestation=instance,
+            defaults={
+                "personnel": instance.personnel,
+                "montant": montant_commission,
+                "date_calcul": calc_date,
+            },
+        )
+
+
+# ⚠️ Doit rester après les signaux de commission : le résumé lit la commission à jour.
+@receiver(post_save, sender=Prestation)
+def mettre_a_jour_resume_prestations(sender, instance: Prestation, created, raw=False, **kwargs):
+    """
+    Reporte la prestation dans son résumé journalier (jour × secteur × personnel)
+    en deltas : retire ce qu'elle comptait avant l'écriture, ajoute ce qu'elle compte.
+    """
+    if raw:
+        return
+    commission = Commission.objects.filter(prestation=instance).values_list('montant', 'est_payee').first()
+    apres = (instance.cle_resume(), instance.montant_paye, *(commission or (None, False)))
+    ResumePrestationsJour.remplacer(getattr(instance, '_contribution_avant', None), apres)
+    instance._contribution_avant = apres
+    invalider_kpis(SALON)
+
+
+@receiver(post_save, sender=Prestation)
+def compter_prestation(sender, created, raw=False, **kwargs):
+    if created and not raw:
+        metriques.compter_apres_commit(metriques.PRESTATIONS)
+
+
+@receiver(post_delete, sender=Prestation)
+def retirer_prestation_du_resume(sender, instance: Prestation, **kwargs):
+    """Retire une prestation supprimée de son résumé (sa commission, supprimée en cascade, s'en retire seule)."""
+    avant = getattr(instance, '_contribution_avant', None)
+    if avant is not None:
+        cle, montant, _, _ = avant
+        ResumePrestationsJour.remplacer((cle, montant, None, False), None)
+        invalider_kpis(SALON)
+
+
+def _contribution_commission(commission_pk):
+    """Contribution (voir ResumePrestationsJour.remplacer) d'une commission telle qu'en base, ou None."""
+    ligne = (
+        Commission.objects.filter(pk=commission_pk)
+        .values_list(
+            'prestation__jour_prestation', 'prestation__secteur_id', 'prestation__personnel_id',
+            'montant', 'est_payee',
+        )
+        .first()
+    )
+    return (tuple(ligne[:3]), None, *ligne[3:]) if ligne else None
+
+
+@receiver(pre_save, sender=Commission)
+@receiver(pre_delete, sender=Commission)
+def memoriser_contribution_commission(sender, instance: Commission, raw=False, **kwargs):
+    if raw or getattr(_commission_de_prestation, 'actif', False):
+        return
+    instance._contribution_avant = _contribution_commission(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Commission)
+@receiver(post_delete, sender=Commission)
+def mettre_a_jour_resume_commission(sender, instance: Commission, raw=False, **kwargs):
+    """Commission modifiée ou supprimée hors prestation (admin, paiement, cascade) : colonnes de commission du résumé."""
+    if raw or getattr(_commission_de_prestation, 'actif', False):
+        return
+    apres = _contribution_commission(instance.pk) if kwargs['signal'] is post_save else None
+    ResumePrestationsJour.remplacer(getattr(instance, '_contribution_avant', None), apres)
+    instance._contribution_avant = apres
+    invalider_kpis(SALON)
+
+
+# Données de référence en mémoire (voir core.referentiel). Le personnel est
+# chargé avec son secteur, le secteur avec son responsable (utilisés par __str__).
+referentiel.enregistrer(Secteur, lambda: Secteur.objects.select_related('responsable').order_by('nom'))
+referentiel.enregistrer(Service, lambda: Service.objects.order_by('nom'))
+referentiel.enregistrer(
+    Personnel,
+    lambda: Personnel.objects.select_related('secteur__responsable').order_by('nom', 'prenom'),
+    depend_de=[Secteur],
+)
+
+
+@receiver(post_save, sender=Personnel)
+@receiver(post_delete, sender=Personnel)
+def invalider_kpis_personnel(sender, raw=False, **kwargs):
+    """L'effectif figure dans les indicateurs du dashboard salon."""
+    if not raw:
+        invalider_kpis(SALON)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def rafraichir_responsable_secteur(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Le nom du responsable figure dans Secteur.__str__ : on invalide s'il a changé."""
+    if raw or update_fields == frozenset({'last_login'}):
+        return  # connexion : le nom n'a pas changé
+    if any(s.responsable_id == instance.pk for s in referentiel.liste(Secteur)):
+        referentiel.invalider(Secteur)
@@ -1,3 +1,236 @@
-from django.test import TestCase
+import csv
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from boutique.tests import lancer_en_parallele
+from core.models import Depense, ProfilUtilisateur
+from core.n_plus_un import RequetesVuesMixin
+from .models import Commission, Personnel, Prestation, ResumePrestationsJour, Secteur, Service
+
+
+class SalonTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerant = User.objects.create_user('gerante', password='motdepasse-test')
+        ProfilUtilisateur.objects.create(user=cls.gerant, role='GESTIONNAIRE_SALON')
+        cls.homme = Secteur.objects.create(nom='HOMME', taux_commission=Decimal('0.50'))
+        cls.femme = Secteur.objects.create(nom='FEMME', taux_commission=Decimal('0.50'))
+        cls.coiffeur = Personnel.objects.create(nom='Kabila', prenom='Jo', secteur=cls.homme, taux_commission=Decimal('0.30'))
+        cls.coiffeuse = Personnel.objects.create(nom='Mbuyi', prenom='Ana', secteur=cls.femme, taux_commission=Decimal('0.40'))
+        cls.coupe = Service.objects.create(nom='Coupe', prix=Decimal('10.00'), duree_estimee=timedelta(minutes=30))
+
+    def prester(self, personnel, montant, quand=None):
+        return Prestation.objects.create(
+            personnel=personnel,
+            secteur=personnel.secteur,
+            service=self.coupe,
+            montant_paye=Decimal(montant),
+            date_prestation=quand or timezone.now(),
+        )
+
+
+class ResumePrestationsTests(SalonTestCase):
+
+    def valeurs(self):
+        return list(ResumePrestationsJour.objects.order_by('jour', 'personnel').values(
+            'jour', 'secteur', 'personnel', 'nb_prestations', 'montant_paye', 'commissions', 'part_salon',
+            'nb_commissions', 'nb_commissions_payees',
+        ))
+
+    def test_creation_alimente_le_resume(self):
+        self.prester(self.coiffeur, '10.00')
+        self.prester(self.coiffeur, '20.00')
+
+        resume = ResumePrestationsJour.objects.get()
+        self.assertEqual(resume.jour, timezone.localdate())
+        self.assertEqual(resume.nb_prestations, 2)
+        self.assertEqual(resume.montant_paye, Decimal('30.00'))
+        self.assertEqual(resume.commissions, Decimal('9.00'))
+        self.assertEqual(resume.part_salon, Decimal('15.00'))
+
+    def test_modification_et_suppression(self):
+        prestation = self.prester(self.coiffeur, '10.00')
+        hier = timezone.now() - timedelta(days=1)
+
+        prestation = Prestation.objects.get(pk=prestation.pk)
+        prestation.personnel = self.coiffeuse
+        prestation.secteur = self.femme
+        prestation.date_prestation = hier
+        prestation.save()
+
+        resume = ResumePrestationsJour.objects.get()
+        self.assertEqual((resume.personnel, resume.jour), (self.coiffeuse, timezone.localdate(hier)))
+        self.assertEqual(resume.commissions, Decimal('4.00'))
+
+        prestation.delete()
+        self.assertFalse(ResumePrestationsJour.objects.exists())
+
+    def test_commission_modifiee_hors_prestation(self):
+        prestation = self.prester(self.coiffeur, '10.00')
+        self.prester(self.coiffeur, '20.00')
+
+        commission = Commission.objects.get(prestation=prestation)
+        commission.montant = Decimal('5.00')
+        commission.save()
+        self.assertEqual(ResumePrestationsJour.objects.get().commissions, Decimal('11.00'))
+
+        commission.delete()
+        self.assertEqual(ResumePrestationsJour.objects.get().commissions, Decimal('6.00'))
+
+    def test_reconstruction_identique_a_la_maintenance(self):
+        self.prester(self.coiffeur, '10.00')
+        self.prester(self.coiffeuse, '25.00')
+        self.prester(self.coiffeuse, '5.00', quand=timezone.now() - timedelta(days=3))
+        attendu = self.valeurs()
+
+        ResumePrestationsJour.objects.all().delete()
+        call_command('reconstruire_resumes_salon', stdout=StringIO())
+
+        self.assertEqual(self.valeurs(), attendu)
+
+
+# Comme ConcurrenceCompteursTests : n'a de sens que sur une base multi-écrivains
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrenceResumePrestationsTests(TransactionTestCase):
+    NB_THREADS = 20
+
+    def test_prestations_simultanees_du_meme_jour(self):
+        secteur = Secteur.objects.create(nom='HOMME', taux_commission=Decimal('0.50'))
+        coiffeur = Personnel.objects.create(nom='Kabila', prenom='Jo', secteur=secteur, taux_commission=Decimal('0.30'))
+        coupe = Service.objects.create(nom='Coupe', prix=Decimal('10.00'), duree_estimee=timedelta(minutes=30))
+
+        def prester():
+            with transaction.atomic():
+                Prestation.objects.create(
+                    personnel=coiffeur, secteur=secteur, service=coupe, montant_paye=Decimal('10.00'),
+                    date_prestation=timezone.now(),
+                )
+
+        succes, erreurs = lancer_en_parallele(prester, self.NB_THREADS)
+
+        self.assertEqual((succes, erreurs), (self.NB_THREADS, []))
+        resume = ResumePrestationsJour.objects.get()
+        self.assertEqual(resume.nb_prestations, self.NB_THREADS)
+        self.assertEqual(resume.montant_paye, Decimal('10.00') * self.NB_THREADS)
+        self.assertEqual(resume.commissions, Decimal('3.00') * self.NB_THREADS)
+
+
+class VuesSalonTests(SalonTestCase):
+
+    def setUp(self):
+        self.client.force_login(self.gerant)
+        self.prester(self.coiffeur, '10.00')
+        self.prester(self.coiffeuse, '30.00')
+        self.prester(self.coiffeuse, '20.00', quand=timezone.now() - timedelta(days=1))
+
+    def test_dashboard_salon(self):
+        reponse = self.client.get(reverse('dashboard_salon'))
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.context['revenus_jour'], Decimal('20.00'))
+        self.assertEqual(reponse.context['pct_ca'], Decimal('100'))
+        self.assertEqual(reponse.context['total_prestations_jour'], 2)
+        self.assertEqual(reponse.context['prestations_femme'], 1)
+        self.assertEqual(reponse.context['commissions_femme'], Decimal('12.00'))
+
+    def test_dashboard_salon_suit_les_nouvelles_prestations(self):
+        self.client.get(reverse('dashboard_salon'))
+        self.prester(self.coiffeur, '10.00')
+
+        reponse = self.client.get(reverse('dashboard_salon'))
+        self.assertEqual(reponse.context['total_prestations_jour'], 3)
+
+    def test_rapport_salon(self):
+        reponse = self.client.get(reverse('rapport_salon'))
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.context['total_prestations'], 3)
+        self.assertEqual(reponse.context['revenu_encaisse'], Decimal('30.00'))
+        self.assertEqual(
+            [(p['personnel__nom'], p['nb_prestations']) for p in reponse.context['prestations_par_personnel']],
+            [('Mbuyi', 2), ('Kabila', 1)],
+        )
+
+    def test_export_prestations(self):
+        reponse = self.client.get(reverse('export_prestations'), {'secteur': 'FEMME'})
+
+        self.assertEqual(reponse['Content-Type'], 'text/csv; charset=utf-8')
+        lignes = list(csv.reader(StringIO(b''.join(reponse.streaming_content).decode('utf-8-sig')), delimiter=';'))
+        self.assertEqual(lignes[0], ['Date', 'Secteur', 'Nom', 'Prénom', 'Service', 'Montant payé', 'Commission', 'Commission payée'])
+        self.assertEqual([ligne[1:7] for ligne in lignes[1:]], [
+            ['FEMME', 'Mbuyi', 'Ana', 'Coupe', '20.00', '8.00'],
+            ['FEMME', 'Mbuyi', 'Ana', 'Coupe', '30.00', '12.00'],
+        ])
+
+    def test_rapport_commissions_mensuelles(self):
+        reponse = self.client.get(reverse('rapport_commissions_mensuelles'))
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertGreaterEqual(reponse.context['total_commissions'], Decimal('15.00'))
+
+    def test_listes_paginees(self):
+        reponse = self.client.get(reverse('liste_prestations'), {'taille': 2})
+        page = reponse.context['prestations']
+        self.assertEqual([p.montant_paye for p in page], [Decimal('30.00'), Decimal('10.00')])
+        self.assertIn('taille=2', page.url_suivante())
+
+        suite = self.client.get(reverse('liste_prestations') + page.url_suivante()).context['prestations']
+        self.assertEqual([p.montant_paye for p in suite], [Decimal('20.00')])
+
+        payee = Commission.objects.order_by('pk').first()
+        payee.est_payee = True
+        payee.save()
+        reponse = self.client.get(reverse('liste_commissions'))
+        self.assertEqual(len(reponse.context['commissions']), 3)
+        # Comptes tirés des résumés, tenus à jour par les signaux de Commission
+        self.assertEqual(reponse.context['comptes'], {'payees': 1, 'en_attente': 2})
+        self.assertEqual(reponse.context['commissions'].total, 3)
+
+
+class RequetesVuesSalonTests(RequetesVuesMixin, SalonTestCase):
+    """Listes et rapports du salon : nombre de requêtes fixe, quel que soit le volume."""
+
+    def setUp(self):
+        self.client.force_login(self.gerant)
+
+    def ajouter_prestations(self, nb):
+        """Prestations (et leur commission) par des membres du personnel tous différents."""
+        for i in range(nb):
+            secteur = (self.homme, self.femme)[i % 2]
+            personnel = Personnel.objects.create(
+                nom=f'Coiffeur {Personnel.objects.count()}', prenom='X', secteur=secteur, taux_commission=Decimal('0.30'),
+            )
+            self.prester(personnel, '10.00')
+
+    def ajouter_depenses(self, nb):
+        for _ in range(nb):
+            Depense.objects.create(entite='SALON', secteur='HOMME', montant=Decimal('1.00'), description='Savon')
+
+    def test_listes(self):
+        for nom, attendu in (('liste_personnel', 2), ('liste_prestations', 4), ('liste_commissions', 4)):
+            with self.subTest(vue=nom):
+                self.assertRequetesParVolume(attendu, reverse(nom), self.ajouter_prestations)
+
+    def test_liste_depenses_salon(self):
+        self.assertRequetesParVolume(4, reverse('liste_depenses_salon'), self.ajouter_depenses)
+
+    def test_rapports(self):
+        for nom, attendu in (('rapport_salon', 4), ('rapport_commissions_mensuelles', 4), ('rapport_depenses_mensuelles', 4)):
+            with self.subTest(vue=nom):
+                self.assertRequetesParVolume(attendu, reverse(nom), self.ajouter_prestations)
+
+    def test_admin_prestations_et_commissions(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='motdepasse-test'))
+        self.assertRequetesParVolume(7, reverse('admin:salon_prestation_changelist'), self.ajouter_prestations)
+        for modele in ('commission', 'personnel'):
+            with self.subTest(modele=modele):
+                self.assertEqual(self.requetes_vue(reverse(f'admin:salon_{modele}_changelist')), 7)
@@ -11,11 +11,13 @@ urlpatterns = [
     path('personnel/supprimer/<int:pk>/', views.supprimer_personnel, name='supprimer_personnel'),
     path('prestations/', views.liste_prestations, name='liste_prestations'),
     path('prestations/ajouter/', views.ajouter_prestation, name='ajouter_prestation'),
+    path('prestations/export/', views.export_prestations, name='export_prestations'),
     path('commissions/', views.liste_commissions, name='liste_commissions'),
     path('rapports/', views.rapport_salon, name='rapport_salon'),
     # Salon
     path('depenses/salon/', liste_depenses_salon, name='liste_depenses_salon'),
     path('depenses/salon/ajouter/', ajouter_depense_salon, name='ajouter_depense_salon'),
+    path('depenses/salon/export/', export_depenses_salon, name='export_depenses_salon'),
     path('logout/', auth_views.LogoutView.as_view(next_page='connexion'), name='logout'),
      path(
         'rapports/commissions-mensuelles/',
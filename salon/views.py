@@ -1,107 +1,41 @@
-from datetime import timedelta
 from datetime import date
 from django.db.models import DecimalField
 from django.shortcuts import render,redirect,get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
-from django.db.models import Sum, Count, Case, When, F, Value, ExpressionWrapper
+from django.db.models import Sum, Count, Case, When, F, Q, Value, ExpressionWrapper
 from django.db.models.functions import Coalesce
 from core.models import Depense
-from .models import Personnel, Prestation,Commission,Secteur,Service
+from .models import Personnel, Prestation,Commission,ResumePrestationsJour,Secteur,Service
+from core import referentiel
+from core.kpis import kpis_salon
 from core.decorators import role_requis
+from core.exports import filtre_periode, reponse_export
+from core.pagination import paginer_par_curseur
 from .forms import PersonnelForm,PrestationForm
 from django.contrib import messages
 from decimal import Decimal
 from dateutil.relativedelta import relativedelta
 
+
+def _avec_nom_personnel(lignes):
+    """Ajoute `personnel__nom` (lu dans le référentiel) aux lignes groupées par personnel."""
+    lignes = list(lignes)
+    for ligne in lignes:
+        personnel = referentiel.obtenir(Personnel, ligne['personnel'])
+        ligne['personnel__nom'] = personnel.nom if personnel else ''
+    return lignes
+
 @login_required
 @role_requis('GESTIONNAIRE_SALON')
 @login_required
 def dashboard_salon(request):
-    # Dates
-    today      = timezone.localdate()
-    yesterday  = today - timedelta(days=1)
-
-    # 1) Chiffre d'affaires du jour pour HOMMES et FEMMES
-    brut_homme  = Prestation.objects.filter(
-        date_prestation__date=today,
-        secteur__nom='HOMME'
-    ).aggregate(total=Sum('montant_paye'))['total'] or Decimal('0')
-    brut_femme  = Prestation.objects.filter(
-        date_prestation__date=today,
-        secteur__nom='FEMME'
-    ).aggregate(total=Sum('montant_paye'))['total'] or Decimal('0')
-
-    # 2) Part salon
-    revenu_homme = brut_homme * Decimal('0.5')
-    revenu_femme = brut_femme * Decimal('0.5')
-    revenus_jour = revenu_homme + revenu_femme
-
-    # 3) Même calcul pour hier (pour le %)
-    brut_homme_y  = Prestation.objects.filter(
-        date_prestation__date=yesterday,
-        secteur__nom='HOMME'
-    ).aggregate(total=Sum('montant_paye'))['total'] or Decimal('0')
-    brut_femme_y  = Prestation.objects.filter(
-        date_prestation__date=yesterday,
-        secteur__nom='FEMME'
-    ).aggregate(total=Sum('montant_paye'))['total'] or Decimal('0')
-    revenus_hier = (brut_homme_y * Decimal('0.5')) + (brut_femme_y * Decimal('0.5'))
-
-    # 4) % d'évolution
-    if revenus_hier > 0:
-        pct_ca = (revenus_jour - revenus_hier) / revenus_hier * 100
-    else:
-        pct_ca = None
-
-    # 5) Autres KPIs
-    total_personnel          = Personnel.objects.count()
-    total_prestations_jour   = Prestation.objects.filter(date_prestation__date=today).count()
-    # commissions déjà générées
-    commissions_homme = Commission.objects.filter(
-        prestation__date_prestation__date=today,
-        prestation__secteur__nom='HOMME'
-    ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
-    commissions_femme = Commission.objects.filter(
-        prestation__date_prestation__date=today,
-        prestation__secteur__nom='FEMME'
-    ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
-
-    # 6) Total des dépenses SALON du jour
-    depenses_salon_jour = Depense.objects.filter(
-        entite='SALON',
-        date_depense=today
-    ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
-
     return render(request, 'salon/dashboard.html', {
         'now': timezone.now(),
-
-        # CA salon
-        'revenus_jour':         revenus_jour,         # 60% hommes + 50% femmes
-        'pct_ca':               pct_ca,               # % vs hier
-
-        # Stats globales
-        'total_personnel':      total_personnel,
-        'total_prestations_jour': total_prestations_jour,
-
-        # Commissions
-        'prestations_homme':    Prestation.objects.filter(
-                                    date_prestation__date=today,
-                                    secteur__nom='HOMME'
-                                ).count(),
-        'commissions_homme':    commissions_homme,
-        'prestations_femme':    Prestation.objects.filter(
-                                    date_prestation__date=today,
-                                    secteur__nom='FEMME'
-                                ).count(),
-        'commissions_femme':    commissions_femme,
-
-        # Dépenses salon
-        'depenses_salon_jour':  depenses_salon_jour,
+        **kpis_salon(timezone.localdate()),
     })
 
 
-
 @login_required
 @role_requis('GESTIONNAIRE_SALON')
 def ajouter_personnel(request):
@@ -117,7 +51,7 @@ def ajouter_personnel(request):
 
 @login_required
 def liste_personnel(request):
-    personnels = Personnel.objects.select_related('secteur').all()
+    personnels = referentiel.liste(Personnel)
     return render(request, 'salon/personnel/liste.html', {
         'personnels': personnels
     })
@@ -176,26 +110,54 @@ def liste_prestations(request):
     date_debut = request.GET.get('date_debut')
     date_fin = request.GET.get('date_fin')
 
-    prestations = Prestation.objects.all()
+    prestations = Prestation.objects.select_related('personnel__secteur', 'service', 'secteur')
 
     if date_debut:
-        prestations = prestations.filter(date_prestation__date__gte=date_debut)
+        prestations = prestations.filter(jour_prestation__gte=date_debut)
     if date_fin:
-        prestations = prestations.filter(date_prestation__date__lte=date_fin)
+        prestations = prestations.filter(jour_prestation__lte=date_fin)
 
     return render(request, 'salon/prestations/liste.html', {
-        'prestations': prestations,
+        'prestations': paginer_par_curseur(request, prestations, 'date_prestation'),
         'date_debut': date_debut,
         'date_fin': date_fin,
     })
 
+@login_required
+@role_requis('GESTIONNAIRE_SALON')
+def export_prestations(request):
+    """Prestations et leur commission en CSV / XLSX : période et secteur (HOMME / FEMME) en filtres GET."""
+    prestations = Prestation.objects.filter(filtre_periode(request, 'jour_prestation'))
+    if request.GET.get('secteur'):
+        prestations = prestations.filter(secteur__nom=request.GET['secteur'])
+    return reponse_export(
+        request, 'prestations',
+        ['Date', 'Secteur', 'Nom', 'Prénom', 'Service', 'Montant payé', 'Commission', 'Commission payée'],
+        prestations.order_by('date_prestation', 'pk').values_list(
+            'date_prestation', 'secteur__nom', 'personnel__nom', 'personnel__prenom', 'service__nom',
+            'montant_paye', 'commission__montant', 'commission__est_payee',
+        ),
+    )
+
 @login_required
 @role_requis('GESTIONNAIRE_SALON')
 def liste_commissions(request):
-    commissions = Commission.objects.select_related('prestation', 'personnel').order_by('-date_calcul')
-    return render(request, 'salon/commissions/liste.html', {
-        'commissions': commissions
-    })
+    commissions = Commission.objects.select_related(
+        'personnel__secteur',
+        'prestation__service',
+        'prestation__secteur',
+        'prestation__personnel__secteur',
+    )
+    page = paginer_par_curseur(request, commissions, 'date_calcul')
+    # Payées / en attente lues dans les résumés journaliers (une ligne par jour
+    # et par membre du personnel) plutôt qu'en parcourant toutes les commissions
+    totaux = ResumePrestationsJour.objects.aggregate(
+        total=Coalesce(Sum('nb_commissions'), 0),
+        payees=Coalesce(Sum('nb_commissions_payees'), 0),
+    )
+    comptes = {'payees': totaux['payees'], 'en_attente': totaux['total'] - totaux['payees']}
+    page.total = totaux['total']
+    return render(request, 'salon/commissions/liste.html', {'commissions': page, 'comptes': comptes})
 
 
 @login_required
@@ -205,47 +167,33 @@ def rapport_salon(request):
     date_debut = request.GET.get('date_debut')
     date_fin   = request.GET.get('date_fin')
 
-    qs = Prestation.objects.all()
+    # Lecture des résumés journaliers (jour × secteur × personnel)
+    qs = ResumePrestationsJour.objects.all()
     if date_debut:
-        qs = qs.filter(date_prestation__date__gte=date_debut)
+        qs = qs.filter(jour__gte=date_debut)
     if date_fin:
-        qs = qs.filter(date_prestation__date__lte=date_fin)
-
-    # Expressions 60% / 50% pour calcul de la part salon
-    expr_homme = ExpressionWrapper(
-        F('montant_paye') * Decimal('0.5'),
-        output_field=DecimalField(max_digits=12, decimal_places=2)
-    )
-    expr_femme = ExpressionWrapper(
-        F('montant_paye') * Decimal('0.5'),
-        output_field=DecimalField(max_digits=12, decimal_places=2)
-    )
+        qs = qs.filter(jour__lte=date_fin)
 
-    part_case = Case(
-        When(secteur__nom='HOMME', then=expr_homme),
-        When(secteur__nom='FEMME', then=expr_femme),
-        output_field=DecimalField(max_digits=12, decimal_places=2),
+    totaux = qs.aggregate(
+        encaisse=Sum('part_salon'),
+        commissions=Sum('commissions'),
+        prestations=Sum('nb_prestations'),
     )
-    part_valeur = Coalesce(part_case, Value(0, output_field=DecimalField()))
 
     # 1. Montant encaissé (part salon)
-    revenu_encaisse = qs.aggregate(
-        encaisse=Sum(part_valeur)
-    )['encaisse'] or Decimal('0')
+    revenu_encaisse = totaux['encaisse'] or Decimal('0')
 
     # 2. Total des commissions
-    total_commissions = Commission.objects.filter(
-        prestation__in=qs
-    ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
+    total_commissions = totaux['commissions'] or Decimal('0')
 
     # 3. Nombre de prestations
-    total_prestations = qs.count()
+    total_prestations = totaux['prestations'] or 0
 
     # 4. Détail par personnel : NB prestations + MONTANT PAYÉ (pas la commission)
-    prestations_par_personnel = qs.values('personnel__nom').annotate(
-        nb_prestations=Count('id'),
+    prestations_par_personnel = _avec_nom_personnel(qs.values('personnel').annotate(
+        nb_prestations=Sum('nb_prestations'),
         montant_total=Sum('montant_paye')   # <-- ICI on somme le prix payé
-    ).order_by('-montant_total')
+    ).order_by('-montant_total'))
 
     return render(request, 'salon/rapports/rapport.html', {
         'date_debut':                date_debut,
@@ -275,18 +223,18 @@ def rapport_commissions_mensuelles(request):
 
     end = (start + relativedelta(months=1)) - relativedelta(days=1)
 
-    # Filtrer SUR le champ DateField date_calcul (pas __date__)
-    qs = Commission.objects.filter(
-        date_calcul__gte=start,
-        date_calcul__lte=end
+    # Résumés journaliers du mois (la commission est datée du jour de la prestation)
+    qs = ResumePrestationsJour.objects.filter(
+        jour__gte=start,
+        jour__lte=end
     )
 
-    total_commissions = qs.aggregate(somme=Sum('montant'))['somme'] or 0
+    total_commissions = qs.aggregate(somme=Sum('commissions'))['somme'] or 0
 
-    per_agent = (
+    per_agent = _avec_nom_personnel(
         qs
-        .values('personnel__nom')
-        .annotate(total=Sum('montant'))
+        .values('personnel')
+        .annotate(total=Sum('commissions'))
         .order_by('-total')
     )
 